@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк источников списка файлов: обход директорий (--source=walk)
+против индекса git (--source=git-index).
+Использование:
+  python3 benchmarks/bench_git_index.py
+  python3 benchmarks/bench_git_index.py --repo /путь/к/большому/репо
+"""
+
+import argparse
+import contextlib
+import io
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import repo_dumper  # noqa: E402
+
+
+def make_git_repo(root, files, ignored):
+    """Создает git-репозиторий с отслеживаемыми и игнорируемыми файлами"""
+    root.mkdir()
+    rules = ['node_modules/', 'build/', '*.log', '*.tmp', '/dist']
+    rules += [f"generated_{i}/" for i in range(200)]
+    rules += [f"*.cache{i}" for i in range(200)]
+    (root / '.gitignore').write_text('\n'.join(rules) + '\n')
+    for i in range(files):
+        sub = root / 'src' / f"pkg{i % 40}"
+        sub.mkdir(parents=True, exist_ok=True)
+        (sub / f"module{i}.py").write_text(f"value = {i}\n")
+    for i in range(ignored):
+        sub = root / 'node_modules' / f"dep{i % 100}" / 'lib'
+        sub.mkdir(parents=True, exist_ok=True)
+        (sub / f"index{i}.js").write_text('module.exports = 1;\n')
+        (root / 'src' / f"pkg{i % 40}" / f"trace{i}.log").write_text('log\n')
+    subprocess.run(['git', 'init', '-q'], cwd=root, check=True)
+    subprocess.run(['git', 'add', '-A'], cwd=root, check=True)
+    subprocess.run(['git', '-c', 'user.name=bench', '-c', 'user.email=bench@example.com',
+                    'commit', '-qm', 'init'], cwd=root, check=True)
+
+
+def time_best(func, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк --source')
+    parser.add_argument('--repo', help='Существующий git-репозиторий вместо синтетического')
+    parser.add_argument('--files', type=int, default=5000, help='Число отслеживаемых файлов')
+    parser.add_argument('--ignored', type=int, default=20000, help='Число игнорируемых файлов')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    filters = repo_dumper.get_file_filter(quick_mode=True)
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        if args.repo:
+            repo = Path(args.repo).resolve()
+        else:
+            repo = tmp / 'repo'
+            make_git_repo(repo, args.files, args.ignored)
+        output = tmp / 'dump.txt'
+
+        def enumerate_walk():
+            matcher = repo_dumper.GitignoreMatcher.from_repo(repo)
+            skip = lambda entry, rel: repo_dumper.entry_skip_reason(entry, rel, filters, matcher) is not None
+            return sum(1 for rel, entry in repo_dumper.walk_repo(repo, skip) if not skip(entry, rel))
+
+        def enumerate_index():
+            paths = repo_dumper.list_git_index_files(repo)
+            skip = lambda entry, rel: repo_dumper.entry_skip_reason(entry, rel, filters, None) is not None
+            return sum(1 for rel, entry in repo_dumper.iter_git_index_files(repo, paths) if not skip(entry, rel))
+
+        def dump(source):
+            with contextlib.redirect_stdout(io.StringIO()):
+                repo_dumper.create_repo_dump(repo, output, filters, True, source=source)
+
+        print(f"Файлов после фильтрации: walk={enumerate_walk()}, git-index={enumerate_index()}")
+        print(f"{'этап':<22} {'walk, с':>10} {'git-index, с':>14}")
+        rows = [
+            ('список файлов', enumerate_walk, enumerate_index),
+            ('полный дамп', lambda: dump('walk'), lambda: dump('git-index')),
+        ]
+        for title, walk_func, index_func in rows:
+            walk_time = time_best(walk_func, args.repeat)
+            index_time = time_best(index_func, args.repeat)
+            print(f"{title:<22} {walk_time:>10.3f} {index_time:>14.3f}")
+
+
+if __name__ == '__main__':
+    main()
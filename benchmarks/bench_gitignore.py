@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Микробенчмарк проверки путей по .gitignore:
+старая функция should_ignore_path (legacy_gitignore.py) против GitignoreMatcher.
+Использование:
+  python3 benchmarks/bench_gitignore.py
+  python3 benchmarks/bench_gitignore.py --rules 500 --paths 100000
+"""
+
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import legacy_gitignore  # noqa: E402
+import repo_dumper  # noqa: E402
+
+
+def make_rules(rng, count):
+    """Генерирует набор правил, похожий на реальные .gitignore"""
+    rules = []
+    kinds = ['ext', 'name', 'dir', 'anchored', 'glob', 'deep']
+    for i in range(count):
+        kind = rng.choice(kinds)
+        if kind == 'ext':
+            rules.append(f"*.ext{i}")
+        elif kind == 'name':
+            rules.append(f"name{i}.cfg")
+        elif kind == 'dir':
+            rules.append(f"cache{i}/")
+        elif kind == 'anchored':
+            rules.append(f"/out{i}/gen")
+        elif kind == 'glob':
+            rules.append(f"tmp{i}_*")
+        else:
+            rules.append(f"**/logs{i}/*.log")
+    return rules
+
+
+def make_paths(rng, count, rule_count):
+    """Генерирует относительные пути файлов"""
+    paths = []
+    for _ in range(count):
+        depth = rng.randint(1, 6)
+        parts = [f"d{rng.randint(0, 30)}" for _ in range(depth - 1)]
+        n = rng.randint(0, rule_count * 2)
+        ext = rng.choice(['py', 'js', 'txt', f"ext{n}", 'md'])
+        parts.append(f"file{n}.{ext}")
+        paths.append('/'.join(parts))
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк сопоставления .gitignore')
+    parser.add_argument('--rules', type=int, default=300, help='Число правил')
+    parser.add_argument('--paths', type=int, default=20000, help='Число путей')
+    parser.add_argument('--nested', type=int, default=10, help='Число вложенных .gitignore')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        repo = Path(tmp)
+        (repo / '.gitignore').write_text('\n'.join(make_rules(rng, args.rules)) + '\n')
+        for i in range(args.nested):
+            sub = repo / f"d{i}"
+            sub.mkdir()
+            (sub / '.gitignore').write_text('\n'.join(make_rules(rng, 10)) + '\n')
+
+        paths = make_paths(rng, args.paths, args.rules)
+
+        start = time.perf_counter()
+        patterns = legacy_gitignore.parse_gitignore(repo)
+        parse_old = time.perf_counter() - start
+
+        start = time.perf_counter()
+        matcher = repo_dumper.GitignoreMatcher.from_repo(repo)
+        parse_new = time.perf_counter() - start
+
+        start = time.perf_counter()
+        old_hits = sum(1 for p in paths if legacy_gitignore.should_ignore_path(repo / p, patterns, repo))
+        old_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        new_hits = sum(1 for p in paths if matcher.is_ignored(p))
+        new_time = time.perf_counter() - start
+
+    print(f"Правил: {len(matcher)}, путей: {len(paths)}")
+    print(f"should_ignore_path:  разбор {parse_old * 1000:.1f} мс, проверка {old_time:.3f} с, совпадений {old_hits}")
+    print(f"GitignoreMatcher:    разбор {parse_new * 1000:.1f} мс, проверка {new_time:.3f} с, совпадений {new_hits}")
+    if new_time > 0:
+        print(f"Ускорение: {old_time / new_time:.1f}x")
+    # Совпадения могут отличаться: старая функция не поддерживает
+    # отрицание, области действия и точную семантику **
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк параллельного чтения файлов (--jobs): пропускная способность
+create_repo_dump в МБ/с для разного числа потоков.
+Выигрыш заметен на холодном кеше и медленных/сетевых дисках; на
+горячем кеше страниц чтение почти не ждет ввода-вывода.
+Использование:
+  python3 benchmarks/bench_jobs.py
+  python3 benchmarks/bench_jobs.py --repo /путь/к/репо --jobs 1 2 4 8 16
+  sudo python3 benchmarks/bench_jobs.py --drop-caches
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import repo_dumper  # noqa: E402
+
+
+def make_repo(root, files, size, seed):
+    """Создает синтетический репозиторий из текстовых файлов"""
+    rng = random.Random(seed)
+    words = ['def', 'return', 'class', 'import', 'value', 'self', 'data', 'yield']
+    for i in range(files):
+        sub = root / f"pkg{i % 50}" / f"mod{i % 7}"
+        sub.mkdir(parents=True, exist_ok=True)
+        target = rng.randint(size // 2, size * 3 // 2)
+        lines = []
+        total = 0
+        while total < target:
+            line = ' '.join(rng.choice(words) for _ in range(10))
+            lines.append(line)
+            total += len(line) + 1
+        (sub / f"file{i}.py").write_text('\n'.join(lines) + '\n')
+
+
+def drop_caches():
+    """Сбрасывает кеш страниц Linux (нужны права root)"""
+    try:
+        os.sync()
+        with open('/proc/sys/vm/drop_caches', 'w') as f:
+            f.write('3\n')
+        return True
+    except OSError:
+        return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк --jobs')
+    parser.add_argument('--repo', help='Существующий репозиторий вместо синтетического')
+    parser.add_argument('--files', type=int, default=3000, help='Число файлов синтетического репозитория')
+    parser.add_argument('--size', type=int, default=8192, help='Средний размер файла в байтах')
+    parser.add_argument('--jobs', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--repeat', type=int, default=3, help='Число повторов, берется лучший')
+    parser.add_argument('--drop-caches', action='store_true', help='Сбрасывать кеш страниц перед каждым прогоном')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    filters = repo_dumper.get_file_filter(quick_mode=True)
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        if args.repo:
+            repo = Path(args.repo).resolve()
+        else:
+            repo = tmp / 'repo'
+            make_repo(repo, args.files, args.size, args.seed)
+        output = tmp / 'dump.txt'
+
+        if args.drop_caches and not drop_caches():
+            print("⚠️  Не удалось сбросить кеш (нужен root), замеры на горячем кеше")
+            args.drop_caches = False
+
+        print(f"{'jobs':>5} {'время, с':>10} {'МБ/с':>10} {'ускорение':>10}")
+        baseline = None
+        for jobs in args.jobs:
+            best = None
+            for _ in range(args.repeat):
+                if args.drop_caches:
+                    drop_caches()
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    repo_dumper.create_repo_dump(repo, output, filters, True, jobs)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            megabytes = output.stat().st_size / (1024 * 1024)
+            if baseline is None:
+                baseline = best
+            print(f"{jobs:>5} {best:>10.3f} {megabytes / best:>10.1f} {baseline / best:>9.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Набор бенчмарков по этапам дампа на синтетическом (или реальном)
+репозитории: разбор .gitignore, обход, фильтрация, чтение, запись,
+информация о git и полный дамп. Результаты - JSON, который можно
+сравнить с прошлым прогоном, чтобы поймать регрессии.
+Использование:
+  python3 benchmarks/bench_suite.py --output results.json
+  python3 benchmarks/bench_suite.py --files 20000 --rules 300 --compare results.json
+  python3 benchmarks/bench_suite.py --repo /путь/к/репо --stages traversal,filter_matcher
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import legacy_gitignore  # noqa: E402
+import repo_dumper  # noqa: E402
+import synthetic_repo  # noqa: E402
+
+RESULTS_VERSION = 1
+
+
+class Stages:
+    """Этапы дампа, каждый - функция без аргументов, возвращающая число обработанных элементов"""
+
+    def __init__(self, repo, tmp, jobs, legacy_limit):
+        self.repo = repo
+        self.tmp = tmp
+        self.jobs = jobs
+        self.legacy_limit = legacy_limit
+        self.write_elapsed = None
+        self.filters = repo_dumper.get_file_filter(quick_mode=True)
+        self.matcher = repo_dumper.GitignoreMatcher.from_repo(repo)
+        self.legacy_patterns = legacy_gitignore.parse_gitignore(repo)
+        # Данные для отдельных этапов готовятся один раз, вне замеров
+        self.entries = list(repo_dumper.walk_repo(repo))
+        self.selected = [(rel, entry) for rel, entry in self.entries
+                         if repo_dumper.entry_skip_reason(entry, rel, self.filters, self.matcher) is None
+                         and entry.is_file()]
+
+    def ignore_parse_legacy(self):
+        return len(legacy_gitignore.parse_gitignore(self.repo))
+
+    def ignore_parse(self):
+        return len(repo_dumper.GitignoreMatcher.from_repo(self.repo))
+
+    def traversal(self):
+        return sum(1 for _ in repo_dumper.walk_repo(self.repo))
+
+    def traversal_parallel(self):
+        return sum(1 for _ in repo_dumper.walk_repo_parallel(self.repo, jobs=max(2, self.jobs)))
+
+    def traversal_pruned(self):
+        filters, matcher = self.filters, self.matcher
+        skip = lambda entry, rel: repo_dumper.entry_skip_reason(entry, rel, filters, matcher) is not None
+        return sum(1 for _ in repo_dumper.walk_repo(self.repo, skip))
+
+    def filter_legacy(self):
+        # should_skip_file со старым линейным списком правил медленный - берем выборку
+        entries = self.entries[:self.legacy_limit]
+        for rel, entry in entries:
+            legacy_gitignore.should_skip_file(Path(entry.path), self.filters, self.repo, self.legacy_patterns)
+        return len(entries)
+
+    def filter_matcher(self):
+        filters, matcher = self.filters, self.matcher
+        for rel, entry in self.entries:
+            repo_dumper.entry_skip_reason(entry, rel, filters, matcher)
+        return len(self.entries)
+
+    def read(self):
+        sniffer = repo_dumper.BinarySniffer()
+        count = 0
+        for block in repo_dumper.iter_file_blocks(iter(self.selected), self.jobs, sniffer=sniffer):
+            block.release()
+            count += 1
+        return count
+
+    def write(self):
+        # Запись уже прочитанных блоков; чтение в замер не входит
+        blocks = list(repo_dumper.iter_file_blocks(iter(self.selected), self.jobs,
+                                                   sniffer=repo_dumper.BinarySniffer()))
+        started = time.perf_counter()
+        with open(self.tmp / 'write.txt', 'wb', buffering=0) as raw:
+            out = repo_dumper.DumpOutput(raw)
+            for block in blocks:
+                if block.skip_reason is None:
+                    block.write_to(out)
+            out.flush()
+        self.write_elapsed = time.perf_counter() - started
+        return len(blocks)
+
+    def git_info(self):
+        return len(repo_dumper.get_git_info(self.repo))
+
+    def full_dump(self):
+        stats = repo_dumper.Dumper(self.repo, jobs=self.jobs).dump(self.tmp / 'dump.txt')
+        return stats.processed
+
+
+STAGES = ('ignore_parse_legacy', 'ignore_parse', 'traversal', 'traversal_parallel', 'traversal_pruned', 'filter_legacy',
+          'filter_matcher', 'read', 'write', 'git_info', 'full_dump')
+
+
+def run_stage(stages, name, repeat):
+    """Замеры этапа: лучшее и медианное время, число элементов"""
+    func = getattr(stages, name)
+    runs = []
+    count = 0
+    for _ in range(repeat):
+        stages.write_elapsed = None
+        started = time.perf_counter()
+        count = func()
+        elapsed = time.perf_counter() - started
+        if stages.write_elapsed is not None:
+            elapsed = stages.write_elapsed
+        runs.append(elapsed)
+    best = min(runs)
+    return {
+        'best': best,
+        'median': statistics.median(runs),
+        'runs': runs,
+        'items': count,
+        'items_per_second': count / best if best > 0 else None,
+    }
+
+
+def git_revision():
+    """Коммит repo_dumper, на котором сделан замер"""
+    result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=Path(__file__).resolve().parent,
+                            capture_output=True, text=True)
+    return result.stdout.strip() or None
+
+
+def compare(results, baseline, threshold):
+    """Печатает сравнение с прошлым прогоном; возвращает число регрессий"""
+    regressions = 0
+    print(f"\n{'этап':<22} {'было, с':>10} {'стало, с':>10} {'изменение':>10}")
+    for name, stage in results['stages'].items():
+        old = baseline.get('stages', {}).get(name)
+        if old is None:
+            continue
+        change = stage['best'] / old['best'] - 1 if old['best'] > 0 else 0.0
+        mark = ''
+        if change > threshold:
+            mark = '  РЕГРЕССИЯ'
+            regressions += 1
+        print(f"{name:<22} {old['best']:>10.4f} {stage['best']:>10.4f} {change:>+10.1%}{mark}")
+    if baseline.get('repo') != results.get('repo'):
+        print("⚠️  Параметры репозитория отличаются от прошлого прогона")
+    if baseline.get('jobs') != results.get('jobs'):
+        print(f"⚠️  Число потоков отличается: было {baseline.get('jobs')}, стало {results.get('jobs')}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк этапов дампа')
+    parser.add_argument('--repo', help='Существующий репозиторий вместо синтетического')
+    parser.add_argument('--stages', help=f"Этапы через запятую (по умолчанию все: {','.join(STAGES)})")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='Потоки чтения для read/write/full_dump и обхода для traversal_parallel (не меньше 2)')
+    parser.add_argument('--legacy-limit', type=int, default=200,
+                        help='Сколько путей проверять медленным should_skip_file')
+    parser.add_argument('--output', help='Сохранить результаты в JSON')
+    parser.add_argument('--compare', help='JSON прошлого прогона для сравнения')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='Замедление, которое считается регрессией (доля, по умолчанию 0.10)')
+    synthetic_repo.add_arguments(parser)
+    args = parser.parse_args()
+
+    names = args.stages.split(',') if args.stages else list(STAGES)
+    unknown = [name for name in names if name not in STAGES]
+    if unknown:
+        parser.error(f"Неизвестные этапы: {', '.join(unknown)}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        if args.repo:
+            repo = Path(args.repo).resolve()
+            repo_info = {'path': str(repo)}
+        else:
+            repo = tmp / 'repo'
+            print("Генерация синтетического репозитория...")
+            repo_info = synthetic_repo.generate_repo(repo, **synthetic_repo.params_from_args(args))
+        stages = Stages(repo, tmp, max(1, args.jobs), args.legacy_limit)
+
+        results = {
+            'version': RESULTS_VERSION,
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'jobs': stages.jobs,
+            'repeat': args.repeat,
+            'repo': repo_info,
+            'stages': {},
+        }
+        print(f"{'этап':<22} {'лучшее, с':>10} {'медиана, с':>11} {'элементов':>10} {'в секунду':>12}")
+        for name in names:
+            stage = run_stage(stages, name, args.repeat)
+            results['stages'][name] = stage
+            rate = f"{stage['items_per_second']:.0f}" if stage['items_per_second'] else '-'
+            print(f"{name:<22} {stage['best']:>10.4f} {stage['median']:>11.4f} {stage['items']:>10} {rate:>12}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=1)
+        print(f"\nРезультаты сохранены: {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+"""
+Прежняя реализация .gitignore без регулярных выражений: линейный список
+шаблонов parse_gitignore и проверка пути через fnmatch. В repo_dumper.py
+ее заменил GitignoreMatcher; здесь она - база для сравнения в бенчмарках.
+"""
+
+import fnmatch
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from repo_dumper import BINARY_EXTENSIONS, VENV_DIR_NAMES  # noqa: E402
+
+
+def parse_gitignore(repo_path):
+    """
+    Парсинг всех файлов .gitignore в репозитории.
+    Возвращает список шаблонов для игнорирования.
+    """
+    gitignore_patterns = []
+    
+    # Ищем все файлы .gitignore в репозитории
+    for gitignore_file in repo_path.rglob('.gitignore'):
+        try:
+            with open(gitignore_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    
+                    # Пропускаем пустые строки и комментарии
+                    if not line or line.startswith('#'):
+                        continue
+                    
+                    # Получаем относительный путь от корня репозитория
+                    rel_gitignore_path = gitignore_file.parent.relative_to(repo_path)
+                    
+                    # Обрабатываем шаблон
+                    pattern = line
+                    
+                    # Если шаблон начинается с /, он считается от директории .gitignore
+                    if pattern.startswith('/'):
+                        pattern = pattern[1:]
+                    
+                    # Создаем полный относительный путь от корня репозитория
+                    if rel_gitignore_path != Path('.'):
+                        full_pattern = str(rel_gitignore_path / pattern)
+                    else:
+                        full_pattern = pattern
+                    
+                    # Нормализуем разделители путей
+                    full_pattern = full_pattern.replace('\\', '/')
+                    
+                    # Добавляем паттерн для директории (если заканчивается на /)
+                    if full_pattern.endswith('/'):
+                        # Для директорий добавляем два варианта:
+                        # 1. Сам паттерн (для проверки директорий)
+                        gitignore_patterns.append(full_pattern)
+                        # 2. Паттерн с ** для файлов внутри
+                        gitignore_patterns.append(full_pattern + '**')
+                        # 3. Паттерн без / для точного совпадения
+                        gitignore_patterns.append(full_pattern.rstrip('/'))
+                    else:
+                        gitignore_patterns.append(full_pattern)
+                    
+        except (UnicodeDecodeError, IOError):
+            # Пропускаем файлы, которые не можем прочитать
+            continue
+    
+    return gitignore_patterns
+
+
+def should_ignore_path(path, gitignore_patterns, repo_path):
+    """
+    Проверяет, должен ли путь быть проигнорирован на основе .gitignore шаблонов.
+    """
+    try:
+        # Получаем относительный путь от корня репозитория
+        rel_path = path.relative_to(repo_path)
+        path_str = str(rel_path).replace('\\', '/')
+        
+        # Проверяем каждый шаблон
+        for pattern in gitignore_patterns:
+            # Специальная обработка для шаблонов с **
+            if '**' in pattern:
+                # Заменяем ** на * для fnmatch
+                fnmatch_pattern = pattern.replace('**', '*')
+                # Для шаблонов с ** используем более гибкое сравнение
+                if fnmatch.fnmatch(path_str, fnmatch_pattern):
+                    return True
+                # Также проверяем частичные совпадения для директорий
+                if pattern.endswith('/**') and path_str.startswith(pattern.rstrip('**')):
+                    return True
+            elif pattern.endswith('/'):
+                # Паттерн для директории
+                if path_str == pattern.rstrip('/') or path_str.startswith(pattern):
+                    return True
+            else:
+                # Простое сопоставление с шаблоном
+                if fnmatch.fnmatch(path_str, pattern):
+                    return True
+                # Проверяем, является ли файл внутри игнорируемой директории
+                if '/' in pattern and fnmatch.fnmatch(path_str, pattern + '/**'):
+                    return True
+                # Проверяем, совпадает ли начало пути
+                if path_str.startswith(pattern + '/'):
+                    return True
+        
+        return False
+    except ValueError:
+        # Если не можем получить относительный путь
+        return False
+
+
+def _skip_by_parts(parts, filters):
+    """Проверка служебных и скрытых папок по компонентам пути"""
+    if filters['skip_git'] and '.git' in parts:
+        return True
+    if filters['skip_node_modules'] and 'node_modules' in parts:
+        return True
+    if filters['skip_venv'] and any(x in VENV_DIR_NAMES for x in parts):
+        return True
+    if filters['skip_hidden'] and any(part.startswith('.') for part in parts if part not in ['.', '..']):
+        return True
+    return False
+
+
+def should_skip_file(file_path, filters, repo_path, gitignore_patterns, output_file=None):
+    """Определить, нужно ли пропускать файл"""
+    try:
+        rel_path = file_path.relative_to(repo_path)
+    except ValueError:
+        return True
+    
+    # Пропускаем выходной файл
+    if output_file and file_path.exists() and output_file.exists():
+        try:
+            if file_path.samefile(output_file):
+                return True
+        except:
+            pass
+    
+    # Пропускаем по пути
+    path_str = str(rel_path)
+    parts = path_str.split(os.sep)
+    
+    # Проверяем правила .gitignore
+    if filters.get('use_gitignore', True) and gitignore_patterns:
+        if should_ignore_path(file_path, gitignore_patterns, repo_path):
+            return True
+    
+    if _skip_by_parts(parts, filters):
+        return True
+    
+    # Пропускаем по расширению
+    if filters['skip_binary']:
+        if file_path.suffix.lower() in BINARY_EXTENSIONS:
+            return True
+    
+    # Проверяем размер файла
+    if filters['max_file_size']:
+        try:
+            if file_path.stat().st_size > filters['max_file_size']:
+                return True
+        except:
+            pass
+    
+    return False
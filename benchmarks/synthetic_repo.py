@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Генератор синтетических репозиториев для бенчмарков.
+Одинаковые параметры и seed дают байт-в-байт одинаковое дерево:
+исходники с разбросом размеров, вложенные .gitignore с множеством
+правил, игнорируемые файлы, бинарные файлы, node_modules и venv.
+Использование:
+  python3 benchmarks/synthetic_repo.py /tmp/synthetic --files 20000
+  python3 benchmarks/synthetic_repo.py /tmp/synthetic --depth 8 --gitignores 50 --rules 200
+"""
+
+import argparse
+import json
+import math
+import random
+import subprocess
+import sys
+from pathlib import Path
+
+WORDS = ('def', 'return', 'value', 'self', 'import', 'class', 'data', 'result', 'item',
+         'config', 'path', 'index', 'count', 'name', 'error', 'list', 'none', 'true')
+TEXT_EXTENSIONS = ('.py', '.js', '.ts', '.md', '.txt', '.json', '.yaml', '.c', '.h', '.go')
+BINARY_EXTENSIONS = ('.png', '.pdf', '.zip', '.so')
+
+DEFAULTS = {
+    'files': 5000,
+    'median_size': 2048,
+    'max_size': 1024 * 1024,
+    'depth': 5,
+    'fanout': 8,
+    'gitignores': 20,
+    'rules': 100,
+    'ignored': 2000,
+    'binaries': 200,
+    'node_modules': 3000,
+    'venv': 1000,
+    'seed': 1,
+    'git': True,
+}
+
+
+def _text(rng, size):
+    """Текст из коротких строк примерно заданного размера"""
+    lines = []
+    total = 0
+    while total < size:
+        line = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 12)))
+        lines.append(line)
+        total += len(line) + 1
+    return ('\n'.join(lines) + '\n')[:max(size, 1)]
+
+
+def _size(rng, median, maximum):
+    """Логнормальное распределение размеров: много мелких файлов, редкие крупные"""
+    return min(maximum, max(1, int(rng.lognormvariate(math.log(median), 1.2))))
+
+
+def _directories(rng, count, depth, fanout):
+    """Набор вложенных директорий глубиной до depth"""
+    dirs = ['']
+    for i in range(count):
+        parent = rng.choice(dirs)
+        if parent.count('/') + 1 >= depth:
+            parent = ''
+        name = f"pkg{i % fanout}_{i}"
+        dirs.append(f"{parent}/{name}" if parent else name)
+    return dirs
+
+
+def _write(root, rel_path, data):
+    path = root / rel_path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    path.write_bytes(data)
+    return len(data)
+
+
+def generate_repo(root, **params):
+    """
+    Создает синтетический репозиторий в root (директория не должна
+    существовать) и возвращает описание: параметры и число файлов
+    каждого вида. Параметры - см. DEFAULTS.
+    """
+    options = dict(DEFAULTS)
+    options.update(params)
+    rng = random.Random(options['seed'])
+    root = Path(root)
+    root.mkdir(parents=True)
+    summary = {'params': options, 'text_files': 0, 'text_bytes': 0, 'ignored_files': 0,
+               'binary_files': 0, 'node_modules_files': 0, 'venv_files': 0, 'gitignore_files': 0}
+
+    dir_count = max(1, options['files'] // max(1, options['fanout'] * 2))
+    dirs = _directories(rng, dir_count, options['depth'], options['fanout'])
+
+    # Исходники
+    for i in range(options['files']):
+        directory = rng.choice(dirs)
+        name = f"file{i}{rng.choice(TEXT_EXTENSIONS)}"
+        rel_path = f"{directory}/{name}" if directory else name
+        size = _size(rng, options['median_size'], options['max_size'])
+        summary['text_bytes'] += _write(root, rel_path, _text(rng, size))
+        summary['text_files'] += 1
+
+    # Вложенные .gitignore: каждое правило - свой вид шаблона
+    gitignore_dirs = [''] + rng.sample(dirs[1:], min(len(dirs) - 1, max(0, options['gitignores'] - 1)))
+    ignore_targets = []
+    for n, directory in enumerate(gitignore_dirs):
+        rules = ['*.log', 'build/', '/dist'] if directory == '' else []
+        for i in range(options['rules']):
+            kind = i % 6
+            if kind == 0:
+                rules.append(f"*.ext{n}_{i}")
+            elif kind == 1:
+                rules.append(f"name{n}_{i}.cfg")
+            elif kind == 2:
+                rules.append(f"cache{n}_{i}/")
+            elif kind == 3:
+                rules.append(f"/out{n}_{i}/gen")
+            elif kind == 4:
+                rules.append(f"tmp{n}_{i}_*")
+            else:
+                rules.append(f"**/logs{n}_{i}/*.log")
+        rules.append(f"!keep{n}.log")
+        _write(root, f"{directory}/.gitignore" if directory else '.gitignore', '\n'.join(rules) + '\n')
+        summary['gitignore_files'] += 1
+        ignore_targets.append((directory, n))
+
+    # Файлы, попадающие под правила .gitignore
+    for i in range(options['ignored']):
+        directory, n = rng.choice(ignore_targets)
+        rule = rng.randint(0, options['rules'] - 1) if options['rules'] else 0
+        choice = i % 4
+        if choice == 0:
+            name = f"trace{i}.log"
+        elif choice == 1:
+            name = f"build/artifact{i}.o"
+        elif choice == 2:
+            name = f"cache{n}_{rule - rule % 6 + 2}/entry{i}.bin"
+        else:
+            name = f"tmp{n}_{rule - rule % 6 + 4}_{i}"
+        rel_path = f"{directory}/{name}" if directory else name
+        _write(root, rel_path, _text(rng, 64))
+        summary['ignored_files'] += 1
+
+    # Бинарные файлы: известные расширения и нераспознаваемые по имени
+    for i in range(options['binaries']):
+        directory = rng.choice(dirs)
+        ext = rng.choice(BINARY_EXTENSIONS) if i % 2 else '.dat'
+        rel_path = f"{directory}/blob{i}{ext}" if directory else f"blob{i}{ext}"
+        size = _size(rng, 4096, 65536)
+        _write(root, rel_path, b'\x89PNG\r\n\x1a\n' + rng.getrandbits(8 * size).to_bytes(size, 'little'))
+        summary['binary_files'] += 1
+
+    # Зависимости
+    for i in range(options['node_modules']):
+        _write(root, f"node_modules/dep{i % 50}/lib/sub{i % 7}/index{i}.js", 'module.exports = 1;\n')
+        summary['node_modules_files'] += 1
+    for i in range(options['venv']):
+        _write(root, f"venv/lib/python3/site-packages/pkg{i % 30}/mod{i}.py", 'x = 1\n')
+        summary['venv_files'] += 1
+
+    if options['git']:
+        subprocess.run(['git', 'init', '-q'], cwd=root, check=True)
+        subprocess.run(['git', 'add', '-A'], cwd=root, check=True)
+        subprocess.run(['git', '-c', 'user.name=bench', '-c', 'user.email=bench@example.com',
+                        'commit', '-qm', 'synthetic'], cwd=root, check=True)
+    return summary
+
+
+def add_arguments(parser):
+    """Ключи генератора (общие с bench_suite.py)"""
+    parser.add_argument('--files', type=int, default=DEFAULTS['files'], help='Число исходников')
+    parser.add_argument('--median-size', type=int, default=DEFAULTS['median_size'],
+                        help='Медианный размер исходника, байт')
+    parser.add_argument('--max-size', type=int, default=DEFAULTS['max_size'], help='Максимальный размер, байт')
+    parser.add_argument('--depth', type=int, default=DEFAULTS['depth'], help='Глубина вложенности директорий')
+    parser.add_argument('--fanout', type=int, default=DEFAULTS['fanout'], help='Ветвление директорий')
+    parser.add_argument('--gitignores', type=int, default=DEFAULTS['gitignores'], help='Число файлов .gitignore')
+    parser.add_argument('--rules', type=int, default=DEFAULTS['rules'], help='Правил в каждом .gitignore')
+    parser.add_argument('--ignored', type=int, default=DEFAULTS['ignored'], help='Число игнорируемых файлов')
+    parser.add_argument('--binaries', type=int, default=DEFAULTS['binaries'], help='Число бинарных файлов')
+    parser.add_argument('--node-modules', type=int, default=DEFAULTS['node_modules'],
+                        help='Файлов в node_modules')
+    parser.add_argument('--venv', type=int, default=DEFAULTS['venv'], help='Файлов в venv')
+    parser.add_argument('--seed', type=int, default=DEFAULTS['seed'])
+    parser.add_argument('--no-git', action='store_true', help='Не создавать git-репозиторий')
+
+
+def params_from_args(args):
+    return {
+        'files': args.files,
+        'median_size': args.median_size,
+        'max_size': args.max_size,
+        'depth': args.depth,
+        'fanout': args.fanout,
+        'gitignores': args.gitignores,
+        'rules': args.rules,
+        'ignored': args.ignored,
+        'binaries': args.binaries,
+        'node_modules': args.node_modules,
+        'venv': args.venv,
+        'seed': args.seed,
+        'git': not args.no_git,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Генератор синтетического репозитория')
+    parser.add_argument('path', help='Директория для репозитория (не должна существовать)')
+    add_arguments(parser)
+    args = parser.parse_args()
+    if Path(args.path).exists():
+        print(f"Директория уже существует: {args.path}", file=sys.stderr)
+        sys.exit(1)
+    summary = generate_repo(args.path, **params_from_args(args))
+    json.dump(summary, sys.stdout, ensure_ascii=False, indent=1)
+    print()
+
+
+if __name__ == '__main__':
+    main()
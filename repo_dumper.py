@@ -13,7 +13,28 @@ import sys
 import argparse
 from pathlib import Path
 import subprocess
-import fnmatch
+import re
+import codecs
+import contextlib
+import mmap
+import json
+import time
+import hashlib
+import struct
+import select
+import ctypes
+import ctypes.util
+import zlib
+import stat as stat_module
+import threading
+import queue
+import io
+import gzip
+from collections import deque
+import glob
+import heapq
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, Future, as_completed
 
 def parse_arguments():
     """Парсинг аргументов командной строки"""
@@ -26,6 +47,25 @@ def parse_arguments():
   %(prog)s -q                  # Быстрый режим, запросит путь
   %(prog)s -q ./my-repo        # Быстрый режим с указанием пути
   %(prog)s -q /путь/к/репо     # Быстрый режим с полным путем
+  %(prog)s -q -j 8 ./my-repo   # Чтение файлов в 8 потоков
+  %(prog)s -q --walk-jobs 16 /mnt/nfs/repo  # Обход директорий в 16 потоков (сетевые ФС)
+  %(prog)s -q --incremental .  # Перечитать только измененные файлы
+  %(prog)s -q --source=git-index .  # Список файлов из индекса git
+  %(prog)s -q --rev v1.0 .     # Дамп тега v1.0 без checkout
+  %(prog)s -q --since main .   # Только файлы, измененные с main (включая рабочую копию)
+  %(prog)s -q --range v1.0..v1.1 .  # Только файлы, измененные между тегами
+  %(prog)s -q --compress gzip . # Сжатый дамп <репо>_dump.txt.gz
+  %(prog)s -q --max-shard-size 100K --shard-unit tokens .  # Части по ~100 тыс. токенов
+  %(prog)s -q --toc .          # Оглавление для чтения файлов через DumpReader
+  %(prog)s -q --dedup .        # Одинаковые файлы записываются один раз
+  %(prog)s -q --strip all .    # Без комментариев, повторных лицензий, лишних пробелов и пустых строк
+  %(prog)s -q --format jsonl . # По записи JSON на файл: <репо>_dump.jsonl (binary - <репо>_dump.bin)
+  %(prog)s -q --max-total-size 500M .  # Не больше 500 МБ, дальше дамп обрезается
+  %(prog)s -q --stats stats.json .  # Отчет о времени по этапам
+  %(prog)s -q --watch .        # Пересобирать дамп при каждом изменении файлов
+  %(prog)s -q --no-git-status .  # Без git status (быстрее на больших репозиториях)
+  %(prog)s --batch './repos/*' --workers 8  # Пакетный режим: много репозиториев
+  %(prog)s --batch repos.txt --output-dir dumps  # Список путей из файла
         '''
     )
     
@@ -35,164 +75,629 @@ def parse_arguments():
         help='Быстрый режим: требует путь к репозиторию, использует значения по умолчанию'
     )
     
+    parser.add_argument(
+        '-j', '--jobs',
+        type=int,
+        default=1,
+        metavar='N',
+        help='Число потоков для чтения файлов (по умолчанию 1, порядок в дампе сохраняется)'
+    )
+    
+    parser.add_argument(
+        '--walk-jobs',
+        type=int,
+        default=1,
+        metavar='N',
+        help='Число потоков обхода директорий (по умолчанию 1). Ускоряет обход на сетевых '
+             'файловых системах (NFS); порядок файлов в дампе не меняется'
+    )
+    
+    parser.add_argument(
+        '--incremental',
+        action='store_true',
+        help='Инкрементальный режим: перечитывать только измененные файлы '
+             '(манифест хранится рядом с дампом в <дамп>.manifest.json)'
+    )
+    
+    parser.add_argument(
+        '--source',
+        choices=['walk', 'git-index'],
+        default='walk',
+        help='Источник списка файлов: обход директорий (walk, по умолчанию) '
+             'или индекс git (git-index, один вызов git ls-files)'
+    )
+    
+    parser.add_argument(
+        '--rev',
+        metavar='РЕВИЗИЯ',
+        help='Снять дамп коммита, ветки или тега без checkout (git ls-tree + git cat-file --batch)'
+    )
+    
+    parser.add_argument(
+        '--since',
+        metavar='РЕВИЗИЯ',
+        help='Дамп только файлов, измененных с ревизии по рабочую копию (включая неотслеживаемые); '
+             'удаленные и переименованные файлы отмечаются строкой ИЗМЕНЕНИЕ'
+    )
+    
+    parser.add_argument(
+        '--range',
+        dest='diff_range',
+        metavar='A..B',
+        help='Дамп только файлов, измененных между ревизиями A и B (A...B - от общего предка); '
+             'содержимое берется из B без checkout'
+    )
+    
+    parser.add_argument(
+        '--compress',
+        choices=sorted(COMPRESSION_SUFFIXES),
+        help='Сжимать дамп на лету (gzip, xz или zstd - нужен модуль zstandard); '
+             'к имени файла добавляется .gz/.xz/.zst'
+    )
+    
+    parser.add_argument(
+        '--max-shard-size',
+        type=parse_size,
+        metavar='РАЗМЕР',
+        help='Разбить дамп на части не больше РАЗМЕР (суффиксы K, M, G) по границам файлов; '
+             'список файлов каждой части пишется в <репо>_dump.index.json'
+    )
+    
+    parser.add_argument(
+        '--shard-unit',
+        choices=['bytes', 'tokens'],
+        default='bytes',
+        help='В чем измеряется --max-shard-size: байты (по умолчанию) или '
+             'оценочные токены (~4 байта на токен)'
+    )
+    
+    parser.add_argument(
+        '--toc',
+        action='store_true',
+        help='Записать оглавление <дамп>.toc.json со смещениями файлов '
+             '(быстрое чтение отдельных файлов через DumpReader)'
+    )
+    
+    parser.add_argument(
+        '--dedup',
+        action='store_true',
+        help='Записывать содержимое одинаковых файлов один раз, '
+             'для повторов - заголовок со ссылкой ДУБЛИКАТ: <первый файл>'
+    )
+    
+    parser.add_argument(
+        '--strip',
+        type=parse_strip,
+        metavar='ПРЕОБРАЗОВАНИЯ',
+        help='Сокращать содержимое файлов: all или через запятую comments (комментарии по расширению: '
+             'Python, TOML, C-подобные языки, JS/TS, CSS), license (повторный лицензионный заголовок '
+             'заменяется ссылкой на первый файл), trailing (пробелы в конце строк), blank (подряд идущие '
+             'пустые строки); экономия по каждому выводится после дампа'
+    )
+    
+    parser.add_argument(
+        '--format',
+        dest='output_format',
+        choices=list(OUTPUT_FORMATS),
+        default='text',
+        help='Формат вывода: text (по умолчанию, заголовки в рамках), jsonl (по строке JSON на файл: '
+             'path, size, mtime, hash, content) или binary (кадры с длинами, содержимое как есть); '
+             'jsonl и binary читаются через FramedDumpReader'
+    )
+    
+    parser.add_argument(
+        '--watch',
+        action='store_true',
+        help='После дампа следить за изменениями (inotify, иначе опрос) и пересобирать дамп; '
+             'неизмененные файлы копируются из прошлого дампа, события в игнорируемых путях не учитываются'
+    )
+    
+    parser.add_argument(
+        '--poll',
+        action='store_true',
+        help='В режиме --watch опрашивать файлы вместо inotify'
+    )
+    
+    parser.add_argument(
+        '--no-git-status',
+        dest='git_status',
+        action='store_false',
+        help='Не запускать git status: в дампе не будет списка несохраненных изменений '
+             '(ветка и последний коммит читаются из .git без запуска git)'
+    )
+    
+    parser.add_argument(
+        '--max-total-size',
+        type=parse_size,
+        metavar='РАЗМЕР',
+        help='Лимит размера дампа до сжатия (например 500M, 2G): файлы, которые не помещаются, '
+             'не пишутся, а в дамп добавляется отметка ДАМП ОБРЕЗАН'
+    )
+    
+    parser.add_argument(
+        '--stats',
+        metavar='ФАЙЛ',
+        help='Сохранить отчет в JSON: время по этапам, счетчики операций, причины пропуска, '
+             'срабатывания правил .gitignore, самые медленные и крупные файлы'
+    )
+    
+    parser.add_argument(
+        '--batch',
+        nargs='+',
+        metavar='ПУТЬ',
+        help='Пакетный режим без вопросов: дампы всех перечисленных репозиториев '
+             '(пути, шаблоны glob в кавычках или файлы со списком путей) в пуле процессов'
+    )
+    
+    parser.add_argument(
+        '--workers',
+        type=int,
+        metavar='N',
+        help='Число процессов пакетного режима (по умолчанию - число ядер)'
+    )
+    
+    parser.add_argument(
+        '--io-limit',
+        type=int,
+        metavar='N',
+        help='Сколько файлов все процессы пакетного режима читают одновременно (по умолчанию без ограничения)'
+    )
+    
+    parser.add_argument(
+        '--output-dir',
+        metavar='ДИРЕКТОРИЯ',
+        help='Куда сохранять дампы пакетного режима (по умолчанию текущая директория)'
+    )
+    
     parser.add_argument(
         'path',
         nargs='?',
         help='Путь к репозитории (только в быстром режиме)'
     )
     
-    return parser.parse_args()
+    args = parser.parse_args()
+    if sum(bool(option) for option in (args.rev, args.since, args.diff_range)) > 1:
+        parser.error("ключи --rev, --since и --range взаимоисключающие")
+    if args.diff_range and split_diff_range(args.diff_range) is None:
+        parser.error(f"--range: ожидается диапазон вида A..B или A...B, получено '{args.diff_range}'")
+    if args.watch and (args.batch or args.rev or args.diff_range):
+        parser.error("--watch следит за рабочей копией и несовместим с --batch, --rev и --range")
+    return args
+
+# Символы, при наличии которых шаблон .gitignore не является литералом
+_GLOB_CHARS = frozenset('*?[\\')
+
 
-def parse_gitignore(repo_path):
+def _has_glob(text):
+    """Проверяет, содержит ли строка спецсимволы glob"""
+    return any(c in _GLOB_CHARS for c in text)
+
+
+def _gitignore_glob_to_regex(pattern):
     """
-    Парсинг всех файлов .gitignore в репозитории.
-    Возвращает список шаблонов для игнорирования.
+    Переводит шаблон .gitignore в регулярное выражение.
+    Поддерживает *, ?, [...], экранирование через \\ и семантику **:
+    ведущий "**/" - любая глубина, завершающий "/**" - все внутри,
+    "/**/" - ноль или больше директорий. Прочие ** работают как *.
     """
-    gitignore_patterns = []
-    
-    # Ищем все файлы .gitignore в репозитории
-    for gitignore_file in repo_path.rglob('.gitignore'):
-        try:
-            with open(gitignore_file, 'r', encoding='utf-8') as f:
-                for line in f:
-                    line = line.strip()
-                    
-                    # Пропускаем пустые строки и комментарии
-                    if not line or line.startswith('#'):
-                        continue
-                    
-                    # Получаем относительный путь от корня репозитория
-                    rel_gitignore_path = gitignore_file.parent.relative_to(repo_path)
-                    
-                    # Обрабатываем шаблон
-                    pattern = line
-                    
-                    # Если шаблон начинается с /, он считается от директории .gitignore
-                    if pattern.startswith('/'):
-                        pattern = pattern[1:]
-                    
-                    # Создаем полный относительный путь от корня репозитория
-                    if rel_gitignore_path != Path('.'):
-                        full_pattern = str(rel_gitignore_path / pattern)
-                    else:
-                        full_pattern = pattern
-                    
-                    # Нормализуем разделители путей
-                    full_pattern = full_pattern.replace('\\', '/')
-                    
-                    # Добавляем паттерн для директории (если заканчивается на /)
-                    if full_pattern.endswith('/'):
-                        # Для директорий добавляем два варианта:
-                        # 1. Сам паттерн (для проверки директорий)
-                        gitignore_patterns.append(full_pattern)
-                        # 2. Паттерн с ** для файлов внутри
-                        gitignore_patterns.append(full_pattern + '**')
-                        # 3. Паттерн без / для точного совпадения
-                        gitignore_patterns.append(full_pattern.rstrip('/'))
-                    else:
-                        gitignore_patterns.append(full_pattern)
-                    
-        except (UnicodeDecodeError, IOError):
-            # Пропускаем файлы, которые не можем прочитать
+    out = []
+    i = 0
+    n = len(pattern)
+    while i < n:
+        c = pattern[i]
+        if c == '*':
+            if pattern.startswith('**', i):
+                at_start = i == 0 or pattern[i - 1] == '/'
+                j = i + 2
+                if at_start and j < n and pattern[j] == '/':
+                    out.append('(?:.*/)?')
+                    i = j + 1
+                    continue
+                if at_start and j == n:
+                    out.append('.*')
+                    i = j
+                    continue
+                out.append('[^/]*')
+                i = j
+                continue
+            out.append('[^/]*')
+        elif c == '?':
+            out.append('[^/]')
+        elif c == '[':
+            j = i + 1
+            if j < n and pattern[j] in '!^':
+                j += 1
+            if j < n and pattern[j] == ']':
+                j += 1
+            while j < n and pattern[j] != ']':
+                j += 1
+            if j >= n:
+                # Незакрытая скобка - обычный символ
+                out.append(re.escape(c))
+            else:
+                body = pattern[i + 1:j]
+                if body[:1] in ('!', '^'):
+                    body = '^' + body[1:]
+                body = body.replace('\\', '\\\\')
+                out.append('(?!/)[' + body + ']')
+                i = j
+        elif c == '\\' and i + 1 < n:
+            i += 1
+            out.append(re.escape(pattern[i]))
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return ''.join(out)
+
+
+class GitignoreRule:
+    """Одно скомпилированное правило .gitignore"""
+
+    __slots__ = ('index', 'base', 'text', 'pattern', 'negate', 'dir_only',
+                 'anchored', 'regex')
+
+    def __init__(self, index, base, text, pattern, negate, dir_only, anchored):
+        self.index = index
+        self.base = base
+        self.text = text
+        self.pattern = pattern
+        self.negate = negate
+        self.dir_only = dir_only
+        self.anchored = anchored
+        self.regex = None
+
+    def display(self):
+        """Правило в виде строки относительно корня репозитория"""
+        return f"{self.base}/{self.text}" if self.base else self.text
+
+
+def parse_gitignore_line(line):
+    """
+    Разбирает строку .gitignore.
+    Возвращает (шаблон, отрицание, только_директории, привязан_к_директории)
+    или None для пустых строк и комментариев.
+    """
+    line = line.rstrip('\r\n')
+    if not line or line.startswith('#'):
+        return None
+
+    # Хвостовые пробелы игнорируются, если не экранированы
+    while line.endswith(' ') and not line.endswith('\\ '):
+        line = line[:-1]
+
+    negate = False
+    if line.startswith('!'):
+        negate = True
+        line = line[1:]
+    elif line.startswith('\\!') or line.startswith('\\#'):
+        line = line[1:]
+
+    dir_only = line.endswith('/')
+    line = line.rstrip('/')
+    if not line:
+        return None
+
+    # Шаблон со слешем в начале или середине привязан к директории .gitignore
+    anchored = '/' in line
+    line = line.lstrip('/')
+    if not line:
+        return None
+
+    return line, negate, dir_only, anchored
+
+
+def _pick_rule(rules, best, is_dir):
+    """Выбирает из отсортированного списка правило с наибольшим индексом"""
+    for rule in rules:
+        if best is not None and rule.index < best.index:
+            break
+        if rule.dir_only and not is_dir:
             continue
-    
-    return gitignore_patterns
+        return rule
+    return best
 
-def parse_gitignore(repo_path):
+
+class _GlobSet:
     """
-    Парсинг всех файлов .gitignore в репозитории.
-    Возвращает список шаблонов для игнорирования.
+    Набор glob-правил, объединенных в одно регулярное выражение.
+    Альтернативы идут от последнего правила к первому, поэтому первая
+    сработавшая группа - правило с наибольшим индексом.
     """
-    gitignore_patterns = []
-    
-    # Ищем все файлы .gitignore в репозитории
-    for gitignore_file in repo_path.rglob('.gitignore'):
+
+    def __init__(self):
+        self.rules = []
+        self._regex_all = None
+        self._regex_files = None
+        self._files = None
+
+    def add(self, rule):
+        self.rules.append(rule)
+        self._regex_all = None
+
+    def _compile(self):
+        self.rules.sort(key=lambda r: r.index, reverse=True)
+        self._files = [r for r in self.rules if not r.dir_only]
+        self._regex_all = re.compile(
+            '|'.join(f"({r.regex})" for r in self.rules))
+        self._regex_files = re.compile(
+            '|'.join(f"({r.regex})" for r in self._files)) if self._files else None
+
+    def match(self, text, is_dir):
+        """Возвращает последнее подходящее правило или None"""
+        if self._regex_all is None:
+            self._compile()
+        if is_dir:
+            regex, rules = self._regex_all, self.rules
+        else:
+            regex, rules = self._regex_files, self._files
+            if regex is None:
+                return None
+        m = regex.fullmatch(text)
+        if m is None:
+            return None
+        return rules[m.lastindex - 1]
+
+
+class _GitignoreScope:
+    """
+    Правила одного файла .gitignore, разложенные по индексам:
+    хеш-таблица имен, таблица расширений, префиксное дерево
+    литеральных путей и регулярные выражения для остального.
+    """
+
+    def __init__(self, base):
+        self.base = base
+        self.rules = []
+        self._names = {}
+        self._suffixes = {}
+        self._globs = _GlobSet()
+        self._trie = {}
+
+    def add(self, rule):
+        self.rules.append(rule)
+        pattern = rule.pattern
+
+        if not rule.anchored:
+            if not _has_glob(pattern):
+                self._names.setdefault(pattern, []).insert(0, rule)
+            elif pattern.startswith('*.') and not _has_glob(pattern[1:]):
+                self._suffixes.setdefault(pattern[1:], []).insert(0, rule)
+            else:
+                rule.regex = _gitignore_glob_to_regex(pattern)
+                self._globs.add(rule)
+            return
+
+        # Списки правил хранятся от последнего к первому.
+        # Привязанные правила кладем в дерево по литеральному префиксу:
+        # ключ '' - литеральные пути, '\0' - glob-правила узла
+        parts = pattern.split('/')
+        literal = not _has_glob(pattern)
+        node = self._trie
+        for part in (parts if literal else parts[:-1]):
+            if _has_glob(part):
+                break
+            node = node.setdefault(part, {})
+        if literal:
+            node.setdefault('', []).insert(0, rule)
+        else:
+            rule.regex = _gitignore_glob_to_regex(pattern)
+            node.setdefault('\0', _GlobSet()).add(rule)
+
+    def match(self, sub_path, name, is_dir):
+        """
+        Находит последнее правило, подходящее к пути внутри области.
+        Возвращает правило или None.
+        """
+        best = None
+
+        rules = self._names.get(name)
+        if rules:
+            best = _pick_rule(rules, best, is_dir)
+
+        if self._suffixes:
+            # Проверяем все суффиксы вида ".tar.gz", ".gz"
+            pos = name.find('.')
+            while pos != -1:
+                rules = self._suffixes.get(name[pos:])
+                if rules:
+                    best = _pick_rule(rules, best, is_dir)
+                pos = name.find('.', pos + 1)
+
+        if self._globs.rules:
+            rule = self._globs.match(name, is_dir)
+            if rule is not None and (best is None or rule.index > best.index):
+                best = rule
+
+        if self._trie:
+            parts = sub_path.split('/')
+            last = len(parts)
+            node = self._trie
+            depth = 0
+            while True:
+                globs = node.get('\0')
+                if globs is not None:
+                    rule = globs.match(sub_path, is_dir)
+                    if rule is not None and (best is None or rule.index > best.index):
+                        best = rule
+                if depth == last:
+                    rules = node.get('')
+                    if rules:
+                        best = _pick_rule(rules, best, is_dir)
+                    break
+                node = node.get(parts[depth])
+                if node is None:
+                    break
+                depth += 1
+
+        return best
+
+
+class GitignoreMatcher:
+    """
+    Скомпилированный набор правил .gitignore.
+    Правила компилируются один раз, каждое действует только в пределах
+    директории своего .gitignore. Поддерживаются отрицание (!) и **.
+    Правила из более глубоких .gitignore имеют приоритет.
+    """
+
+    def __init__(self):
+        self._scopes = {}
+        self._count = 0
+        self._dir_cache = {}
+
+    @classmethod
+    def from_repo(cls, repo_path):
+        """
+        Собирает правила из файлов .gitignore репозитория и исключения
+        git (см. add_excludes). В .git и игнорируемые директории не
+        заходит: их .gitignore ни на что не влияют.
+        """
+        matcher = cls.for_walk(repo_path)
+        root = str(repo_path)
+        stack = ['']
+        while stack:
+            rel_dir = stack.pop()
+            abs_dir = os.path.join(root, rel_dir) if rel_dir else root
+            matcher.load_file(rel_dir, os.path.join(abs_dir, '.gitignore'))
+            try:
+                with os.scandir(abs_dir) as it:
+                    names = sorted(e.name for e in it if e.name != '.git' and e.is_dir(follow_symlinks=False))
+            except OSError:
+                continue
+            for name in reversed(names):
+                rel_path = f"{rel_dir}/{name}" if rel_dir else name
+                if not matcher.match(rel_path, True):
+                    stack.append(rel_path)
+        return matcher
+
+    @classmethod
+    def for_walk(cls, repo_path):
+        """
+        Набор только с исключениями git: файлы .gitignore подгружает
+        walk_repo по мере входа в директории (ленивый режим), так что
+        отсеченные директории никогда не открываются.
+        """
+        matcher = cls()
+        matcher.add_excludes(repo_path)
+        return matcher
+
+    def add_excludes(self, repo_path):
+        """
+        Добавляет исключения git с наименьшим приоритетом: глобальный
+        core.excludesFile, затем .git/info/exclude. Правила корневого
+        .gitignore добавляются позже и перекрывают их.
+        """
+        for path in git_exclude_files(repo_path):
+            self.load_file('', path)
+
+    def load_file(self, base, path):
+        """Добавляет правила файла path для директории base; False, если файла нет или он не читается"""
         try:
-            with open(gitignore_file, 'r', encoding='utf-8') as f:
-                for line in f:
-                    line = line.strip()
-                    
-                    # Пропускаем пустые строки и комментарии
-                    if not line or line.startswith('#'):
-                        continue
-                    
-                    # Получаем относительный путь от корня репозитория
-                    rel_gitignore_path = gitignore_file.parent.relative_to(repo_path)
-                    
-                    # Обрабатываем шаблон
-                    pattern = line
-                    
-                    # Если шаблон начинается с /, он считается от директории .gitignore
-                    if pattern.startswith('/'):
-                        pattern = pattern[1:]
-                    
-                    # Создаем полный относительный путь от корня репозитория
-                    if rel_gitignore_path != Path('.'):
-                        full_pattern = str(rel_gitignore_path / pattern)
-                    else:
-                        full_pattern = pattern
-                    
-                    # Нормализуем разделители путей
-                    full_pattern = full_pattern.replace('\\', '/')
-                    
-                    # Добавляем паттерн для директории (если заканчивается на /)
-                    if full_pattern.endswith('/'):
-                        # Для директорий добавляем два варианта:
-                        # 1. Сам паттерн (для проверки директорий)
-                        gitignore_patterns.append(full_pattern)
-                        # 2. Паттерн с ** для файлов внутри
-                        gitignore_patterns.append(full_pattern + '**')
-                        # 3. Паттерн без / для точного совпадения
-                        gitignore_patterns.append(full_pattern.rstrip('/'))
-                    else:
-                        gitignore_patterns.append(full_pattern)
-                    
-        except (UnicodeDecodeError, IOError):
+            with open(path, 'r', encoding='utf-8') as f:
+                lines = f.readlines()
+        except (UnicodeDecodeError, OSError):
             # Пропускаем файлы, которые не можем прочитать
-            continue
-    
-    return gitignore_patterns
+            return False
+        self.add_lines(base, lines)
+        return True
+
+    def add_lines(self, base, lines):
+        """Добавляет правила .gitignore, лежащего в директории base"""
+        scope = self._scopes.get(base)
+        if scope is None:
+            scope = self._scopes[base] = _GitignoreScope(base)
+        for line in lines:
+            parsed = parse_gitignore_line(line)
+            if parsed is None:
+                continue
+            pattern, negate, dir_only, anchored = parsed
+            text = line.strip()
+            scope.add(GitignoreRule(self._count, base, text, pattern,
+                                    negate, dir_only, anchored))
+            self._count += 1
+        self._dir_cache.clear()
+
+    def __len__(self):
+        return self._count
 
-def should_ignore_path(path, gitignore_patterns, repo_path):
+    def __bool__(self):
+        return self._count > 0
+
+    def patterns(self):
+        """Список правил в исходном виде для отчета"""
+        result = []
+        for scope in self._scopes.values():
+            result.extend(rule.display() for rule in scope.rules)
+        return result
+
+    def match(self, rel_path, is_dir=False):
+        """
+        Проверяет сам путь (без учета родительских директорий).
+        rel_path - путь относительно корня репозитория через '/'.
+        """
+        rule = self.match_rule(rel_path, is_dir)
+        return rule is not None and not rule.negate
+
+    def match_rule(self, rel_path, is_dir=False):
+        """Правило, решившее судьбу пути (в т.ч. отрицание), или None"""
+        name = rel_path.rpartition('/')[2]
+        scopes = self._scopes
+        # Идем от самой глубокой области к корню
+        pos = rel_path.rfind('/')
+        while True:
+            base = rel_path[:pos] if pos > 0 else ''
+            scope = scopes.get(base)
+            if scope is not None:
+                sub_path = rel_path[len(base) + 1:] if base else rel_path
+                rule = scope.match(sub_path, name, is_dir)
+                if rule is not None:
+                    return rule
+            if pos <= 0:
+                return None
+            pos = rel_path.rfind('/', 0, pos)
+
+    def is_ignored(self, rel_path, is_dir=False):
+        """
+        Проверяет путь с учетом родительских директорий: файл внутри
+        игнорируемой директории игнорируется всегда.
+        """
+        pos = rel_path.find('/')
+        cache = self._dir_cache
+        while pos != -1:
+            parent = rel_path[:pos]
+            ignored = cache.get(parent)
+            if ignored is None:
+                ignored = cache[parent] = self.match(parent, True)
+            if ignored:
+                return True
+            pos = rel_path.find('/', pos + 1)
+        return self.match(rel_path, is_dir)
+
+
+def git_exclude_files(repo_path):
     """
-    Проверяет, должен ли путь быть проигнорирован на основе .gitignore шаблонов.
+    Файлы исключений git для репозитория с корнем repo_path: глобальный
+    (core.excludesFile, по умолчанию $XDG_CONFIG_HOME/git/ignore) и
+    .git/info/exclude. Для не-репозиториев - пустой список.
     """
+    repo_path = Path(repo_path)
+    if not (repo_path / '.git').exists():
+        return []
+    files = []
     try:
-        # Получаем относительный путь от корня репозитория
-        rel_path = path.relative_to(repo_path)
-        path_str = str(rel_path).replace('\\', '/')
-        
-        # Проверяем каждый шаблон
-        for pattern in gitignore_patterns:
-            # Специальная обработка для шаблонов с **
-            if '**' in pattern:
-                # Заменяем ** на * для fnmatch
-                fnmatch_pattern = pattern.replace('**', '*')
-                # Для шаблонов с ** используем более гибкое сравнение
-                if fnmatch.fnmatch(path_str, fnmatch_pattern):
-                    return True
-                # Также проверяем частичные совпадения для директорий
-                if pattern.endswith('/**') and path_str.startswith(pattern.rstrip('**')):
-                    return True
-            elif pattern.endswith('/'):
-                # Паттерн для директории
-                if path_str == pattern.rstrip('/') or path_str.startswith(pattern):
-                    return True
-            else:
-                # Простое сопоставление с шаблоном
-                if fnmatch.fnmatch(path_str, pattern):
-                    return True
-                # Проверяем, является ли файл внутри игнорируемой директории
-                if '/' in pattern and fnmatch.fnmatch(path_str, pattern + '/**'):
-                    return True
-                # Проверяем, совпадает ли начало пути
-                if path_str.startswith(pattern + '/'):
-                    return True
-        
-        return False
-    except ValueError:
-        # Если не можем получить относительный путь
-        return False
+        result = subprocess.run(['git', 'config', '--path', '--get', 'core.excludesFile'], cwd=repo_path,
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        excludes_file = result.stdout.strip()
+    except OSError:
+        excludes_file = ''
+    if not excludes_file:
+        config_home = os.environ.get('XDG_CONFIG_HOME') or os.path.join(os.path.expanduser('~'), '.config')
+        excludes_file = os.path.join(config_home, 'git', 'ignore')
+    files.append(Path(excludes_file))
+    found = find_git_dir(repo_path)
+    if found is not None:
+        files.append(found[1] / 'info' / 'exclude')
+    return [path for path in files if path.is_file()]
 
 def get_repo_path_interactive():
     """Интерактивный запрос пути к репозиторию"""
@@ -289,10 +794,10 @@ def validate_repository(path, quick_mode=False):
     
     return True
 
-def select_output_file(repo_path, quick_mode=False):
-    """Предложить варианты имени выходного файла"""
+def select_output_file(repo_path, quick_mode=False, extension='.txt'):
+    """Предложить варианты имени выходного файла (extension - расширение формата вывода)"""
     repo_name = repo_path.name
-    default_file = f"{repo_name}_dump.txt"
+    default_file = f"{repo_name}_dump{extension}"
     
     if quick_mode:
         # В быстром режиме всегда используем имя по умолчанию
@@ -308,7 +813,7 @@ def select_output_file(repo_path, quick_mode=False):
         custom_name = input("Введите имя файла (например: output.txt): ").strip()
         if custom_name:
             if '.' not in custom_name:
-                custom_name += '.txt'
+                custom_name += extension
             output_file = Path(custom_name).resolve()
         else:
             output_file = Path(default_file).resolve()
@@ -319,34 +824,29 @@ def select_output_file(repo_path, quick_mode=False):
     
     return output_file
 
+# Настройки фильтрации по умолчанию
+DEFAULT_FILTERS = {
+    'skip_binary': True,
+    'skip_git': True,
+    'skip_node_modules': True,
+    'skip_venv': True,
+    'skip_hidden': False,
+    'max_file_size': None,
+    'use_gitignore': True  # Новая опция: использовать .gitignore
+}
+
 def get_file_filter(quick_mode=False):
     """Получить настройки фильтрации файлов"""
     if quick_mode:
         # Значения по умолчанию для быстрого режима
-        return {
-            'skip_binary': True,
-            'skip_git': True,
-            'skip_node_modules': True,
-            'skip_venv': True,
-            'skip_hidden': False,
-            'max_file_size': None,
-            'use_gitignore': True  # Новая опция: использовать .gitignore
-        }
+        return dict(DEFAULT_FILTERS)
     
     # Интерактивный режим
     print("\n" + "="*60)
     print("НАСТРОЙКА ФИЛЬТРАЦИИ ФАЙЛОВ")
     print("="*60)
     
-    filters = {
-        'skip_binary': True,
-        'skip_git': True,
-        'skip_node_modules': True,
-        'skip_venv': True,
-        'skip_hidden': False,
-        'max_file_size': None,
-        'use_gitignore': True  # Новая опция: использовать .gitignore
-    }
+    filters = dict(DEFAULT_FILTERS)
     
     print("\nРекомендуемые настройки:")
     print("1. Пропускать бинарные файлы (картинки, PDF, архивы) - ДА")
@@ -374,236 +874,4387 @@ def get_file_filter(quick_mode=False):
     
     return filters
 
-def should_skip_file(file_path, filters, repo_path, gitignore_patterns, output_file=None):
-    """Определить, нужно ли пропускать файл"""
-    try:
-        rel_path = file_path.relative_to(repo_path)
-    except ValueError:
-        return True
-    
-    # Пропускаем выходной файл
-    if output_file and file_path.exists() and output_file.exists():
-        try:
-            if file_path.samefile(output_file):
-                return True
-        except:
-            pass
-    
-    # Пропускаем по пути
-    path_str = str(rel_path)
-    parts = path_str.split(os.sep)
-    
-    # Проверяем правила .gitignore
-    if filters.get('use_gitignore', True) and gitignore_patterns:
-        if should_ignore_path(file_path, gitignore_patterns, repo_path):
-            return True
+# Расширения, которые считаются бинарными без чтения файла
+BINARY_EXTENSIONS = frozenset({
+    '.jpg', '.jpeg', '.png', '.gif', '.bmp', '.ico', '.svg',
+    '.pdf', '.zip', '.tar', '.gz', '.rar', '.7z', '.exe',
+    '.dll', '.so', '.pyc', '.pyo', '.class', '.jar', '.war',
+})
+
+# Имена папок виртуальных окружений
+VENV_DIR_NAMES = frozenset({'venv', '.venv', 'env', '.env'})
+
+def _has_binary_extension(name):
+    """Проверка расширения файла по списку бинарных"""
+    pos = name.rfind('.')
+    return pos > 0 and name[pos:].lower() in BINARY_EXTENSIONS
+
+def entry_skip_reason(entry, rel_path, filters, gitignore_patterns, output_ids=None):
+    """
+    Причина пропуска записи os.scandir или None: 'output', 'git',
+    'node_modules', 'venv', 'hidden', 'binary_extension', 'gitignore',
+    'max_size'. Правила проверяются от дешевых к дорогим, поэтому при
+    нескольких подходящих причина - первая в этом порядке.
+    Без запоминания; при обходе всего репозитория см. FilterPipeline.
+    """
+    is_dir = entry.is_dir()
     
-    if filters['skip_git'] and '.git' in parts:
-        return True
-    if filters['skip_node_modules'] and 'node_modules' in parts:
-        return True
-    if filters['skip_venv'] and any(x in parts for x in ['venv', '.venv', 'env', '.env']):
-        return True
-    if filters['skip_hidden'] and any(part.startswith('.') for part in parts if part not in ['.', '..']):
-        return True
+    if output_ids and not is_dir and _is_output_entry(entry, output_ids):
+        return 'output'
     
-    # Пропускаем по расширению
-    if filters['skip_binary']:
-        binary_extensions = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.ico', '.svg',
-                            '.pdf', '.zip', '.tar', '.gz', '.rar', '.7z', '.exe',
-                            '.dll', '.so', '.pyc', '.pyo', '.class', '.jar', '.war'}
-        if file_path.suffix.lower() in binary_extensions:
-            return True
+    for part in rel_path.split('/'):
+        reason = _name_skip_reason(part, filters)
+        if reason is not None:
+            return reason
     
-    # Проверяем размер файла
-    if filters['max_file_size']:
+    return _entry_rules_reason(entry, rel_path, is_dir, filters, gitignore_patterns)[0]
+
+def _is_output_entry(entry, output_ids):
+    """
+    Запись - один из выходных файлов (output_ids - множество пар
+    (st_dev, st_ino)); сначала сравниваем inode без лишнего stat.
+    """
+    try:
+        inode = entry.inode()
+    except OSError:
+        # Путь из индекса git, удаленный из рабочей копии: его пропустит проверка 'not_file'
+        return False
+    if any(inode == ino for _, ino in output_ids):
         try:
-            if file_path.stat().st_size > filters['max_file_size']:
-                return True
-        except:
+            st = entry.stat()
+            return (st.st_dev, st.st_ino) in output_ids
+        except OSError:
             pass
-    
     return False
 
-def create_repo_dump(repo_path, output_file, filters, quick_mode=False):
-    """Создать дамп репозитория"""
-    if quick_mode:
-        print(f"\n{'='*60}")
-        print(f"ОБРАБОТКА: {repo_path.name}")
-        print(f"{'='*60}")
-    else:
-        print(f"\n{'='*60}")
-        print("НАЧИНАЕМ ОБРАБОТКУ...")
-        print(f"{'='*60}")
+def _name_skip_reason(name, filters):
+    """Причина пропуска по одному компоненту пути: 'git', 'node_modules', 'venv', 'hidden' или None"""
+    if filters['skip_git'] and name == '.git':
+        return 'git'
+    if filters['skip_node_modules'] and name == 'node_modules':
+        return 'node_modules'
+    if filters['skip_venv'] and name in VENV_DIR_NAMES:
+        return 'venv'
+    if filters['skip_hidden'] and name.startswith('.') and name not in ('.', '..'):
+        return 'hidden'
+    return None
+
+def _entry_rules_reason(entry, rel_path, is_dir, filters, gitignore):
+    """
+    Правила, которые зависят от самой записи, а не от ее директорий:
+    расширение, .gitignore (регулярные выражения), размер (stat).
+    Возвращает (причина или None, сработавшее правило .gitignore или None).
+    """
+    if not is_dir and filters['skip_binary'] and _has_binary_extension(entry.name):
+        return 'binary_extension', None
     
-    # Парсим .gitignore файлы
-    gitignore_patterns = []
-    if filters.get('use_gitignore', True):
-        if not quick_mode:
-            print("📄 Чтение правил из .gitignore...")
-        gitignore_patterns = parse_gitignore(repo_path)
-        if gitignore_patterns and not quick_mode:
-            print(f"✓ Загружено {len(gitignore_patterns)} правил из .gitignore")
-    
-    total_files = 0
-    processed_files = 0
-    skipped_files = 0
-    skipped_by_gitignore = 0
-    
-    # Создаем функцию should_skip с привязкой к output_file
-    def should_skip(file_path):
-        nonlocal skipped_by_gitignore
-        skip = should_skip_file(file_path, filters, repo_path, gitignore_patterns, output_file)
-        if skip and filters.get('use_gitignore', True) and gitignore_patterns:
-            # Проверяем, был ли файл пропущен из-за .gitignore
-            if should_ignore_path(file_path, gitignore_patterns, repo_path):
-                skipped_by_gitignore += 1
-        return skip
-    
-    # Сначала посчитаем общее количество файлов
-    if not quick_mode:
-        print("📁 Сканирование структуры репозитория...")
-    
-    for root, dirs, files in os.walk(repo_path):
-        dirs[:] = [d for d in dirs if not should_skip(Path(root) / d)]
-        total_files += len(files)
-    
-    if not quick_mode:
-        print(f"Найдено файлов: {total_files}")
-        if gitignore_patterns:
-            print(f"Правил .gitignore загружено: {len(gitignore_patterns)}")
-    
-    # Создаем выходной файл
-    with open(output_file, 'w', encoding='utf-8') as out_file:
-        # Записываем заголовок
-        out_file.write(f"{'='*80}\n")
-        out_file.write(f"ДАМП РЕПОЗИТОРИЯ: {repo_path.name}\n")
-        if not quick_mode:
-            out_file.write(f"ФИЛЬТРЫ: пропускать бинарные={filters['skip_binary']}, .git={filters['skip_git']}, использовать .gitignore={filters.get('use_gitignore', True)}\n")
-        out_file.write(f"{'='*80}\n\n")
-        
-        # Обрабатываем файлы
-        for root, dirs, files in os.walk(repo_path):
-            dirs[:] = [d for d in dirs if not should_skip(Path(root) / d)]
-            
-            for file in files:
-                file_path = Path(root) / file
-                
-                if should_skip(file_path):
-                    skipped_files += 1
-                    continue
-                
-                try:
-                    rel_path = file_path.relative_to(repo_path)
-                except ValueError:
-                    skipped_files += 1
-                    continue
-                
-                try:
-                    # Записываем заголовок файла
-                    out_file.write(f"\n{'='*60}\n")
-                    out_file.write(f"ФАЙЛ: {rel_path}\n")
-                    out_file.write(f"РАЗМЕР: {file_path.stat().st_size} байт\n")
-                    out_file.write(f"{'='*60}\n\n")
-                    
-                    # Читаем содержимое
-                    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                        content = f.read()
-                        out_file.write(content)
-                        
-                        if content and content[-1] != '\n':
-                            out_file.write('\n')
-                    
-                    processed_files += 1
-                    
-                    # Выводим прогресс в быстром режиме
-                    if quick_mode and processed_files % 50 == 0:
-                        print(f"  Обработано файлов: {processed_files}")
-                    elif not quick_mode and processed_files % 10 == 0:
-                        progress = (processed_files / total_files) * 100 if total_files > 0 else 0
-                        print(f"  Прогресс: {processed_files}/{total_files} файлов ({progress:.1f}%)")
-                        
-                except Exception as e:
-                    out_file.write(f"[ОШИБКА ЧТЕНИЯ ФАЙЛА: {e}]\n")
-                    skipped_files += 1
-        
-        # Добавляем информацию о Git
-        out_file.write(f"\n\n{'='*80}\n")
-        out_file.write("ИНФОРМАЦИЯ О GIT\n")
-        out_file.write(f"{'='*80}\n\n")
-        
-        git_info = get_git_info(repo_path)
-        out_file.write(git_info)
-        
-        # Добавляем информацию о фильтрации
-        if gitignore_patterns:
-            out_file.write(f"\n\n{'='*80}\n")
-            out_file.write("ПРИМЕНЕННЫЕ ПРАВИЛА .gitignore\n")
-            out_file.write(f"{'='*80}\n\n")
-            for pattern in sorted(set(gitignore_patterns)):
-                out_file.write(f"- {pattern}\n")
-    
-    return processed_files, skipped_files, skipped_by_gitignore
-
-def get_git_info(repo_path):
-    """Получить информацию о Git репозитории"""
-    info = []
+    if filters.get('use_gitignore', True) and gitignore:
+        rule = gitignore.match_rule(rel_path, is_dir)
+        if rule is not None and not rule.negate:
+            return 'gitignore', rule
     
-    try:
-        # Текущая ветка
-        result = subprocess.run(['git', 'branch', '--show-current'], 
-                              cwd=repo_path, capture_output=True, text=True)
-        current_branch = result.stdout.strip()
-        info.append(f"Текущая ветка: {current_branch if current_branch else 'не определена'}")
-        
-        # Последний коммит
-        result = subprocess.run(['git', 'log', '--oneline', '-1'], 
-                              cwd=repo_path, capture_output=True, text=True)
-        if result.stdout:
-            info.append(f"Последний коммит: {result.stdout.strip()}")
-        else:
-            info.append("История коммитов недоступна")
-            
-        # Статус репозитория
-        result = subprocess.run(['git', 'status', '--short'], 
-                              cwd=repo_path, capture_output=True, text=True)
-        if result.stdout.strip():
-            info.append("\nНесохраненные изменения:")
-            info.append(result.stdout.strip())
-        else:
-            info.append("\nНет несохраненных изменений")
-        
-    except Exception as e:
-        info.append(f"\nНе удалось получить информацию о Git: {e}")
+    if not is_dir and filters['max_file_size']:
+        try:
+            if entry.stat().st_size > filters['max_file_size']:
+                return 'max_size', None
+        except OSError:
+            pass
     
-    return '\n'.join(info)
+    return None, None
 
-def main():
-    """Основная функция"""
-    args = parse_arguments()
-    
-    try:
-        # Определяем режим работы
-        quick_mode = args.quick
-        
-        if quick_mode:
-            # БЫСТРЫЙ РЕЖИМ (-q)
-            repo_path = get_repo_path_quick(args.path)
-        else:
-            # ИНТЕРАКТИВНЫЙ РЕЖИМ
-            if args.path:
-                print("⚠️  Предупреждение: Путь игнорируется в интерактивном режиме")
-                print("   Используйте ключ -q для быстрого режима с путем")
-            
-            repo_path = get_repo_path_interactive()
-        
-        # Проверяем репозиторий
-        if not validate_repository(repo_path, quick_mode):
-            print("❌ Прерывание работы...")
-            sys.exit(1)
+# Подписи причин пропуска для итогов дампа
+SKIP_REASON_LABELS = {
+    'output': 'выходной файл',
+    'git': '.git',
+    'node_modules': 'node_modules',
+    'venv': 'виртуальные окружения',
+    'hidden': 'скрытые',
+    'binary_extension': 'бинарные по расширению',
+    'gitignore': '.gitignore',
+    'max_size': 'по размеру',
+    'not_file': 'не файлы',
+    'binary': 'бинарные по содержимому',
+    'error': 'ошибки чтения',
+}
+
+class FilterPipeline:
+    """
+    Фильтры дампа, которые для каждого пути вычисляются один раз.
+    Порядок - от дешевых правил к дорогим: выходной файл (сравнение
+    inode), имя (.git, node_modules, venv, скрытые), расширение,
+    .gitignore, размер. Решения по директориям запоминаются: при
+    обходе родителей уже проверил сам обход (parents_checked=True),
+    а для списков путей (индекс git, ревизия, изменения) каждая
+    директория проверяется один раз, и файлы внутри пропущенной или
+    принятой директории берут готовое решение.
+    Для причины 'gitignore' сработавшее правило - в last_rule.
+    """
+
+    __slots__ = ('filters', 'gitignore', 'output_ids', 'last_rule', '_dirs')
+
+    def __init__(self, filters, gitignore=None, output_ids=None):
+        self.filters = filters
+        self.gitignore = gitignore
+        self.output_ids = output_ids
+        self.last_rule = None
+        # Директория -> причина ее пропуска (None - директория принята)
+        self._dirs = {'': None}
+
+    def reason(self, entry, rel_path, parents_checked=True):
+        """Причина пропуска записи (см. entry_skip_reason) или None"""
+        self.last_rule = None
+        is_dir = entry.is_dir()
+        if self.output_ids and not is_dir and _is_output_entry(entry, self.output_ids):
+            return 'output'
         
-        # Выбираем выходной файл
-        output_file = select_output_file(repo_path, quick_mode)
+        parent, _, name = rel_path.rpartition('/')
+        reason = None
+        if not parents_checked and parent:
+            reason = self._dir_reason(parent)
+        if reason is None:
+            reason = _name_skip_reason(name, self.filters)
+        if reason is None:
+            reason, self.last_rule = _entry_rules_reason(entry, rel_path, is_dir, self.filters, self.gitignore)
+        if is_dir:
+            self._dirs[rel_path] = reason
+        return reason
+
+    def _dir_reason(self, rel_dir):
+        """Причина пропуска директории с учетом ее родителей (запоминается)"""
+        dirs = self._dirs
+        if rel_dir in dirs:
+            return dirs[rel_dir]
+        parent, _, name = rel_dir.rpartition('/')
+        reason = self._dir_reason(parent) or _name_skip_reason(name, self.filters)
+        if reason is None and self.filters.get('use_gitignore', True) and self.gitignore:
+            rule = self.gitignore.match_rule(rel_dir, True)
+            if rule is not None and not rule.negate:
+                reason = 'gitignore'
+        dirs[rel_dir] = reason
+        return reason
+
+class PathEntry:
+    """
+    Минимальная замена os.DirEntry для путей, полученных не из
+    os.scandir (например, из индекса git). stat кешируется.
+    """
+
+    __slots__ = ('name', 'path', '_stat')
+
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.basename(path)
+        self._stat = None
+
+    def stat(self):
+        if self._stat is None:
+            self._stat = os.stat(self.path)
+        return self._stat
+
+    def inode(self):
+        return self.stat().st_ino
+
+    def is_dir(self):
+        try:
+            return stat_module.S_ISDIR(self.stat().st_mode)
+        except OSError:
+            return False
+
+    def is_file(self):
+        try:
+            return stat_module.S_ISREG(self.stat().st_mode)
+        except OSError:
+            return False
+
+    def is_symlink(self):
+        return os.path.islink(self.path)
+
+def _walk_order_key(rel_path):
+    """
+    Ключ сортировки, повторяющий порядок walk_repo:
+    в каждой папке сначала файлы по имени, затем вложенные папки.
+    """
+    parts = rel_path.split('/')
+    return [(1, part) for part in parts[:-1]] + [(0, parts[-1])]
+
+def list_git_index_files(repo_path, exclude_standard=True):
+    """
+    Список файлов репозитория из индекса git одним вызовом
+    git ls-files (отслеживаемые + неотслеживаемые, не игнорируемые).
+    Возвращает отсортированный в порядке walk_repo список путей
+    или None, если git недоступен или это не репозиторий.
+    """
+    cmd = ['git', 'ls-files', '-z', '--cached', '--others']
+    if exclude_standard:
+        cmd.append('--exclude-standard')
+    try:
+        result = subprocess.run(cmd, cwd=repo_path, stdout=subprocess.PIPE,
+                                stderr=subprocess.DEVNULL)
+    except OSError:
+        return None
+    if result.returncode != 0:
+        return None
+    paths = {os.fsdecode(p) for p in result.stdout.split(b'\0') if p}
+    return sorted(paths, key=_walk_order_key)
+
+def iter_git_index_files(repo_path, paths, progress=None):
+    """
+    Отдает пары (rel_path, PathEntry) для путей из list_git_index_files.
+    Число файлов известно заранее, поэтому прогресс точный.
+    """
+    if progress is not None:
+        progress.files_seen = len(paths)
+    root = str(repo_path)
+    for rel_path in paths:
+        yield rel_path, PathEntry(os.path.join(root, rel_path))
+
+class GitBlobEntry:
+    """
+    Файл из ревизии git (объект blob) с интерфейсом os.DirEntry,
+    достаточным для фильтров. Размер берется из git ls-tree -l.
+    """
+
+    __slots__ = ('name', 'path', 'oid', '_stat')
+
+    def __init__(self, rel_path, oid, size):
+        self.path = rel_path
+        self.name = rel_path.rpartition('/')[2]
+        self.oid = oid
+        self._stat = os.stat_result((stat_module.S_IFREG | 0o644, 0, 0, 1, 0, 0, size, 0, 0, 0))
+
+    def stat(self):
+        return self._stat
+
+    def inode(self):
+        return 0
+
+    def is_dir(self):
+        return False
+
+    def is_file(self):
+        return True
+
+    def is_symlink(self):
+        return False
+
+def list_git_tree(repo_path, revision):
+    """
+    Список файлов ревизии через git ls-tree -r -z -l.
+    Возвращает пары (rel_path, GitBlobEntry) в порядке walk_repo
+    или None, если ревизия не найдена. Символические ссылки и
+    подмодули пропускаются.
+    """
+    try:
+        result = subprocess.run(
+            ['git', 'ls-tree', '-r', '-z', '-l', '--full-tree', revision],
+            cwd=repo_path, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    except OSError:
+        return None
+    if result.returncode != 0:
+        return None
+    
+    items = []
+    for record in result.stdout.split(b'\0'):
+        if not record:
+            continue
+        meta, _, path = record.partition(b'\t')
+        mode, obj_type, oid, size = meta.split()
+        if obj_type != b'blob' or mode == b'120000':
+            continue
+        rel_path = os.fsdecode(path)
+        items.append((rel_path, GitBlobEntry(rel_path, oid.decode('ascii'), int(size))))
+    items.sort(key=lambda item: _walk_order_key(item[0]))
+    return items
+
+def resolve_revision(repo_path, revision):
+    """Полный хеш коммита для ревизии или None"""
+    result = subprocess.run(['git', 'rev-parse', '--verify', '--quiet', f"{revision}^{{commit}}"],
+                            cwd=repo_path, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    return result.stdout.strip() or None
+
+# Описание изменений в заголовке файла (буква статуса git diff)
+CHANGE_LABELS = {
+    'A': 'добавлен',
+    'M': 'изменен',
+    'D': 'удален',
+    'R': 'переименован',
+    'C': 'скопирован',
+    'T': 'изменен тип',
+    'U': 'конфликт слияния',
+}
+
+class GitChange:
+    """Измененный путь из git diff: статус, путь и (для R/C) прежний путь"""
+
+    __slots__ = ('status', 'path', 'old_path', 'oid')
+
+    def __init__(self, status, path, old_path=None, oid=None):
+        self.status = status
+        self.path = path
+        self.old_path = old_path
+        # blob новой версии (None - файл читается из рабочей копии)
+        self.oid = oid
+
+    def describe(self):
+        label = CHANGE_LABELS.get(self.status, self.status)
+        if self.old_path is not None:
+            return f"{label} из {self.old_path.replace('/', os.sep)}"
+        return label
+
+def split_diff_range(diff_range):
+    """
+    Ревизии диапазона 'A..B' или 'A...B' (пустая сторона - HEAD).
+    Возвращает (A, B) или None, если это не диапазон.
+    """
+    for separator in ('...', '..'):
+        base, found, target = diff_range.partition(separator)
+        if found:
+            return base or 'HEAD', target or 'HEAD'
+    return None
+
+def list_git_changes(repo_path, base, diff_range=None, untracked=True, exclude_standard=True):
+    """
+    Измененные пути одним вызовом git diff --raw -z -M: между ревизией
+    base и рабочей копией или внутри диапазона diff_range ('A..B', 'A...B').
+    Для рабочей копии добавляются неотслеживаемые файлы (untracked).
+    Возвращает список GitChange в порядке walk_repo или None, если
+    git не смог посчитать разницу. Подмодули и символические ссылки
+    пропускаются.
+    """
+    cmd = ['git', 'diff', '--raw', '-z', '-M', '--no-abbrev', diff_range or base, '--']
+    try:
+        result = subprocess.run(cmd, cwd=repo_path, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    except OSError:
+        return None
+    if result.returncode != 0:
+        return None
+    
+    changes = {}
+    fields = result.stdout.split(b'\0')
+    i = 0
+    while i < len(fields) - 1:
+        meta = fields[i].decode('ascii')
+        i += 1
+        if not meta.startswith(':'):
+            continue
+        _, new_mode, _, new_oid, status = meta[1:].split(' ')
+        status = status[0]
+        old_path = None
+        if status in 'RC':
+            old_path = os.fsdecode(fields[i])
+            i += 1
+        path = os.fsdecode(fields[i])
+        i += 1
+        if new_mode in ('160000', '120000'):
+            continue
+        if diff_range is None or status == 'D' or set(new_oid) == {'0'}:
+            new_oid = None
+        changes[path] = GitChange(status, path, old_path, new_oid)
+    
+    if diff_range is None and untracked:
+        cmd = ['git', 'ls-files', '-z', '--others']
+        if exclude_standard:
+            cmd.append('--exclude-standard')
+        result = subprocess.run(cmd, cwd=repo_path, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        for path in result.stdout.split(b'\0'):
+            if path:
+                path = os.fsdecode(path)
+                changes.setdefault(path, GitChange('A', path))
+    
+    return sorted(changes.values(), key=lambda change: _walk_order_key(change.path))
+
+def git_blob_sizes(repo_path, oids):
+    """Размеры blob'ов одним вызовом git cat-file --batch-check: {oid: размер}"""
+    if not oids:
+        return {}
+    result = subprocess.run(['git', 'cat-file', '--batch-check'], cwd=repo_path,
+                            input=''.join(f"{oid}\n" for oid in oids).encode('ascii'),
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    sizes = {}
+    for line in result.stdout.decode('ascii', errors='replace').splitlines():
+        parts = line.split()
+        if len(parts) == 3:
+            sizes[parts[0]] = int(parts[2])
+    return sizes
+
+class GitCatFile:
+    """
+    Один долгоживущий процесс git cat-file --batch для чтения blob'ов.
+    Запросы отправляются отдельным потоком заранее, поэтому чтение
+    идет без задержки на каждый объект.
+    """
+
+    # Сколько ждать поток запросов при закрытии, секунд
+    FEEDER_JOIN_TIMEOUT = 5
+
+    def __init__(self, repo_path):
+        self._proc = subprocess.Popen(['git', 'cat-file', '--batch'], cwd=repo_path,
+                                      stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        self._feeder = None
+        self._finished = False
+
+    def _feed(self, oids):
+        try:
+            for oid in oids:
+                self._proc.stdin.write(oid.encode('ascii') + b'\n')
+            self._proc.stdin.close()
+        except (OSError, ValueError):
+            pass
+
+    def iter_contents(self, oids):
+        """Отдает содержимое объектов в порядке oids"""
+        self._feeder = threading.Thread(target=self._feed, args=(list(oids),), daemon=True)
+        self._feeder.start()
+        stdout = self._proc.stdout
+        for oid in oids:
+            header = stdout.readline().split()
+            if len(header) != 3:
+                raise IOError(f"Объект {oid} не найден в репозитории")
+            size = int(header[2])
+            data = stdout.read(size)
+            stdout.read(1)
+            yield data
+        self._finished = True
+
+    def close(self):
+        """
+        Завершает процесс. При досрочном закрытии cat-file может стоять
+        на записи в заполненный stdout, а поток запросов - на записи в
+        его stdin: процесс сначала убивается, иначе ни один не проснется.
+        """
+        proc = self._proc
+        if not self._finished and proc.poll() is None:
+            try:
+                proc.kill()
+            except OSError:
+                pass
+        proc.stdout.close()
+        if self._feeder is not None:
+            self._feeder.join(self.FEEDER_JOIN_TIMEOUT)
+        # Пока поток запросов жив, он держит блокировку stdin
+        if (self._feeder is None or not self._feeder.is_alive()) and not proc.stdin.closed:
+            try:
+                proc.stdin.close()
+            except (OSError, ValueError):
+                pass
+        proc.wait()
+
+class GitBlobStream:
+    """
+    Содержимое одного blob'а потоком из git cat-file blob. Контекстный
+    менеджер, возвращающий бинарный поток; закрытие до конца чтения
+    завершает git (SIGPIPE), так что висящих процессов не остается.
+    """
+
+    def __init__(self, repo_path, oid):
+        self.oid = oid
+        self._proc = subprocess.Popen(['git', 'cat-file', 'blob', oid], cwd=repo_path, stdout=subprocess.PIPE)
+
+    def __enter__(self):
+        return self._proc.stdout
+
+    def __exit__(self, exc_type, *exc):
+        self._proc.stdout.close()
+        returncode = self._proc.wait()
+        # Отрицательный код - git завершен сигналом после раннего закрытия потока
+        if exc_type is None and returncode > 0:
+            raise IOError(f"Не удалось прочитать объект {self.oid} (git cat-file: код {returncode})")
+
+def _read_revision_stream(repo_path, rel_path, entry, with_hash, sniff_binary, minifier):
+    """
+    Блок крупного файла ревизии (от STREAM_THRESHOLD): содержимое не
+    держится в памяти, каждый проход StreamedBody читает blob заново.
+    """
+    def opener():
+        return GitBlobStream(repo_path, entry.oid)
+
+    if sniff_binary:
+        with opener() as f:
+            prefix = f.read(SNIFF_SIZE)
+        if looks_binary(prefix):
+            return FileBlock(rel_path, entry, b'', skip_reason='binary')
+    body = StreamedBody.scan(f"{entry.oid}:{rel_path}", opener)
+    return make_file_block(rel_path, entry, body, with_hash, minifier)
+
+def iter_revision_blocks(repo_path, items, with_hash=False, sniff_binary=False, minifier=None):
+    """
+    Отдает FileBlock для файлов ревизии (пары rel_path, GitBlobEntry),
+    читая содержимое через один процесс git cat-file --batch.
+    Крупные blob'ы (от STREAM_THRESHOLD) читаются потоком отдельными
+    процессами (GitBlobStream), а не целиком из --batch.
+    Записи без oid - удаленные файлы (--range), для них блок без содержимого.
+    sniff_binary - пропускать бинарные blob'ы по содержимому.
+    minifier - SourceMinifier для сокращения содержимого (--strip).
+    """
+    items = list(items)
+    large = {entry.oid for _, entry in items
+             if entry.oid is not None and entry.stat().st_size >= STREAM_THRESHOLD}
+    cat_file = GitCatFile(repo_path)
+    try:
+        contents = cat_file.iter_contents([entry.oid for _, entry in items
+                                           if entry.oid is not None and entry.oid not in large])
+        for rel_path, entry in items:
+            if entry.oid is None:
+                yield make_deleted_block(rel_path, entry)
+                continue
+            if entry.oid in large:
+                yield _read_revision_stream(repo_path, rel_path, entry, with_hash, sniff_binary, minifier)
+                continue
+            data = next(contents)
+            if sniff_binary and looks_binary(data[:SNIFF_SIZE]):
+                yield FileBlock(rel_path, entry, b'', skip_reason='binary')
+                continue
+            yield make_file_block(rel_path, entry, _prepare_body(data), with_hash, minifier)
+    finally:
+        cat_file.close()
+
+class WalkProgress:
+    """
+    Счетчики однопроходного обхода. Общее число файлов заранее неизвестно,
+    поэтому оценивается по среднему числу файлов в уже прочитанных папках.
+    """
+
+    __slots__ = ('dirs_done', 'dirs_pending', 'files_seen')
+
+    def __init__(self):
+        self.dirs_done = 0
+        self.dirs_pending = 0
+        self.files_seen = 0
+
+    def estimate_total(self):
+        """Оценка общего числа файлов"""
+        if not self.dirs_done:
+            return self.files_seen
+        per_dir = self.files_seen / self.dirs_done
+        return self.files_seen + int(self.dirs_pending * per_dir)
+
+def _scan_dir(abs_dir):
+    """
+    Отсортированные по имени записи директории или None, если она не читается.
+    Тип записей выясняется сразу: без d_type (NFS и т.п.) это stat,
+    и при параллельном обходе он выполняется в потоке пула.
+    """
+    try:
+        with os.scandir(abs_dir) as it:
+            entries = sorted(it, key=lambda e: e.name)
+    except OSError:
+        return None
+    for entry in entries:
+        try:
+            if entry.is_dir():
+                entry.is_symlink()
+        except OSError:
+            pass
+    return entries
+
+def _split_dir(rel_dir, entries, skip_dir, gitignore):
+    """Файлы и неотсеченные поддиректории из записей одной директории (общая часть обходов)"""
+    if gitignore is not None:
+        for entry in entries:
+            if entry.name == '.gitignore':
+                gitignore.load_file(rel_dir, entry.path)
+                break
+    
+    files = []
+    subdirs = []
+    for entry in entries:
+        rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+        try:
+            is_dir = entry.is_dir()
+        except OSError:
+            is_dir = False
+        if not is_dir:
+            files.append((rel_path, entry))
+        elif skip_dir is not None and skip_dir(entry, rel_path):
+            continue
+        elif not entry.is_symlink():
+            # Символические ссылки на папки не раскрываем, как os.walk
+            subdirs.append((rel_path, entry.path))
+    return files, subdirs
+
+def walk_repo(repo_path, skip_dir=None, progress=None, gitignore=None):
+    """
+    Однопроходный обход репозитория через os.scandir.
+    Возвращает генератор пар (относительный путь через '/', os.DirEntry)
+    для всех не-директорий. Порядок детерминирован: файлы папки по имени,
+    затем вложенные папки по имени (как os.walk сверху вниз).
+    skip_dir(entry, rel_path) - отсечение директорий до входа в них.
+    gitignore - GitignoreMatcher (см. for_walk), в который .gitignore
+    каждой директории добавляется при входе в нее, до проверки ее записей.
+    """
+    stack = [('', str(repo_path))]
+    while stack:
+        rel_dir, abs_dir = stack.pop()
+        entries = _scan_dir(abs_dir)
+        if entries is None:
+            # Как os.walk: нечитаемые папки пропускаем молча
+            continue
+        
+        files, subdirs = _split_dir(rel_dir, entries, skip_dir, gitignore)
+        stack.extend(reversed(subdirs))
+        if progress is not None:
+            progress.dirs_done += 1
+            progress.files_seen += len(files)
+            progress.dirs_pending = len(stack)
+        yield from files
+
+# Сколько директорий на поток параллельного обхода может быть заказано
+# заранее (прочитанные, но еще не обойденные списки держатся в памяти)
+WALK_AHEAD_PER_JOB = 256
+
+class _ScanPool:
+    """
+    Потоки, читающие директории для walk_repo_parallel. Очередь
+    приоритетная: раньше читаются директории, которые раньше понадобятся
+    обходу (меньший путь в порядке обхода), а не те, что раньше заказаны.
+    """
+
+    def __init__(self, jobs):
+        self._queue = queue.PriorityQueue()
+        self._counter = 0
+        self._threads = [threading.Thread(target=self._work, daemon=True) for _ in range(jobs)]
+        for thread in self._threads:
+            thread.start()
+
+    def _work(self):
+        while True:
+            stop, _, _, abs_dir, future = self._queue.get()
+            if stop:
+                return
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(_scan_dir(abs_dir))
+                except BaseException as e:
+                    future.set_exception(e)
+
+    def submit(self, rel_dir, abs_dir):
+        future = Future()
+        self._counter += 1
+        # Порядок обхода директорий - лексикографический по частям пути
+        self._queue.put((False, rel_dir.split('/') if rel_dir else [], self._counter, abs_dir, future))
+        return future
+
+    def close(self):
+        for _ in self._threads:
+            self._counter += 1
+            self._queue.put((True, [], self._counter, None, None))
+        for thread in self._threads:
+            thread.join()
+
+def walk_repo_parallel(repo_path, skip_dir=None, progress=None, gitignore=None, jobs=4):
+    """
+    walk_repo с чтением директорий в пуле из jobs потоков: пока отдаются
+    файлы одной директории, следующие по порядку обхода уже читаются.
+    Отсечение (skip_dir) и загрузка .gitignore идут в вызывающем потоке,
+    поэтому порядок и результат совпадают с walk_repo. Полезно на
+    файловых системах с большой задержкой (NFS), где обход упирается в
+    ожидание ответа на каждый scandir.
+    """
+    ahead = max(1, jobs) * WALK_AHEAD_PER_JOB
+    pool = _ScanPool(max(1, jobs))
+    # Элементы стека: (rel_dir, abs_dir, future или None)
+    stack = [('', str(repo_path), None)]
+    in_flight = 0
+    try:
+        while stack:
+            rel_dir, abs_dir, future = stack.pop()
+            if future is not None:
+                in_flight -= 1
+                entries = future.result()
+            else:
+                # Не заказана заранее (лимит был исчерпан) - читаем сами
+                entries = _scan_dir(abs_dir)
+            if entries is None:
+                continue
+            
+            files, subdirs = _split_dir(rel_dir, entries, skip_dir, gitignore)
+            # Поддиректории заказываются сразу; очередь пула сама решает, что читать первым
+            for rel_path, path in reversed(subdirs):
+                future = None
+                if in_flight < ahead:
+                    future = pool.submit(rel_path, path)
+                    in_flight += 1
+                stack.append((rel_path, path, future))
+            if progress is not None:
+                progress.dirs_done += 1
+                progress.files_seen += len(files)
+                progress.dirs_pending = len(stack)
+            yield from files
+    finally:
+        # Обход прерван - незапущенные чтения не нужны
+        for item in stack:
+            if item[2] is not None:
+                item[2].cancel()
+        pool.close()
+
+# Ограничения на данные "в полете" при параллельном чтении
+MAX_PENDING_PER_JOB = 4
+MAX_PENDING_BYTES = 64 * 1024 * 1024
+
+# Файлы от этого размера отображаются в память (mmap), а не читаются
+MMAP_THRESHOLD = 1024 * 1024
+# Размер куска при проверке UTF-8 в отображенных файлах
+UTF8_CHECK_CHUNK = 1024 * 1024
+
+def _encode(text):
+    """Кодирует служебный текст дампа в UTF-8"""
+    return text.encode('utf-8', errors='replace')
+
+def is_valid_utf8(data):
+    """
+    Проверяет, что буфер (bytes, mmap) - корректный UTF-8.
+    ASCII проверяется без декодирования, большие буферы - кусками,
+    чтобы не создавать строку размером с файл.
+    """
+    if isinstance(data, bytes) and hasattr(data, 'isascii') and data.isascii():
+        return True
+    try:
+        if len(data) <= UTF8_CHECK_CHUNK:
+            str(data, 'utf-8')
+            return True
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        with memoryview(data) as view:
+            for start in range(0, len(view), UTF8_CHECK_CHUNK):
+                decoder.decode(view[start:start + UTF8_CHECK_CHUNK])
+        decoder.decode(b'', final=True)
+        return True
+    except UnicodeDecodeError:
+        return False
+
+# Сколько байт из начала файла читается для определения бинарности
+SNIFF_SIZE = 8192
+
+# Сигнатуры (magic numbers) распространенных бинарных форматов.
+# Короткие ASCII-сигнатуры ('MZ', 'BM', 'ID3'...) не включены: они бывают
+# началом обычного текста, а настоящие такие файлы ловятся по нулевым байтам
+BINARY_SIGNATURES = (
+    b'\x89PNG', b'\xff\xd8\xff', b'GIF87a', b'GIF89a', b'%PDF-', b'PK\x03\x04',
+    b'PK\x05\x06', b'\x1f\x8b', b'\xfd7zXZ\x00', b'(\xb5/\xfd', b"7z\xbc\xaf'\x1c",
+    b'Rar!\x1a\x07', b'\x7fELF', b'\xcf\xfa\xed\xfe', b'\xce\xfa\xed\xfe',
+    b'\xca\xfe\xba\xbe', b'\x00asm', b'SQLite format 3\x00', b'PAR1', b'wOFF',
+    b'wOF2', b'\x93NUMPY', b'\x89HDF', b'OggS', b'fLaC', b'\x1aE\xdf\xa3',
+)
+
+# Управляющие символы, которые встречаются в обычном тексте
+_TEXT_CONTROL_BYTES = frozenset(b'\t\n\r\f\b\x1b')
+_NON_TEXT_BYTES = bytes(b for b in range(32) if b not in _TEXT_CONTROL_BYTES) + b'\x7f'
+_HIGH_BYTES = bytes(range(128, 256))
+
+def looks_binary(prefix):
+    """
+    Определяет бинарный файл по началу содержимого:
+    нулевые байты, известные сигнатуры форматов и доля
+    управляющих символов (или не-UTF-8 байтов) больше 30%.
+    """
+    if not prefix:
+        return False
+    if b'\x00' in prefix or prefix.startswith(BINARY_SIGNATURES):
+        return True
+    if _non_text_ratio(prefix) > 0.3:
+        return True
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(prefix, final=False)
+        return False
+    except UnicodeDecodeError:
+        # Не UTF-8 (например, latin-1): бинарным считаем при большой доле старших байтов
+        high = len(prefix) - len(prefix.translate(None, _HIGH_BYTES))
+        return high / len(prefix) > 0.3
+
+def _non_text_ratio(data):
+    """Доля управляющих (нетекстовых) байтов"""
+    return (len(data) - len(data.translate(None, _NON_TEXT_BYTES))) / len(data)
+
+class BinarySniffer:
+    """
+    Определение бинарных файлов по содержимому с кешем вердиктов.
+    Ключ кеша - (устройство, inode, размер, mtime_ns), поэтому
+    неизмененный файл повторно не читается; кеш бинарных файлов
+    сохраняется в манифесте инкрементального режима.
+    """
+
+    def __init__(self, binary_keys=()):
+        self._cache = {tuple(key): True for key in binary_keys}
+
+    @staticmethod
+    def key_for(st):
+        return (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+
+    def cached(self, st):
+        """True/False - известный вердикт, None - файл надо проверить"""
+        return self._cache.get(self.key_for(st))
+
+    def check(self, st, prefix):
+        """Проверяет начало файла и запоминает вердикт"""
+        verdict = looks_binary(prefix)
+        self._cache[self.key_for(st)] = verdict
+        return verdict
+
+    def binary_keys(self):
+        """Ключи файлов, признанных бинарными (для сохранения)"""
+        return [list(key) for key, verdict in self._cache.items() if verdict]
+
+# Файлы от этого размера не отображаются и не читаются целиком, а
+# копируются в дамп кусками (StreamedBody): память не зависит от размера
+STREAM_THRESHOLD = 64 * 1024 * 1024
+# Размер куска потокового копирования
+STREAM_CHUNK = 1024 * 1024
+
+class _ChunkReader(io.RawIOBase):
+    """Бинарный поток поверх генератора кусков"""
+
+    def __init__(self, chunks):
+        self._chunks = chunks
+        self._buffer = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._buffer:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._buffer = chunk
+        size = min(len(buffer), len(self._buffer))
+        buffer[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
+
+class StreamedBody:
+    """
+    Содержимое большого файла (от STREAM_THRESHOLD), которое не держится
+    в памяти: при записи файл копируется кусками по STREAM_CHUNK.
+    Некорректный UTF-8 перекодируется по кускам (errors='ignore').
+    Длина результата считается заранее (scan), чтобы смещения в
+    оглавлении и частях дампа были точными.
+    transform(chunks, savings) - потоковое преобразование содержимого
+    (см. SourceMinifier.stream), применяется при каждом чтении.
+    opener() - открывает источник заново для каждого прохода (например,
+    GitBlobStream для blob'а ревизии); по умолчанию - файл path.
+    """
+
+    __slots__ = ('path', 'source_size', 'length', 'transcode', 'last_byte', 'transform', 'opener')
+
+    def __init__(self, path, source_size, length, transcode, last_byte, transform=None, opener=None):
+        self.path = path
+        self.source_size = source_size
+        self.length = length
+        self.transcode = transcode
+        self.last_byte = last_byte
+        self.transform = transform
+        self.opener = opener
+
+    @classmethod
+    def scan(cls, path, opener=None):
+        """Проверяет UTF-8 за один проход кусками; для некорректного - второй проход с подсчетом длины"""
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        size = 0
+        last_byte = b''
+        valid = True
+        with (opener() if opener is not None else open(path, 'rb')) as f:
+            for chunk in iter(lambda: f.read(STREAM_CHUNK), b''):
+                size += len(chunk)
+                last_byte = chunk[-1:]
+                if valid:
+                    try:
+                        decoder.decode(chunk)
+                    except UnicodeDecodeError:
+                        valid = False
+        if valid:
+            try:
+                decoder.decode(b'', final=True)
+                return cls(path, size, size, False, last_byte, opener=opener)
+            except UnicodeDecodeError:
+                pass
+        body = cls(path, size, None, True, b'', opener=opener)
+        body._measure()
+        return body
+
+    def with_transform(self, transform, savings=None):
+        """
+        Тот же файл с еще одним преобразованием содержимого (поверх
+        уже заданного); длина считается еще одним проходом.
+        """
+        previous = self.transform
+        if previous is not None:
+            def combined(chunks, savings):
+                return transform(previous(chunks, savings), savings)
+        else:
+            combined = transform
+        body = StreamedBody(self.path, self.source_size, None, self.transcode, b'', combined, self.opener)
+        body._measure(savings)
+        return body
+
+    def _measure(self, savings=None):
+        """Проход по содержимому для подсчета длины и последнего байта"""
+        length = 0
+        for chunk in self._content(savings):
+            length += len(chunk)
+            if chunk:
+                self.last_byte = chunk[-1:]
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+    def _source_chunks(self):
+        """Куски файла, перекодированные в UTF-8 при необходимости"""
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore') if self.transcode else None
+        remaining = self.source_size
+        with (self.opener() if self.opener is not None else open(self.path, 'rb')) as f:
+            while remaining > 0:
+                chunk = f.read(min(STREAM_CHUNK, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                if decoder is not None:
+                    chunk = decoder.decode(chunk, final=remaining == 0).encode('utf-8')
+                yield chunk
+
+    def _content(self, savings=None):
+        chunks = self._source_chunks()
+        if self.transform is not None:
+            chunks = self.transform(chunks, savings)
+        return chunks
+
+    def chunks(self):
+        """Куски содержимого (в UTF-8) ровно на length байт"""
+        produced = 0
+        limit = self.length
+        for chunk in self._content():
+            chunk = chunk[:limit - produced]
+            produced += len(chunk)
+            yield chunk
+        # Файл укоротился после проверки: дополняем пробелами до обещанной длины
+        while produced < limit:
+            size = min(STREAM_CHUNK, limit - produced)
+            produced += size
+            yield b' ' * size
+
+    def write_to(self, out_file):
+        for chunk in self.chunks():
+            out_file.write(chunk)
+
+    def digest(self):
+        digest = hashlib.blake2b(digest_size=16)
+        for chunk in self.chunks():
+            digest.update(chunk)
+        return digest.hexdigest()
+
+    def open(self):
+        return io.BufferedReader(_ChunkReader(self.chunks()), STREAM_CHUNK)
+
+def _read_body(path, st, sniffer=None):
+    """
+    Читает содержимое файла для дампа.
+    Корректный UTF-8 возвращается как есть (bytes или mmap) без
+    перекодирования; иначе байты декодируются с errors='ignore'.
+    С sniffer сначала читается только начало файла, и для бинарных
+    файлов возвращается None без чтения остального.
+    Файлы от STREAM_THRESHOLD возвращаются как StreamedBody.
+    """
+    verdict = sniffer.cached(st) if sniffer is not None else False
+    if verdict:
+        return None
+    
+    with open(path, 'rb') as f:
+        prefix = b''
+        if verdict is None:
+            prefix = f.read(SNIFF_SIZE)
+            if sniffer.check(st, prefix):
+                return None
+            if len(prefix) < SNIFF_SIZE:
+                # Файл целиком поместился в проверенное начало
+                return _prepare_body(prefix)
+        
+        if st.st_size >= STREAM_THRESHOLD:
+            return StreamedBody.scan(path)
+        
+        body = None
+        if st.st_size >= MMAP_THRESHOLD:
+            try:
+                body = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError):
+                body = None
+        if body is None:
+            body = prefix + f.read() if prefix else f.read()
+    return _prepare_body(body)
+
+def _prepare_body(body):
+    """
+    Корректный UTF-8 возвращает как есть, иначе декодирует
+    с errors='ignore'. body - bytes или mmap.
+    """
+    if is_valid_utf8(body):
+        return body
+    
+    data = bytes(body) if isinstance(body, mmap.mmap) else body
+    if isinstance(body, mmap.mmap):
+        body.close()
+    return data.decode('utf-8', errors='ignore').encode('utf-8')
+
+# Преобразования для сокращения вывода (--strip), в порядке применения
+STRIP_TRANSFORMS = ('license', 'comments', 'trailing', 'blank')
+
+STRIP_LABELS = {
+    'license': 'повторные лицензии',
+    'comments': 'комментарии',
+    'trailing': 'пробелы в конце строк',
+    'blank': 'пустые строки',
+}
+
+def parse_strip(text):
+    """
+    Разбирает список преобразований --strip: 'all' или имена через
+    запятую (см. STRIP_TRANSFORMS). Используется как type для argparse.
+    """
+    names = [name.strip() for name in text.split(',') if name.strip()]
+    if names == ['all']:
+        return STRIP_TRANSFORMS
+    unknown = [name for name in names if name not in STRIP_TRANSFORMS]
+    if unknown or not names:
+        raise argparse.ArgumentTypeError(
+            f"Неизвестные преобразования: {', '.join(unknown) or text} (доступны: all, {', '.join(STRIP_TRANSFORMS)})")
+    return tuple(name for name in STRIP_TRANSFORMS if name in names)
+
+# Строки и комментарии по синтаксису. Группы: keep - строки кода, которые
+# не трогаем, line и block - комментарии, regex - кандидат в литерал
+# регулярного выражения JS (проверяется по предыдущему символу).
+# Каждая ветка начинается с кавычки, '#' или '/', поэтому движок re
+# пропускает остальной текст без попыток сопоставления. Многострочные
+# конструкции без закрывающей части тянутся до конца текста (\Z), чтобы
+# при потоковой обработке перенести их в следующий кусок.
+_PY_STRINGS = (rb'"""(?:[^"\\]+|\\.|"(?!""))*(?:"""|\Z)'
+               rb"|'''(?:[^'\\]+|\\.|'(?!''))*(?:'''|\Z)"
+               rb'|"(?:[^"\\\n]+|\\.)*"?'
+               rb"|'(?:[^'\\\n]+|\\.)*'?")
+_C_STRINGS = (rb'"""(?:[^"\\]+|\\.|"(?!""))*(?:"""|\Z)'
+              rb'|"(?:[^"\\\n]+|\\.)*"?'
+              rb"|'(?:[^'\\\n]+|\\.)*'?"
+              rb'|`[^`]*(?:`|\Z)')
+_C_COMMENTS = rb'|(?P<line>//[^\n]*)|(?P<block>/\*(?:[^*]+|\*(?!/))*(?:\*/|\Z))'
+
+_MINIFY_SYNTAXES = {
+    'python': (rb'(?P<keep>' + _PY_STRINGS + rb')|(?P<line>\#[^\n]*)', '# ', ''),
+    'c': (rb'(?P<keep>' + _C_STRINGS + rb')' + _C_COMMENTS, '// ', ''),
+    'js': (rb'(?P<keep>' + _C_STRINGS + rb')' + _C_COMMENTS +
+           rb'|(?P<regex>/(?![/*])(?:[^/\\\n\[]|\\.|\[(?:[^\]\\\n]|\\.)*\])+/)', '// ', ''),
+    'css': (rb'(?P<keep>"(?:[^"\\\n]+|\\.)*"?|\'(?:[^\'\\\n]+|\\.)*\'?)'
+            rb'|(?P<block>/\*(?:[^*]+|\*(?!/))*(?:\*/|\Z))', '/* ', ' */'),
+}
+_MINIFY_SYNTAXES = {name: (re.compile(pattern, re.S), prefix, suffix)
+                    for name, (pattern, prefix, suffix) in _MINIFY_SYNTAXES.items()}
+
+# После этих символов (и после return) '/' начинает регулярное выражение, а не деление
+_JS_REGEX_PRECEDERS = frozenset(b'=(,:;!&|?{}[+-*%<>~^\n')
+
+# Расширение -> синтаксис комментариев
+MINIFY_EXTENSIONS = {
+    '.py': 'python', '.pyi': 'python', '.pyw': 'python',
+    '.toml': 'python',
+    '.c': 'c', '.h': 'c', '.cc': 'c', '.cpp': 'c', '.cxx': 'c', '.hpp': 'c', '.hh': 'c', '.hxx': 'c',
+    '.java': 'c', '.go': 'c', '.rs': 'c', '.kt': 'c', '.kts': 'c', '.swift': 'c', '.scala': 'c',
+    '.js': 'js', '.mjs': 'js', '.cjs': 'js', '.jsx': 'js', '.ts': 'js', '.tsx': 'js', '.mts': 'js', '.cts': 'js',
+    '.css': 'css', '.scss': 'css', '.less': 'css',
+}
+
+# Сколько байт незакрытой строки или комментария переносится между кусками
+MINIFY_MAX_CARRY = 4 * STREAM_CHUNK
+
+_TRAILING_SPACE_CR = re.compile(rb'(?<![ \t])[ \t]+(?=\r\n)')
+_BLANK_RUN = re.compile(rb'\n(?:[ \t]*\n){2,}')
+_BLANK_RUN_CR = re.compile(rb'\n((?:[ \t]*\r?\n)){2,}')
+_LEADING_BLANK = re.compile(rb'(?:[ \t]*\r?\n)+')
+_INDENT = re.compile(rb'[ \t]*')
+_LICENSE_WORDS = re.compile(rb'(?i)licen[sc]e|copyright|spdx-license-identifier')
+_WORDS = re.compile(rb'\w+')
+
+class _MinifyState:
+    """Состояние потоковой обработки одного файла между кусками"""
+
+    __slots__ = ('carry', 'resume', 'mid_line', 'held', 'at_start', 'last_byte', 'blank_tail', 'plain')
+
+    def __init__(self):
+        # Необработанный конец прошлого куска с незакрытой многострочной
+        # конструкцией; разбор продолжается с позиции resume в нем
+        self.carry = b''
+        self.resume = 0
+        # carry начинается не с начала строки исходного текста
+        self.mid_line = False
+        # Незаконченная строка перед carry: уже без комментариев, но пробелы
+        # в ее конце можно убрать только вместе с продолжением
+        self.held = b''
+        self.at_start = True
+        # Последний байт уже обработанного текста
+        self.last_byte = b'\n'
+        self.blank_tail = False
+        # Комментарии больше не удаляются (см. MINIFY_MAX_CARRY)
+        self.plain = False
+
+class SourceMinifier:
+    """
+    Сокращение содержимого файлов перед записью в дамп (--strip).
+    Преобразования (STRIP_TRANSFORMS):
+      comments - комментарии в Python, TOML, C-подобных языках, JS/TS и CSS
+                 (синтаксис по расширению, см. MINIFY_EXTENSIONS); строки
+                 кода распознаются, так что '#' и '//' внутри них остаются;
+      license  - лицензионный заголовок в начале файла, повторяющийся в
+                 нескольких файлах, пишется один раз (замену делает Dumper,
+                 здесь заголовок только находится и не трогается);
+      trailing - пробелы и табуляции в конце строк;
+      blank    - подряд идущие пустые строки сводятся к одной.
+    Обработка идет регулярными выражениями по кускам, без разбора файла
+    целиком: незакрытая многострочная строка или комментарий переносятся
+    в следующий кусок. Отступы не меняются.
+    """
+
+    __slots__ = ('transforms',)
+
+    def __init__(self, transforms):
+        self.transforms = frozenset(transforms)
+
+    def syntax(self, rel_path):
+        """Синтаксис комментариев файла или None"""
+        pos = rel_path.rfind('.')
+        return MINIFY_EXTENSIONS.get(rel_path[pos:].lower()) if pos > rel_path.rfind('/') + 1 else None
+
+    def minify(self, rel_path, body):
+        """
+        Сокращает содержимое файла целиком (bytes или mmap в UTF-8).
+        Возвращает (bytes, сэкономлено байт по преобразованиям,
+        лицензия): лицензия - (ключ, начало, конец, префикс, суффикс)
+        найденного заголовка или None.
+        """
+        syntax = self.syntax(rel_path)
+        savings = {}
+        if syntax is None and not self.transforms & {'trailing', 'blank'}:
+            return body, savings, None
+        text = bytes(body)
+        license = None
+        head = b''
+        if 'license' in self.transforms and syntax is not None:
+            span = self._license_span(text, syntax)
+            if span is not None:
+                start, end = span
+                _, prefix, suffix = _MINIFY_SYNTAXES[syntax]
+                key = hashlib.blake2b(b' '.join(_WORDS.findall(text[start:end])), digest_size=16).hexdigest()
+                license = (key, start, end, prefix, suffix)
+                # Заголовок идет в дамп как есть: первый такой остается целиком
+                head, text = text[:end], text[end:]
+        state = _MinifyState()
+        state.at_start = not head
+        return head + self._minify_piece(text, syntax, True, state, savings), savings, license
+
+    def stream_for(self, rel_path):
+        """Потоковое преобразование для StreamedBody.transform"""
+        return lambda chunks, savings: self.stream(rel_path, chunks, savings)
+
+    def stream(self, rel_path, chunks, savings=None):
+        """Потоковый вариант minify для кусков большого файла (без поиска лицензии)"""
+        syntax = self.syntax(rel_path)
+        if savings is None:
+            savings = {}
+        state = _MinifyState()
+        buffer = b''
+        for chunk in chunks:
+            buffer += chunk
+            cut = buffer.rfind(b'\n') + 1
+            if cut:
+                output = self._minify_piece(buffer[:cut], syntax, False, state, savings)
+                buffer = buffer[cut:]
+                if output:
+                    yield output
+        output = self._minify_piece(buffer, syntax, True, state, savings)
+        if output:
+            yield output
+
+    def _minify_piece(self, text, syntax, final, state, savings):
+        """
+        Обрабатывает кусок, оканчивающийся переводом строки (или последний).
+        Незакрытая многострочная конструкция остается в state.carry, а
+        незаконченная строка перед ней - в state.held до следующего куска.
+        """
+        transforms = self.transforms
+        held = state.held
+        text = held + state.carry + text
+        scan = len(held) + state.resume
+        if not state.carry:
+            # Кусок без переноса начинается с начала строки
+            state.mid_line = False
+        state.carry = state.held = b''
+        state.resume = 0
+        if 'comments' in transforms and syntax is not None and not state.plain:
+            size = len(text)
+            text, carry = self._strip_comments(text, _MINIFY_SYNTAXES[syntax][0], final, state, len(held), scan)
+            if len(carry) > MINIFY_MAX_CARRY:
+                # Незакрытая строка на мегабайты - скорее ошибка разбора: дальше комментарии не трогаем
+                text += carry
+                state.resume = 0
+                state.plain = True
+            else:
+                state.carry = carry
+            savings['comments'] = savings.get('comments', 0) + size - len(text) - len(state.carry)
+        if text or not state.carry:
+            # Начало файла пройдено, даже если от него ничего не осталось
+            state.at_start = False
+        if text:
+            state.last_byte = text[-1:]
+        if state.carry:
+            cut = text.rfind(b'\n') + 1
+            state.held = text[cut:]
+            text = text[:cut]
+        if 'trailing' in transforms:
+            size = len(text)
+            text = _strip_trailing_space(text, final)
+            savings['trailing'] = savings.get('trailing', 0) + size - len(text)
+        if 'blank' in transforms and text:
+            size = len(text)
+            match = _LEADING_BLANK.match(text)
+            if match:
+                # Кусок начинается с пустых строк: оставляем последнюю из них
+                # (или ни одной, если прошлый кусок закончился пустой строкой)
+                end = match.end()
+                text = text[end:] if state.blank_tail else text[text.rfind(b'\n', 0, end - 1) + 1:]
+            if b'\r' in text:
+                text = _BLANK_RUN_CR.sub(rb'\n\1', text)
+            else:
+                # Замена без шаблона заметно быстрее
+                text = _BLANK_RUN.sub(b'\n\n', text)
+            savings['blank'] = savings.get('blank', 0) + size - len(text)
+            if text:
+                last_line = text.rfind(b'\n', 0, len(text) - 1) + 1
+                state.blank_tail = text.endswith(b'\n') and not text[last_line:].strip()
+        return text
+
+    def _strip_comments(self, text, pattern, final, state, pos=0, scan=0):
+        """
+        Удаляет комментарии; возвращает (текст, перенос в следующий кусок).
+        Первые pos байт уже обработаны (state.held), разбор идет с позиции
+        scan; позиция в переносе, с которой продолжить, - в state.resume.
+        """
+        out = [text[:pos]]
+        size = len(text)
+        first = pos
+        # Последний байт уже выведенного текста
+        last = state.last_byte
+        while scan is not None:
+            restart = None
+            for match in pattern.finditer(text, scan):
+                kind = match.lastgroup
+                start, end = match.span()
+                if kind == 'regex' and not _js_regex_allowed(text, start):
+                    # Это деление, а не регулярное выражение: ищем дальше со следующего символа
+                    restart = start + 1
+                    break
+                if end == size and not final and kind in ('keep', 'block'):
+                    # Строка или комментарий не закрыты в этом куске: текст
+                    # перед ними переносится необработанным, как и в minify
+                    state.resume = start - pos
+                    if pos > first:
+                        state.mid_line = text[pos - 1:pos] != b'\n'
+                    return b''.join(out), text[pos:]
+                if kind in ('keep', 'regex') or (start == 0 and state.at_start and text.startswith(b'#!')):
+                    continue
+                
+                line_start = text.rfind(b'\n', 0, start) + 1
+                line_end = text.find(b'\n', end)
+                if line_end < 0:
+                    line_end = size
+                if (line_start >= pos and not (line_start == first and state.mid_line)
+                        and not text[line_start:start].strip(b' \t')
+                        and not text[end:line_end].strip(b' \t\r')):
+                    # Комментарий занимает строки целиком: удаляем их вместе с переводом строки
+                    out.append(text[pos:line_start])
+                    if line_start:
+                        last = b'\n'
+                    pos = min(line_end + 1, size)
+                    continue
+                
+                before = text[pos:start].rstrip(b' \t')
+                if before:
+                    out.append(before)
+                    last = before[-1:]
+                pos = end
+                if kind == 'block':
+                    after = text[end:end + 1]
+                    if last != b'\n' and text.find(b'\n', start, end) >= 0:
+                        # Перевод строки внутри комментария разделяет код (важно для JS без точек с запятой)
+                        out.append(b'\n')
+                        last = b'\n'
+                    elif last not in (b'\n', b' ', b'\t') and after not in (b'', b' ', b'\t', b'\r', b'\n'):
+                        out.append(b' ')
+                        last = b' '
+            scan = restart
+        out.append(text[pos:])
+        return b''.join(out), b''
+
+    def _license_span(self, text, syntax):
+        """(начало, конец) лицензионного заголовка в начале файла или None"""
+        pattern = _MINIFY_SYNTAXES[syntax][0]
+        pos = 0
+        if text.startswith(b'#!'):
+            pos = text.find(b'\n') + 1
+            if not pos:
+                return None
+        match = _LEADING_BLANK.match(text, pos)
+        if match:
+            pos = match.end()
+        start = end = pos
+        # Строки, целиком состоящие из комментариев, подряд
+        while True:
+            line = _INDENT.match(text, end).end()
+            match = pattern.match(text, line)
+            if match is None or match.lastgroup not in ('line', 'block'):
+                break
+            line_end = text.find(b'\n', match.end())
+            if line_end < 0:
+                line_end = len(text)
+            if text[match.end():line_end].strip(b' \t\r'):
+                break
+            end = min(line_end + 1, len(text))
+            if end == line:
+                break
+        if end == start or not _LICENSE_WORDS.search(text, start, end):
+            return None
+        return start, end
+
+def _strip_trailing_space(text, final):
+    """
+    Удаляет пробелы и табуляции в конце строк. Незаконченная последняя
+    строка куска (не final) не трогается: ее продолжение в следующем куске.
+    """
+    # Построчная обработка методами bytes заметно быстрее регулярного выражения
+    if b' \n' in text or b'\t\n' in text or (final and text.endswith((b' ', b'\t'))):
+        lines = text.split(b'\n')
+        tail = lines.pop()
+        text = b'\n'.join([line.rstrip(b' \t') for line in lines] + [tail.rstrip(b' \t') if final else tail])
+    if b' \r\n' in text or b'\t\r\n' in text:
+        text = _TRAILING_SPACE_CR.sub(b'', text)
+    return text
+
+def _js_regex_allowed(text, start):
+    """'/' в позиции start начинает литерал регулярного выражения JS"""
+    pos = start - 1
+    while pos >= 0 and text[pos] in b' \t':
+        pos -= 1
+    if pos < 0 or text[pos] in _JS_REGEX_PRECEDERS:
+        return True
+    return text.endswith(b'return', 0, pos + 1)
+
+def _write_all(raw, data):
+    """Записывает буфер целиком (FileIO может записать только часть)"""
+    with memoryview(data) as view:
+        written = 0
+        while written < len(view):
+            written += raw.write(view[written:])
+
+class DumpOutput:
+    """
+    Бинарный выходной поток дампа с собственным буфером.
+    Считает записанные байты (offset), что позволяет запоминать
+    положение каждого файла, и умеет копировать куски другого файла
+    без чтения в память (os.copy_file_range, где он доступен).
+    raw - файл без буферизации или поток сжатия.
+    """
+
+    BUFFER_SIZE = 1024 * 1024
+
+    def __init__(self, raw):
+        self._raw = raw
+        self._buffer = bytearray()
+        self.offset = 0
+
+    def write(self, data):
+        size = len(data)
+        if size >= self.BUFFER_SIZE:
+            # Крупные куски (в т.ч. mmap) пишем напрямую, без копирования в буфер
+            self.flush()
+            _write_all(self._raw, data)
+        else:
+            self._buffer += data
+            if len(self._buffer) >= self.BUFFER_SIZE:
+                self.flush()
+        self.offset += size
+
+    def flush(self):
+        if self._buffer:
+            _write_all(self._raw, self._buffer)
+            self._buffer.clear()
+
+    def copy_range(self, src_file, offset, length):
+        """Копирует length байт из src_file, начиная с offset"""
+        self.flush()
+        copy_file_range = getattr(os, 'copy_file_range', None)
+        if not isinstance(self._raw, io.FileIO):
+            # В поток сжатия данные должны пройти через компрессор
+            copy_file_range = None
+        while length > 0:
+            copied = 0
+            if copy_file_range is not None:
+                try:
+                    copied = copy_file_range(src_file.fileno(), self._raw.fileno(), length, offset)
+                except OSError:
+                    copy_file_range = None
+                    continue
+            else:
+                src_file.seek(offset)
+                chunk = src_file.read(min(length, self.BUFFER_SIZE))
+                _write_all(self._raw, chunk)
+                copied = len(chunk)
+            if copied <= 0:
+                raise IOError(f"Неожиданный конец файла {src_file.name}")
+            offset += copied
+            length -= copied
+            self.offset += copied
+
+# Расширения выходного файла для алгоритмов сжатия
+COMPRESSION_SUFFIXES = {'gzip': '.gz', 'zstd': '.zst', 'xz': '.xz'}
+
+class ParallelCompressor:
+    """
+    Потоковое сжатие независимыми блоками в пуле потоков (как pigz).
+    Каждый блок - самостоятельный поток gzip/xz; склейка таких потоков
+    остается стандартным файлом, который распаковывают gzip -d, xz -d
+    и модули gzip/lzma. zlib и lzma отпускают GIL во время сжатия.
+    """
+
+    BLOCK_SIZE = 4 * 1024 * 1024
+
+    def __init__(self, raw, compress, threads):
+        self._raw = raw
+        self._compress = compress
+        self._pool = ThreadPoolExecutor(max_workers=threads)
+        self._pending = deque()
+        self._max_pending = threads * 2
+        self._buffer = bytearray()
+        self._submitted = False
+
+    def write(self, data):
+        with memoryview(data) as view:
+            pos = 0
+            while pos < len(view):
+                take = min(self.BLOCK_SIZE - len(self._buffer), len(view) - pos)
+                self._buffer += view[pos:pos + take]
+                pos += take
+                if len(self._buffer) >= self.BLOCK_SIZE:
+                    self._submit()
+        return len(data)
+
+    def _submit(self):
+        self._pending.append(self._pool.submit(self._compress, bytes(self._buffer)))
+        self._buffer.clear()
+        self._submitted = True
+        # Ограничиваем число блоков в памяти, записывая готовые по порядку
+        while len(self._pending) > self._max_pending:
+            _write_all(self._raw, self._pending.popleft().result())
+
+    def close(self):
+        if self._buffer or not self._submitted:
+            self._submit()
+        while self._pending:
+            _write_all(self._raw, self._pending.popleft().result())
+        self._pool.shutdown()
+
+def compression_threads():
+    """Число потоков сжатия по умолчанию"""
+    return max(1, min(8, os.cpu_count() or 1))
+
+def open_compressed_sink(raw, codec, threads=1):
+    """
+    Поток сжатия поверх raw. zstd сжимает в потоках сам (нужен модуль
+    zstandard), gzip и xz при threads > 1 сжимаются блоками в пуле.
+    Поток надо закрыть через close(); raw при этом не закрывается.
+    """
+    if codec == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            raise RuntimeError("Для сжатия zstd установите модуль zstandard: pip install zstandard")
+        compressor = zstandard.ZstdCompressor(level=3, threads=threads if threads > 1 else 0)
+        return compressor.stream_writer(raw, closefd=False, write_return_read=True)
+    if codec == 'gzip':
+        if threads > 1:
+            return ParallelCompressor(raw, lambda block: gzip.compress(block, compresslevel=6), threads)
+        return gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=6)
+    if codec == 'xz':
+        import lzma
+        if threads > 1:
+            return ParallelCompressor(raw, lambda block: lzma.compress(block, preset=6), threads)
+        return lzma.LZMAFile(raw, mode='wb', preset=6)
+    raise ValueError(f"Неизвестный алгоритм сжатия: {codec}")
+
+def parse_size(text):
+    """
+    Разбирает размер вида 1048576, 512K, 50M, 2G (множитель 1024).
+    Используется как type для argparse.
+    """
+    value = text.strip().upper().rstrip('B')
+    multiplier = 1
+    if value and value[-1] in 'KMG':
+        multiplier = 1024 ** ('KMG'.index(value[-1]) + 1)
+        value = value[:-1]
+    try:
+        size = int(float(value) * multiplier)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Неверный размер: {text}")
+    if size <= 0:
+        raise argparse.ArgumentTypeError(f"Размер должен быть положительным: {text}")
+    return size
+
+def estimate_tokens(size):
+    """Грубая оценка числа токенов LLM по размеру текста в байтах"""
+    return (size + 3) // 4
+
+def _split_compression_suffix(name):
+    """Делит имя файла на основу и суффикс сжатия (.gz/.xz/.zst)"""
+    for suffix in COMPRESSION_SUFFIXES.values():
+        if name.endswith(suffix):
+            return name[:-len(suffix)], suffix
+    return name, ''
+
+def shard_path_for(output_file, number):
+    """Имя части дампа: repo_dump.part001.txt(.gz)"""
+    base, compression = _split_compression_suffix(output_file.name)
+    base = Path(base)
+    return output_file.with_name(f"{base.stem}.part{number:03d}{base.suffix}{compression}")
+
+def shard_index_path_for(output_file):
+    """Имя индекса частей: repo_dump.index.json"""
+    base, _ = _split_compression_suffix(output_file.name)
+    return output_file.with_name(f"{Path(base).stem}.index.json")
+
+def existing_shard_paths(output_file):
+    """Части дампа output_file, уже лежащие на диске (от прошлых запусков)"""
+    base, compression = _split_compression_suffix(output_file.name)
+    base = Path(base)
+    pattern = re.compile(re.escape(base.stem) + r'\.part\d{3,}' + re.escape(base.suffix + compression) + '$')
+    try:
+        names = os.listdir(output_file.parent)
+    except OSError:
+        return []
+    return sorted(output_file.with_name(name) for name in names if pattern.match(name))
+
+class SingleFileDump:
+    """
+    Запись дампа в один файл или поток (возможно, сжатый).
+    write_block возвращает (номер части, смещение, длина) блока.
+    close_raw=False - поток raw остается открытым после close().
+    """
+
+    def __init__(self, raw, header, compress=None, close_raw=True):
+        self.path = None
+        self._raw = raw
+        self._close_raw = close_raw
+        self._sink = open_compressed_sink(raw, compress, compression_threads()) if compress else raw
+        self.out = DumpOutput(self._sink)
+        self.out.write(header)
+
+    @classmethod
+    def open(cls, path, header, compress=None, output_ids=None):
+        """Создает файл дампа path"""
+        raw = open(path, 'wb', buffering=0)
+        if output_ids is not None:
+            # Идентификатор выходного файла, чтобы не включить его в дамп
+            st = os.fstat(raw.fileno())
+            output_ids.add((st.st_dev, st.st_ino))
+        try:
+            dump = cls(raw, header, compress)
+        except BaseException:
+            raw.close()
+            raise
+        dump.path = path
+        return dump
+
+    def write(self, data):
+        self.out.write(data)
+
+    def size(self):
+        """Сколько байт записано (до сжатия), включая заголовок"""
+        return self.out.offset
+
+    def space_needed(self, length, block=True):
+        """Сколько байт займет запись length байт (см. ShardedDump.space_needed)"""
+        return length
+
+    def write_block(self, block):
+        offset = self.out.offset
+        block.write_to(self.out)
+        return 0, offset, self.out.offset - offset
+
+    def close(self, completed=True):
+        try:
+            if completed:
+                self.out.flush()
+                if self._sink is not self._raw:
+                    self._sink.close()
+        finally:
+            if self._close_raw:
+                self._raw.close()
+            elif completed and hasattr(self._raw, 'flush'):
+                self._raw.flush()
+
+class _ShardWriter:
+    """
+    Одна часть дампа. При concurrent=True запись (и сжатие) идет в
+    отдельном потоке через ограниченную очередь, так что части
+    пишутся параллельно с подготовкой следующих.
+    """
+
+    QUEUE_SIZE = 64
+
+    def __init__(self, path, header, compress, concurrent, output_ids):
+        self.path = path
+        self.size = 0
+        self.files = []
+        self._dump = SingleFileDump.open(path, header, compress, output_ids)
+        self.size = self._dump.out.offset
+        self._error = None
+        self._finished = False
+        self._queue = None
+        self._thread = None
+        if concurrent:
+            self._queue = queue.Queue(maxsize=self.QUEUE_SIZE)
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def _write(self, item):
+        if isinstance(item, (bytes, bytearray)):
+            self._dump.write(item)
+        else:
+            self._dump.write_block(item)
+
+    def _close_dump(self):
+        try:
+            self._dump.close(self._error is None)
+        except Exception as e:
+            self._error = self._error or e
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            if self._error is not None:
+                # После ошибки только освобождаем блоки
+                if not isinstance(item, (bytes, bytearray)):
+                    item.release()
+                continue
+            try:
+                self._write(item)
+            except Exception as e:
+                self._error = e
+        self._close_dump()
+
+    def put(self, item, length):
+        """Ставит блок или служебные байты в очередь записи"""
+        self.size += length
+        if self._queue is not None:
+            self._queue.put(item)
+        else:
+            self._write(item)
+
+    def finish(self):
+        """Больше данных не будет; файл закрывается (в фоне, если есть поток)"""
+        if self._finished:
+            return
+        self._finished = True
+        if self._queue is not None:
+            self._queue.put(None)
+        else:
+            self._close_dump()
+
+    def close(self):
+        """Дожидается окончания записи части"""
+        self.finish()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._error is not None:
+            raise self._error
+
+class ShardedDump:
+    """
+    Дамп, разбитый на части по границам файлов. Каждая часть -
+    самостоятельный дамп со своим заголовком; размер части ограничен
+    в байтах или оценочных токенах. Рядом пишется индекс частей
+    (repo_dump.index.json) со списком файлов каждой части.
+    """
+
+    def __init__(self, output_file, header_func, max_size, unit='bytes', compress=None,
+                 concurrent=False, output_ids=None):
+        self.output_file = output_file
+        self.index_path = shard_index_path_for(output_file)
+        self._header_func = header_func
+        self._max_size = max_size
+        self._unit = unit
+        self._compress = compress
+        self._concurrent = concurrent
+        self._output_ids = output_ids
+        self._current = None
+        self.shards = []
+        # Части прошлого запуска: лишние удаляются после записи, и ни одна не должна попасть в дамп
+        self._previous_files = self._read_previous_index()
+        if output_ids is not None:
+            for path in [self.index_path] + existing_shard_paths(output_file):
+                try:
+                    st = path.stat()
+                except OSError:
+                    continue
+                output_ids.add((st.st_dev, st.st_ino))
+
+    def _read_previous_index(self):
+        """Имена частей из индекса прошлого запуска"""
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                return [shard['file'] for shard in json.load(f).get('shards', [])]
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            return []
+
+    def _cost(self, size):
+        return estimate_tokens(size) if self._unit == 'tokens' else size
+
+    def _open_next(self):
+        if self._current is not None:
+            # Предыдущая часть дописывается в своем потоке
+            self._current.finish()
+        number = len(self.shards) + 1
+        self._current = _ShardWriter(shard_path_for(self.output_file, number), self._header_func(number),
+                                     self._compress, self._concurrent, self._output_ids)
+        self.shards.append(self._current)
+
+    def size(self):
+        """Сколько байт записано во все части (до сжатия), включая их заголовки"""
+        return sum(shard.size for shard in self.shards)
+
+    def space_needed(self, length, block=True):
+        """
+        Сколько байт займет запись length байт с учетом заголовка новой
+        части, если она откроется (для блока - по тому же правилу, что
+        в write_block; служебные байты пишутся в текущую часть).
+        """
+        current = self._current
+        if current is None or (block and current.files and self._cost(current.size + length) > self._max_size):
+            return length + len(self._header_func(len(self.shards) + 1))
+        return length
+
+    def write_block(self, block):
+        length = block.length()
+        current = self._current
+        # Новая часть, если блок не помещается (часть с одним файлом может быть больше лимита)
+        if current is None or (current.files and self._cost(current.size + length) > self._max_size):
+            self._open_next()
+            current = self._current
+        offset = current.size
+        current.files.append(block.rel_path)
+        current.put(block, length)
+        return len(self.shards) - 1, offset, length
+
+    def write(self, data):
+        if self._current is None:
+            self._open_next()
+        self._current.put(bytes(data), len(data))
+
+    def close(self, completed=True):
+        error = None
+        for shard in self.shards:
+            try:
+                shard.close()
+            except Exception as e:
+                error = error or e
+        self._current = None
+        if error is not None:
+            raise error
+        if completed:
+            self.write_index()
+            self._remove_surplus()
+
+    def _remove_surplus(self):
+        """Удаляет части прошлого запуска, которых нет в новом индексе"""
+        current = {shard.path.name for shard in self.shards}
+        for name in self._previous_files:
+            # Имена из индекса - только файлы рядом с ним
+            if name in current or Path(name).name != name:
+                continue
+            try:
+                self.output_file.with_name(name).unlink()
+            except OSError:
+                pass
+
+    def write_index(self):
+        """Сохраняет индекс частей"""
+        data = {
+            'version': 1,
+            'unit': self._unit,
+            'max_size': self._max_size,
+            'shards': [{
+                'file': shard.path.name,
+                'size': shard.size,
+                'tokens': estimate_tokens(shard.size),
+                'files': shard.files,
+            } for shard in self.shards],
+        }
+        with open(self.index_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=1)
+
+class FileBlock:
+    """
+    Подготовленный к записи файл: заголовок и содержимое.
+    Содержимое - bytes или mmap; mmap закрывается после записи.
+    tail - байты после содержимого (задает формат вывода, см. JsonlFormat);
+    None - перевод строки, если содержимое им не заканчивается.
+    """
+
+    __slots__ = ('rel_path', 'entry', 'header', 'body', 'error', 'digest', 'skip_reason', 'savings', 'license',
+                 'duplicate_of', 'change', 'tail')
+
+    def __init__(self, rel_path, entry, header, body=b'', error=None, digest=None, skip_reason=None,
+                 savings=None, license=None, duplicate_of=None):
+        self.rel_path = rel_path
+        self.entry = entry
+        self.header = header
+        self.body = body
+        self.error = error
+        self.digest = digest
+        # Причина пропуска, выясненная только при чтении (например, 'binary')
+        self.skip_reason = skip_reason
+        # Сэкономлено байт по преобразованиям --strip и лицензионный заголовок (см. SourceMinifier.minify)
+        self.savings = savings
+        self.license = license
+        # Путь первого файла с тем же содержимым (--dedup) и GitChange (--since/--range)
+        self.duplicate_of = duplicate_of
+        self.change = None
+        self.tail = None
+
+    def write_to(self, out_file):
+        """Записывает блок в бинарный поток и освобождает содержимое"""
+        out_file.write(self.header)
+        body = self.body
+        if body:
+            if isinstance(body, StreamedBody):
+                body.write_to(out_file)
+            else:
+                out_file.write(body)
+        if self.tail is not None:
+            out_file.write(self.tail)
+        elif body and _last_byte(body) != b'\n':
+            out_file.write(b'\n')
+        self.release()
+
+    def length(self):
+        """Сколько байт займет блок в дампе"""
+        body = self.body
+        if self.tail is not None:
+            tail = len(self.tail)
+        else:
+            tail = 1 if body and _last_byte(body) != b'\n' else 0
+        return len(self.header) + len(body) + tail
+
+    def body_span(self):
+        """Начало и длина содержимого файла внутри блока (без добавленного перевода строки)"""
+        return len(self.header), len(self.body)
+
+    def release(self):
+        """Закрывает отображение файла, если оно было"""
+        if isinstance(self.body, mmap.mmap):
+            self.body.close()
+        self.body = b''
+
+def _last_byte(body):
+    return body.last_byte if isinstance(body, StreamedBody) else body[-1:]
+
+def read_file_block(entry, rel_path, with_hash=False, sniffer=None, io_gate=None, profile=None, minifier=None):
+    """
+    Читает файл и готовит блок для записи в дамп (заголовок + содержимое).
+    with_hash - посчитать хеш содержимого (для манифеста).
+    sniffer - BinarySniffer для пропуска бинарных файлов по содержимому.
+    io_gate - семафор, ограничивающий число одновременных чтений
+    (общий для процессов пакетного режима).
+    profile - DumpProfile для замера чтения (этап read).
+    minifier - SourceMinifier для сокращения содержимого (--strip).
+    Вызывается как последовательно, так и из потоков пула.
+    """
+    if profile is not None:
+        return _profiled_read_file_block(entry, rel_path, with_hash, sniffer, io_gate, profile, minifier)
+    # Файл мог исчезнуть после обхода: это ошибка чтения, а не повод прерывать дамп
+    size = 0
+    try:
+        st = entry.stat()
+        size = st.st_size
+        if io_gate is not None:
+            with io_gate:
+                body = _read_body(entry.path, st, sniffer)
+        else:
+            body = _read_body(entry.path, st, sniffer)
+    except Exception as e:
+        header = _file_header(rel_path, size)
+        return FileBlock(rel_path, entry, header + _encode(f"[ОШИБКА ЧТЕНИЯ ФАЙЛА: {e}]\n"), error=e)
+    if body is None:
+        return FileBlock(rel_path, entry, b'', skip_reason='binary')
+    return make_file_block(rel_path, entry, body, with_hash, minifier)
+
+def _profiled_read_file_block(entry, rel_path, with_hash, sniffer, io_gate, profile, minifier):
+    """read_file_block с замером времени и счетчиками операций"""
+    wall = time.perf_counter()
+    cpu = time.thread_time()
+    try:
+        st = entry.stat()
+    except OSError:
+        st = None
+    cached = st is not None and sniffer is not None and sniffer.cached(st)
+    block = read_file_block(entry, rel_path, with_hash, sniffer, io_gate, minifier=minifier)
+    elapsed = time.perf_counter() - wall
+    profile.add_stage('read', elapsed, time.thread_time() - cpu)
+    profile.count('stat')
+    if st is None:
+        # Ошибку stat read_file_block уже превратил в блок с ошибкой чтения
+        return block
+    if not cached:
+        profile.count('open')
+        if block.skip_reason is not None:
+            profile.count('bytes_read', min(st.st_size, SNIFF_SIZE))
+        elif block.error is None:
+            profile.count('bytes_read', st.st_size)
+            if isinstance(block.body, mmap.mmap):
+                profile.count('mmap')
+            elif isinstance(block.body, StreamedBody):
+                profile.count('streamed')
+    if block.skip_reason is None and block.error is None:
+        profile.file_read(rel_path, st.st_size, elapsed)
+    return block
+
+def _file_header(rel_path, size):
+    """Заголовок файла в дампе"""
+    return _encode(f"\n{'='*60}\n"
+                   f"ФАЙЛ: {rel_path.replace('/', os.sep)}\n"
+                   f"РАЗМЕР: {size} байт\n"
+                   f"{'='*60}\n\n")
+
+def _duplicate_header(rel_path, size, original_path):
+    """Короткий заголовок повторного файла: содержимое уже есть в дампе"""
+    return _encode(f"\n{'='*60}\n"
+                   f"ФАЙЛ: {rel_path.replace('/', os.sep)}\n"
+                   f"РАЗМЕР: {size} байт\n"
+                   f"ДУБЛИКАТ: {original_path.replace('/', os.sep)}\n"
+                   f"{'='*60}\n\n")
+
+def make_duplicate_block(block, original_path):
+    """Блок-ссылка на файл original_path с тем же содержимым"""
+    header = _duplicate_header(block.rel_path, block.entry.stat().st_size, original_path)
+    return FileBlock(block.rel_path, block.entry, header, digest=block.digest, duplicate_of=original_path)
+
+def make_deleted_block(rel_path, entry):
+    """Блок удаленного файла (режимы --since/--range): только заголовок"""
+    header = _encode(f"\n{'='*60}\n"
+                     f"ФАЙЛ: {rel_path.replace('/', os.sep)}\n"
+                     f"ИЗМЕНЕНИЕ: {CHANGE_LABELS['D']}\n"
+                     f"{'='*60}\n\n")
+    return FileBlock(rel_path, entry, header)
+
+def mark_change(block, change):
+    """Добавляет в заголовок блока строку ИЗМЕНЕНИЕ: <статус> (у удаленных она уже есть)"""
+    block.change = change
+    if change.status == 'D':
+        return
+    closing = _encode(f"{'='*60}\n\n")
+    pos = block.header.find(closing)
+    if pos >= 0:
+        block.header = block.header[:pos] + _encode(f"ИЗМЕНЕНИЕ: {change.describe()}\n") + block.header[pos:]
+
+def make_file_block(rel_path, entry, body, with_hash=False, minifier=None):
+    """Собирает FileBlock из уже подготовленного содержимого (сокращенного minifier)"""
+    savings = None
+    license = None
+    if minifier is not None:
+        if isinstance(body, StreamedBody):
+            savings = {}
+            body = body.with_transform(minifier.stream_for(rel_path), savings)
+        else:
+            source = body
+            body, savings, license = minifier.minify(rel_path, body)
+            if body is not source and isinstance(source, mmap.mmap):
+                source.close()
+    # Большие файлы хешируются прямо из mmap или кусками, без копии в памяти
+    digest = None
+    if with_hash:
+        if isinstance(body, StreamedBody):
+            digest = body.digest()
+        else:
+            digest = hashlib.blake2b(body, digest_size=16).hexdigest()
+    return FileBlock(rel_path, entry, _file_header(rel_path, entry.stat().st_size), body, digest=digest,
+                     savings=savings, license=license)
+
+def iter_file_blocks(items, jobs=1, reuse=None, with_hash=False, sniffer=None, io_gate=None, profile=None,
+                     minifier=None):
+    """
+    Читает блоки файлов из items (пары rel_path, entry) и отдает
+    FileBlock строго в исходном порядке.
+    При jobs > 1 файлы читаются пулом потоков, а число и суммарный
+    размер незаписанных блоков ограничены, чтобы не держать в памяти
+    весь репозиторий.
+    reuse(rel_path, entry) может вернуть готовый блок вместо чтения.
+    """
+    if jobs <= 1:
+        for rel_path, entry in items:
+            block = reuse(rel_path, entry) if reuse is not None else None
+            yield block if block is not None else read_file_block(entry, rel_path, with_hash, sniffer, io_gate,
+                                                                  profile, minifier)
+        return
+    
+    max_pending = jobs * MAX_PENDING_PER_JOB
+    pending = deque()
+    pending_bytes = 0
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        for rel_path, entry in items:
+            block = reuse(rel_path, entry) if reuse is not None else None
+            if block is not None:
+                # Готовые блоки не занимают память, но порядок сохраняем
+                pending.append((0, block))
+            else:
+                try:
+                    size = entry.stat().st_size
+                except OSError:
+                    size = 0
+                if size >= STREAM_THRESHOLD:
+                    # Такие файлы копируются кусками при записи и память не занимают
+                    size = 0
+                pending.append((size, pool.submit(read_file_block, entry, rel_path, with_hash, sniffer, io_gate,
+                                                  profile, minifier)))
+                pending_bytes += size
+            
+            # Отдаем готовые блоки по порядку, пока не уложимся в лимиты
+            while pending and (len(pending) >= max_pending or pending_bytes > MAX_PENDING_BYTES):
+                size, item = pending.popleft()
+                pending_bytes -= size
+                yield item.result() if isinstance(item, Future) else item
+        
+        while pending:
+            size, item = pending.popleft()
+            yield item.result() if isinstance(item, Future) else item
+
+# Версия формата манифеста инкрементального режима
+MANIFEST_VERSION = 2
+
+def manifest_path_for(output_file):
+    """Путь к манифесту рядом с выходным файлом"""
+    return output_file.with_name(output_file.name + '.manifest.json')
+
+class DumpManifest:
+    """
+    Манифест инкрементального режима: для каждого файла дампа хранит
+    (путь, размер, mtime_ns, хеш содержимого, смещение и длину блока,
+    начало и длину содержимого внутри блока).
+    Блоки неизмененных файлов копируются из предыдущего дампа без
+    чтения исходников.
+    """
+
+    def __init__(self, settings=None):
+        self.settings = settings or {}
+        self.files = {}
+        self.binary_keys = []
+        self.started_ns = 0
+        self.dump_size = None
+        self.dump_mtime_ns = None
+
+    @classmethod
+    def load(cls, path, settings, dump_path):
+        """
+        Загружает манифест. Возвращает None, если его нет, он поврежден,
+        создан с другими настройками или дамп менялся после создания.
+        """
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            st = os.stat(dump_path)
+        except (OSError, ValueError):
+            return None
+        if data.get('version') != MANIFEST_VERSION or data.get('settings') != settings:
+            return None
+        if data.get('dump_size') != st.st_size or data.get('dump_mtime_ns') != st.st_mtime_ns:
+            return None
+        manifest = cls(settings)
+        manifest.started_ns = data.get('started_ns', 0)
+        manifest.binary_keys = data.get('binary', [])
+        for path_str, *record in data.get('files', []):
+            manifest.files[path_str] = tuple(record)
+        return manifest
+
+    def add(self, rel_path, size, mtime_ns, digest, offset, length, body_span):
+        self.files[rel_path] = (size, mtime_ns, digest, offset, length) + tuple(body_span)
+
+    def lookup(self, rel_path, size, mtime_ns):
+        """
+        Возвращает (хеш, смещение, длина, (начало, длина содержимого))
+        блока, если файл не менялся.
+        Файлы, измененные во время прошлого прогона, считаются
+        измененными: mtime мог не успеть сдвинуться.
+        """
+        record = self.files.get(rel_path)
+        if record is None:
+            return None
+        old_size, old_mtime_ns, digest, offset, length, body_start, body_length = record
+        if old_size != size or old_mtime_ns != mtime_ns or mtime_ns >= self.started_ns:
+            return None
+        return digest, offset, length, (body_start, body_length)
+
+    def save(self, path, dump_path):
+        """Сохраняет манифест для дампа dump_path"""
+        st = os.stat(dump_path)
+        data = {
+            'version': MANIFEST_VERSION,
+            'settings': self.settings,
+            'started_ns': self.started_ns,
+            'dump_size': st.st_size,
+            'dump_mtime_ns': st.st_mtime_ns,
+            'files': [[rel_path] + list(record) for rel_path, record in self.files.items()],
+            'binary': self.binary_keys,
+        }
+        tmp_path = path.with_name(path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, path)
+
+class ReusedBlock:
+    """Блок файла, который копируется из предыдущего дампа как есть"""
+
+    __slots__ = ('rel_path', 'entry', 'digest', 'error', 'skip_reason', 'savings', 'license', '_source', '_offset',
+                 '_length', '_body_span')
+
+    def __init__(self, rel_path, entry, source, digest, offset, length, body_span):
+        self.rel_path = rel_path
+        self.entry = entry
+        self.digest = digest
+        self.error = None
+        self.skip_reason = None
+        self.savings = None
+        self.license = None
+        self._source = source
+        self._offset = offset
+        self._length = length
+        self._body_span = body_span
+
+    def write_to(self, out_file):
+        out_file.copy_range(self._source, self._offset, self._length)
+
+    def length(self):
+        return self._length
+
+    def body_span(self):
+        return self._body_span
+
+    def release(self):
+        pass
+
+TOC_VERSION = 1
+
+def toc_path_for(output_file):
+    """Путь к оглавлению рядом с выходным файлом"""
+    return output_file.with_name(output_file.name + '.toc.json')
+
+class DumpToc:
+    """
+    Оглавление дампа: для каждого файла - номер файла дампа (части),
+    смещение и длина содержимого. Позволяет читать отдельные файлы
+    из дампа без разбора заголовков (см. DumpReader).
+    """
+
+    def __init__(self):
+        self.files = []
+
+    def add(self, rel_path, dump_index, offset, length):
+        self.files.append((rel_path, dump_index, offset, length))
+
+    def save(self, path, dump_paths):
+        """Сохраняет оглавление; размеры и mtime дампов нужны для проверки актуальности"""
+        dumps = []
+        for dump_path in dump_paths:
+            st = os.stat(dump_path)
+            dumps.append({'file': Path(dump_path).name, 'size': st.st_size, 'mtime_ns': st.st_mtime_ns})
+        data = {
+            'version': TOC_VERSION,
+            'dumps': dumps,
+            'files': [list(record) for record in self.files],
+        }
+        tmp_path = path.with_name(path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, path)
+
+class DumpReader:
+    """
+    Чтение отдельных файлов из дампа по оглавлению (<дамп>.toc.json).
+    Дамп отображается в память (mmap), поэтому чтение файла не зависит
+    от размера дампа. Пример:
+
+        with DumpReader('repo_dump.txt') as reader:
+            text = reader.read_text('src/main.py')
+    """
+
+    def __init__(self, dump_path, toc_path=None):
+        dump_path = Path(dump_path)
+        toc_path = Path(toc_path) if toc_path is not None else toc_path_for(dump_path)
+        with open(toc_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('version') != TOC_VERSION:
+            raise ValueError(f"Неподдерживаемая версия оглавления: {toc_path}")
+        self._dumps = []
+        for info in data['dumps']:
+            path = toc_path.with_name(info['file'])
+            st = os.stat(path)
+            if st.st_size != info['size'] or st.st_mtime_ns != info['mtime_ns']:
+                raise ValueError(f"Оглавление {toc_path.name} не соответствует файлу {path.name}")
+            self._dumps.append(path)
+        self._maps = [None] * len(self._dumps)
+        self._files = {rel_path: (index, offset, length) for rel_path, index, offset, length in data['files']}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return len(self._files)
+
+    def __contains__(self, rel_path):
+        return rel_path in self._files
+
+    def paths(self):
+        """Пути файлов в порядке дампа"""
+        return list(self._files)
+
+    def size(self, rel_path):
+        """Размер содержимого файла в дампе (в байтах UTF-8)"""
+        return self._files[rel_path][2]
+
+    def _map(self, index):
+        mapped = self._maps[index]
+        if mapped is None:
+            with open(self._dumps[index], 'rb') as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[index] = mapped
+        return mapped
+
+    def read(self, rel_path):
+        """Содержимое файла в байтах; KeyError, если файла нет в дампе"""
+        index, offset, length = self._files[rel_path]
+        if not length:
+            return b''
+        return self._map(index)[offset:offset + length]
+
+    def read_text(self, rel_path):
+        """Содержимое файла как строка"""
+        return self.read(rel_path).decode('utf-8')
+
+    def close(self):
+        for index, mapped in enumerate(self._maps):
+            if mapped is not None:
+                mapped.close()
+                self._maps[index] = None
+
+# Машиночитаемые форматы вывода (--format jsonl/binary)
+FRAMED_VERSION = 1
+BINARY_MAGIC = b'REPODMP\x01'
+# Кадр двоичного формата: длина метаданных (4 байта) и длина содержимого (8 байт)
+_FRAME = struct.Struct('>IQ')
+
+def _framed_json(meta):
+    return _encode(json.dumps(meta, ensure_ascii=False, separators=(',', ':')))
+
+def _dump_meta(format_name, info, part):
+    """Запись-заголовок дампа для jsonl и binary"""
+    meta = {'type': 'dump', 'format': format_name, 'version': FRAMED_VERSION, 'hash': 'blake2b-128'}
+    meta.update((key, value) for key, value in info.items() if value is not None)
+    if part is not None:
+        meta['part'] = part
+    return meta
+
+def _file_meta(block):
+    """Метаданные файла для jsonl и binary: путь, размер на диске, mtime, хеш содержимого"""
+    entry = block.entry
+    try:
+        st = entry.stat()
+    except OSError:
+        # Файл исчез до чтения - такой блок несет ошибку чтения
+        st = None
+    meta = {
+        'type': 'file',
+        'path': block.rel_path,
+        'size': st.st_size if st is not None else 0,
+        # У объектов git нет mtime
+        'mtime': None if st is None or isinstance(entry, GitBlobEntry) else st.st_mtime,
+        'hash': block.digest,
+    }
+    change = block.change
+    if change is not None:
+        meta['change'] = change.status
+        if change.old_path is not None:
+            meta['old_path'] = change.old_path
+    if block.duplicate_of is not None:
+        meta['duplicate_of'] = block.duplicate_of
+    if block.error is not None:
+        meta['error'] = str(block.error)
+    return meta
+
+def _has_content(block):
+    """Есть ли у блока содержимое (нет у ошибок, дубликатов и удаленных файлов)"""
+    if block.error is not None or block.duplicate_of is not None:
+        return False
+    return block.change is None or block.change.status != 'D'
+
+def _json_string_chunks(chunks, savings=None):
+    """Потоковое экранирование кусков UTF-8 в строку JSON (с кавычками)"""
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    yield b'"'
+    for chunk in chunks:
+        text = decoder.decode(chunk)
+        if text:
+            yield _encode(json.dumps(text, ensure_ascii=False)[1:-1])
+    text = decoder.decode(b'', final=True)
+    if text:
+        yield _encode(json.dumps(text, ensure_ascii=False)[1:-1])
+    yield b'"'
+
+class TextFormat:
+    """
+    Текстовый формат (по умолчанию): рамки из '=' и заголовки для
+    чтения человеком или LLM. Заголовки файлов собираются при чтении
+    (_file_header), поэтому блоки пишутся как есть.
+    """
+
+    name = 'text'
+
+    def header(self, info, part=None):
+        """Заголовок дампа (или части с номером part)"""
+        header = _encode(f"{'='*80}\n") + _encode(f"ДАМП РЕПОЗИТОРИЯ: {info['repo']}\n")
+        filters = info.get('filters')
+        if filters is not None:
+            header += _encode(f"ФИЛЬТРЫ: пропускать бинарные={filters['skip_binary']}, .git={filters['skip_git']}, использовать .gitignore={filters.get('use_gitignore', True)}\n")
+        if info.get('range') is not None:
+            header += _encode(f"ИЗМЕНЕНИЯ: {info['range']}\n")
+        elif info.get('since') is not None:
+            header += _encode(f"ИЗМЕНЕНИЯ: {info['since']} -> рабочая копия\n")
+        if part is not None:
+            header += _encode(f"ЧАСТЬ: {part}\n")
+        return header + _encode(f"{'='*80}\n\n")
+
+    def frame(self, block):
+        """Готовит блок к записи в этом формате"""
+        return block
+
+    def _section(self, title):
+        return _encode(f"\n\n{'='*80}\n") + _encode(f"{title}\n") + _encode(f"{'='*80}\n\n")
+
+    def git_info(self, text):
+        return self._section("ИНФОРМАЦИЯ О GIT") + _encode(text)
+
+    def gitignore_rules(self, patterns):
+        return self._section("ПРИМЕНЕННЫЕ ПРАВИЛА .gitignore") + _encode(''.join(f"- {pattern}\n" for pattern in patterns))
+
+    def truncation_note(self, limit, rel_path):
+        """Отметка об обрезке; rel_path=None - короткая, без первого не вошедшего файла"""
+        note = _encode(f"\n\n{'='*80}\n") + _encode(f"ДАМП ОБРЕЗАН: превышен лимит размера {limit} байт\n")
+        if rel_path is not None:
+            note += _encode(f"Первый не вошедший файл: {rel_path.replace('/', os.sep)}\n")
+        return note + _encode(f"{'='*80}\n")
+
+class JsonlFormat:
+    """
+    JSON Lines: по объекту на строку. Первая строка - заголовок
+    {"type": "dump", ...}, затем по строке на файл {"type": "file",
+    "path", "size", "mtime", "hash", "content"} и итоговые записи
+    "git", "gitignore" и "truncated". Содержимое экранируется при
+    записи, большие файлы - потоково.
+    """
+
+    name = 'jsonl'
+
+    def _record(self, meta):
+        return _framed_json(meta) + b'\n'
+
+    def header(self, info, part=None):
+        return self._record(_dump_meta(self.name, info, part))
+
+    def frame(self, block):
+        if isinstance(block, ReusedBlock):
+            return block
+        meta = _file_meta(block)
+        if not _has_content(block):
+            block.release()
+            block.header = self._record(meta)
+            block.tail = b''
+            return block
+        body = block.body
+        if isinstance(body, StreamedBody):
+            body = body.with_transform(_json_string_chunks)
+        else:
+            text = json.dumps(str(body, 'utf-8', 'replace'), ensure_ascii=False)
+            block.release()
+            body = _encode(text)
+        # Содержимое - последнее поле записи: метаданные можно прочитать, не разбирая его
+        block.header = _framed_json(meta)[:-1] + b',"content":'
+        block.body = body
+        block.tail = b'}\n'
+        return block
+
+    def git_info(self, text):
+        return self._record({'type': 'git', 'text': text})
+
+    def gitignore_rules(self, patterns):
+        return self._record({'type': 'gitignore', 'patterns': list(patterns)})
+
+    def truncation_note(self, limit, rel_path):
+        return self._record({'type': 'truncated', 'limit': limit, 'next_path': rel_path})
+
+class BinaryFormat:
+    """
+    Двоичный формат с длинами: файл начинается с BINARY_MAGIC, дальше
+    кадры - длина метаданных и длина содержимого (_FRAME, big-endian),
+    метаданные (JSON в UTF-8, те же записи, что в JsonlFormat, без
+    "content") и содержимое как есть. Читатель переходит от кадра к
+    кадру по длинам, не просматривая содержимое (FramedDumpReader);
+    смещения содержимого точные, так что работает и оглавление (--toc).
+    """
+
+    name = 'binary'
+
+    def _frame(self, meta, length=0):
+        data = _framed_json(meta)
+        return _FRAME.pack(len(data), length) + data
+
+    def header(self, info, part=None):
+        return BINARY_MAGIC + self._frame(_dump_meta(self.name, info, part))
+
+    def frame(self, block):
+        if isinstance(block, ReusedBlock):
+            return block
+        if not _has_content(block):
+            block.release()
+        block.header = self._frame(_file_meta(block), len(block.body))
+        block.tail = b''
+        return block
+
+    def git_info(self, text):
+        data = _encode(text)
+        return self._frame({'type': 'git'}, len(data)) + data
+
+    def gitignore_rules(self, patterns):
+        return self._frame({'type': 'gitignore', 'patterns': list(patterns)})
+
+    def truncation_note(self, limit, rel_path):
+        return self._frame({'type': 'truncated', 'limit': limit, 'next_path': rel_path})
+
+# Форматы вывода (--format) и расширения файлов дампа
+OUTPUT_FORMATS = {'text': TextFormat, 'jsonl': JsonlFormat, 'binary': BinaryFormat}
+FORMAT_EXTENSIONS = {'text': '.txt', 'jsonl': '.jsonl', 'binary': '.bin'}
+
+class FramedDumpReader:
+    """
+    Чтение дампа в формате jsonl или binary (--format) без оглавления.
+    Дамп отображается в память (mmap). В двоичном формате список файлов
+    строится переходами по длинам кадров, содержимое не просматривается;
+    jsonl разбирается построчно. Сжатые дампы не поддерживаются. Пример:
+
+        with FramedDumpReader('repo_dump.bin') as reader:
+            for meta in reader.files():
+                print(meta['path'], meta['size'], meta['hash'])
+            text = reader.read_text('src/main.py')
+    """
+
+    def __init__(self, dump_path):
+        self.path = Path(dump_path)
+        # Запись {"type": "dump"} и итоговые записи (git, gitignore, truncated)
+        self.header = None
+        self.sections = []
+        self._files = {}
+        self._map = None
+        with open(self.path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if self._map is not None and self._map[:len(BINARY_MAGIC)] == BINARY_MAGIC:
+                self.format = 'binary'
+                self._index_binary()
+            elif self._map is not None and self._map[:1] == b'{':
+                self.format = 'jsonl'
+                self._index_jsonl()
+            else:
+                raise ValueError(f"Файл не является дампом в формате jsonl или binary: {self.path}")
+        except BaseException:
+            self.close()
+            raise
+
+    def _index_binary(self):
+        mapped = self._map
+        end = len(mapped)
+        pos = len(BINARY_MAGIC)
+        while pos < end:
+            if pos + _FRAME.size > end:
+                raise ValueError(f"Дамп {self.path.name} обрезан (смещение {pos})")
+            meta_length, length = _FRAME.unpack_from(mapped, pos)
+            start = pos + _FRAME.size + meta_length
+            if start + length > end:
+                raise ValueError(f"Дамп {self.path.name} обрезан (смещение {pos})")
+            self._add(json.loads(mapped[pos + _FRAME.size:start].decode('utf-8')), start, length)
+            pos = start + length
+
+    def _index_jsonl(self):
+        mapped = self._map
+        end = len(mapped)
+        pos = 0
+        while pos < end:
+            newline = mapped.find(b'\n', pos)
+            if newline < 0:
+                newline = end
+            if newline > pos:
+                record = json.loads(mapped[pos:newline].decode('utf-8'))
+                record.pop('content', None)
+                self._add(record, pos, newline - pos)
+            pos = newline + 1
+
+    def _add(self, meta, offset, length):
+        kind = meta.get('type')
+        if kind == 'file':
+            self._files[meta['path']] = (meta, offset, length)
+        elif kind == 'dump':
+            if self.header is None:
+                self.header = meta
+        else:
+            if self.format == 'binary' and length:
+                meta['text'] = self._map[offset:offset + length].decode('utf-8')
+            self.sections.append(meta)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return len(self._files)
+
+    def __contains__(self, rel_path):
+        return rel_path in self._files
+
+    def paths(self):
+        """Пути файлов в порядке дампа"""
+        return list(self._files)
+
+    def files(self):
+        """Метаданные файлов в порядке дампа (path, size, mtime, hash, ...)"""
+        return (meta for meta, _, _ in self._files.values())
+
+    def meta(self, rel_path):
+        """Метаданные файла; KeyError, если файла нет в дампе"""
+        return self._files[rel_path][0]
+
+    def read(self, rel_path):
+        """Содержимое файла в байтах (для дубликата - содержимое первого файла)"""
+        meta, offset, length = self._files[rel_path]
+        if meta.get('duplicate_of') is not None:
+            return self.read(meta['duplicate_of'])
+        if self.format == 'binary':
+            return self._map[offset:offset + length]
+        record = json.loads(self._map[offset:offset + length].decode('utf-8'))
+        return _encode(record.get('content', ''))
+
+    def read_text(self, rel_path):
+        """Содержимое файла как строка"""
+        return self.read(rel_path).decode('utf-8')
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+class _StageTimer:
+    """Контекстный менеджер замера этапа для DumpProfile.stage()"""
+
+    __slots__ = ('_profile', '_name', '_wall', '_cpu')
+
+    def __init__(self, profile, name):
+        self._profile = profile
+        self._name = name
+
+    def __enter__(self):
+        self._wall = time.perf_counter()
+        self._cpu = time.thread_time()
+        return self
+
+    def __exit__(self, *exc):
+        self._profile.add_stage(self._name, time.perf_counter() - self._wall, time.thread_time() - self._cpu)
+
+class DumpProfile:
+    """
+    Инструментирование дампа (--stats): время по этапам (wall и CPU
+    потока), счетчики операций, причины пропуска, срабатывания правил
+    .gitignore и самые медленные/крупные файлы. Без профиля (None)
+    замеры не выполняются.
+    Время этапа read - сумма по потокам чтения, поэтому при -j > 1
+    оно может превышать общее время.
+    """
+
+    def __init__(self, top_n=10):
+        self.top_n = top_n
+        self._lock = threading.Lock()
+        self.stages = {}
+        self.counters = {}
+        self.skipped_files = {}
+        self.skipped_dirs = {}
+        self.rule_hits = {}
+        self._slowest = []
+        self._largest = []
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+
+    def stage(self, name):
+        return _StageTimer(self, name)
+
+    def add_stage(self, name, wall, cpu=0.0, calls=1):
+        with self._lock:
+            stage = self.stages.get(name)
+            if stage is None:
+                stage = self.stages[name] = [0.0, 0.0, 0]
+            stage[0] += wall
+            stage[1] += cpu
+            stage[2] += calls
+
+    def stage_wall(self, name):
+        stage = self.stages.get(name)
+        return stage[0] if stage is not None else 0.0
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def timed_iter(self, name, iterable, exclude=None):
+        """
+        Отдает элементы iterable, считая время их получения этапом name.
+        Время этапа exclude, набежавшее внутри, вычитается (например,
+        фильтры, вызываемые из обхода).
+        """
+        iterator = iter(iterable)
+        while True:
+            excluded = self.stage_wall(exclude) if exclude else 0.0
+            wall = time.perf_counter()
+            cpu = time.thread_time()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                item = None
+                done = True
+            else:
+                done = False
+            inner = self.stage_wall(exclude) - excluded if exclude else 0.0
+            self.add_stage(name, time.perf_counter() - wall - inner, max(0.0, time.thread_time() - cpu - inner))
+            if done:
+                return
+            yield item
+
+    def skip(self, reason, is_dir=False, rule=None):
+        """Учитывает пропуск; rule - сработавшее правило .gitignore"""
+        counts = self.skipped_dirs if is_dir else self.skipped_files
+        counts[reason] = counts.get(reason, 0) + 1
+        if rule is not None:
+            text = rule.display()
+            self.rule_hits[text] = self.rule_hits.get(text, 0) + 1
+
+    def file_read(self, rel_path, size, elapsed):
+        """Учитывает прочитанный файл для списков самых медленных и крупных"""
+        with self._lock:
+            for items, key in ((self._slowest, elapsed), (self._largest, size)):
+                if len(items) < self.top_n:
+                    heapq.heappush(items, (key, rel_path))
+                elif key > items[0][0]:
+                    heapq.heapreplace(items, (key, rel_path))
+
+    def to_dict(self, stats=None):
+        """Отчет в виде словаря для JSON"""
+        total_wall = time.perf_counter() - self._wall
+        total_cpu = time.process_time() - self._cpu
+        report = {
+            'version': 1,
+            'total': {'wall': total_wall, 'cpu': total_cpu},
+            'stages': {name: {'wall': wall, 'cpu': cpu, 'calls': calls}
+                       for name, (wall, cpu, calls) in self.stages.items()},
+            'counters': dict(self.counters),
+            'skipped': {'files': dict(self.skipped_files), 'dirs': dict(self.skipped_dirs)},
+            'gitignore_rule_hits': dict(sorted(self.rule_hits.items(), key=lambda item: -item[1])),
+            'slowest_files': [{'path': path, 'seconds': elapsed}
+                              for elapsed, path in sorted(self._slowest, reverse=True)],
+            'largest_files': [{'path': path, 'bytes': size}
+                              for size, path in sorted(self._largest, reverse=True)],
+        }
+        if stats is not None:
+            report['summary'] = {name: getattr(stats, name) for name in DumpStats.__slots__ if name != 'outputs'}
+            report['summary']['outputs'] = [str(path) for path in stats.outputs]
+        return report
+
+    def save(self, path, stats=None):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(stats), f, ensure_ascii=False, indent=1)
+
+class DumpStats:
+    """Итоги дампа"""
+
+    __slots__ = ('processed', 'skipped', 'skipped_by_gitignore', 'skipped_by_content', 'skip_reasons',
+                 'reused', 'duplicates', 'duplicate_bytes_saved', 'stripped', 'deleted', 'truncated', 'outputs')
+
+    def __init__(self):
+        self.processed = 0
+        self.skipped = 0
+        self.skipped_by_gitignore = 0
+        self.skipped_by_content = 0
+        # Причина пропуска (см. FileRecord.skip_reason) -> число пропущенных файлов
+        self.skip_reasons = {}
+        self.reused = 0
+        self.duplicates = 0
+        self.duplicate_bytes_saved = 0
+        # Преобразование --strip -> сэкономлено байт
+        self.stripped = {}
+        # Удаленные файлы, отмеченные в дампе (--since/--range)
+        self.deleted = 0
+        # Дамп остановлен по лимиту общего размера
+        self.truncated = False
+        # Файлы дампа (несколько при разбиении на части)
+        self.outputs = []
+
+class FileRecord:
+    """
+    Файл, прошедший через конвейер Dumper.
+    skip_reason - None, если файл попадает в дамп, иначе причина
+    пропуска: причина фильтра (см. entry_skip_reason), 'not_file',
+    'binary' (по содержимому) или 'error'.
+    Содержимое (open()) доступно, пока не запрошена следующая запись.
+    """
+
+    __slots__ = ('path', 'entry', 'skip_reason', 'block')
+
+    def __init__(self, path, entry, skip_reason=None, block=None):
+        self.path = path
+        self.entry = entry
+        self.skip_reason = skip_reason
+        self.block = block
+
+    @property
+    def size(self):
+        """Размер файла на диске (или объекта git)"""
+        return self.entry.stat().st_size
+
+    @property
+    def digest(self):
+        return self.block.digest if self.block is not None else None
+
+    @property
+    def error(self):
+        return self.block.error if self.block is not None else None
+
+    def open(self):
+        """Бинарный поток с содержимым в UTF-8 (пустой для пропущенных файлов)"""
+        body = self.block.body if self.block is not None and self.skip_reason is None else b''
+        if isinstance(body, StreamedBody):
+            return body.open()
+        if isinstance(body, mmap.mmap):
+            body.seek(0)
+            return body
+        return io.BytesIO(body)
+
+    def release(self):
+        if self.block is not None:
+            self.block.release()
+
+class FileSink:
+    """Дамп в файл; поддерживает части, оглавление и инкрементальный режим"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+
+class StreamSink:
+    """Дамп в открытый бинарный поток (stdout, pipe); поток не закрывается"""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def open(self, header, compress=None):
+        return SingleFileDump(self.stream, header, compress, close_raw=False)
+
+    def close(self):
+        """Вызывается после записи дампа"""
+
+class MemorySink(StreamSink):
+    """Дамп в память; результат - getvalue()"""
+
+    def __init__(self):
+        super().__init__(io.BytesIO())
+
+    def getvalue(self):
+        return self.stream.getvalue()
+
+class SocketSink(StreamSink):
+    """Дамп в сокет; сам сокет после записи остается открытым"""
+
+    def __init__(self, sock):
+        self.socket = sock
+        super().__init__(sock.makefile('wb'))
+
+    def close(self):
+        # Закрывается только файловый объект makefile(), не сокет
+        self.stream.close()
+
+class Dumper:
+    """
+    Неинтерактивный дамп репозитория для использования как библиотеки.
+
+        dumper = Dumper('/path/to/repo', jobs=4)
+        for record in dumper.records():      # ленивый конвейер файлов
+            print(record.path, record.skip_reason)
+        stats = dumper.dump('repo_dump.txt')  # или FileSink/StreamSink/MemorySink/SocketSink
+
+    filters - настройки фильтрации (по умолчанию DEFAULT_FILTERS).
+    jobs - число потоков чтения файлов (порядок в дампе не меняется).
+    walk_jobs - число потоков чтения директорий при обходе (см.
+    walk_repo_parallel); порядок тоже не меняется.
+    source - откуда брать список файлов: 'walk' (обход директорий)
+    или 'git-index' (git ls-files, правила .gitignore применяет git).
+    revision - снять дамп коммита/тега прямо из базы объектов git
+    (без checkout); source при этом не используется.
+    since - дамп только файлов, измененных с ревизии since по рабочую
+    копию (включая неотслеживаемые); diff_range - только файлов,
+    измененных в диапазоне 'A..B' или 'A...B' (содержимое из B).
+    Удаленные и переименованные файлы отмечаются строкой ИЗМЕНЕНИЕ.
+    compress - сжимать вывод на лету: 'gzip', 'zstd' или 'xz'.
+    max_shard_size - разбить дамп на части не больше этого размера
+    (в единицах shard_unit: 'bytes' или 'tokens') по границам файлов;
+    рядом пишется индекс частей. При jobs > 1 части пишутся параллельно.
+    toc - записать оглавление <дамп>.toc.json со смещениями файлов
+    для чтения через DumpReader.
+    incremental - переиспользовать блоки неизмененных файлов из
+    предыдущего дампа по манифесту рядом с выходным файлом.
+    dedup - содержимое одинаковых файлов пишется один раз, повторные
+    файлы получают короткий заголовок со ссылкой на первый.
+    strip - преобразования для сокращения вывода (см. STRIP_TRANSFORMS
+    и SourceMinifier): комментарии, повторные лицензионные заголовки,
+    пробелы в конце строк, пустые строки. Экономия по каждому - в
+    DumpStats.stripped.
+    output_format - формат вывода (OUTPUT_FORMATS): 'text' (по
+    умолчанию), 'jsonl' (JsonlFormat) или 'binary' (BinaryFormat);
+    машиночитаемые форматы читаются через FramedDumpReader.
+    max_total_size - лимит размера дампа в байтах (до сжатия): файл,
+    который не помещается, и все следующие не пишутся, в дамп
+    добавляется отметка об обрезке. В лимит входят заголовки дампа и
+    частей, отметка и итоговые разделы (git, .gitignore), которые при
+    нехватке места сокращаются.
+    show_filters - добавить строку ФИЛЬТРЫ в заголовок дампа.
+    git_status - добавить вывод git status; он считается в фоне
+    одновременно с записью файлов.
+    io_gate - семафор, ограничивающий одновременные чтения файлов.
+    profile - DumpProfile для замеров по этапам (--stats).
+    log - функция для сообщений о ходе работы (например, print);
+    verbose - выводить подробные сообщения и прогресс в процентах.
+    Части, оглавление и инкрементальный режим доступны только для FileSink.
+    """
+
+    def __init__(self, repo_path, filters=None, jobs=1, walk_jobs=1, source='walk', revision=None, since=None,
+                 diff_range=None, compress=None,
+                 max_shard_size=None, shard_unit='bytes', toc=False, incremental=False, dedup=False, strip=None,
+                 output_format='text', max_total_size=None, show_filters=False, git_status=True, io_gate=None, profile=None, log=None, verbose=False):
+        self.repo_path = Path(repo_path).resolve()
+        self.filters = dict(DEFAULT_FILTERS)
+        if filters:
+            self.filters.update(filters)
+        self.jobs = max(1, jobs)
+        self.walk_jobs = max(1, walk_jobs)
+        self.source = source
+        self.revision = revision
+        if sum(option is not None for option in (revision, since, diff_range)) > 1:
+            raise ValueError("revision, since и diff_range взаимоисключающие")
+        if diff_range is not None and split_diff_range(diff_range) is None:
+            raise ValueError(f"Ожидается диапазон вида A..B: '{diff_range}'")
+        self.since = since
+        self.diff_range = diff_range
+        self.compress = compress
+        self.max_shard_size = max_shard_size
+        self.shard_unit = shard_unit
+        self.toc = toc
+        self.incremental = incremental
+        self.dedup = dedup
+        self.minifier = SourceMinifier(strip) if strip else None
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Неизвестный формат вывода: '{output_format}'")
+        self.output_format = output_format
+        self.max_total_size = max_total_size
+        self.show_filters = show_filters
+        self.git_status = git_status
+        self.io_gate = io_gate
+        self.profile = profile
+        self.log = log
+        self.verbose = verbose
+        self.stats = DumpStats()
+        self.gitignore = []
+        self._tree_items = None
+        self._index_paths = None
+        self._changes = None
+        self._change_items = None
+        self._progress = WalkProgress()
+
+    def _message(self, text, detail=False):
+        if self.log is not None and (self.verbose or not detail):
+            self.log(text)
+
+    def _stage(self, name):
+        """Замер этапа, если включен профиль"""
+        return self.profile.stage(name) if self.profile is not None else contextlib.nullcontext()
+
+    def _prepare(self):
+        """Список файлов ревизии или индекса и правила .gitignore"""
+        repo_path = self.repo_path
+        self.stats = DumpStats()
+        self._progress = WalkProgress()
+        
+        # Файлы ревизии берутся из базы объектов git
+        self._tree_items = None
+        if self.revision is not None:
+            self._message(f"📄 Чтение дерева ревизии {self.revision}...", detail=True)
+            with self._stage('git_list'):
+                commit = resolve_revision(repo_path, self.revision)
+                self._tree_items = list_git_tree(repo_path, self.revision) if commit else None
+            if self._tree_items is None:
+                raise ValueError(f"Ревизия '{self.revision}' не найдена в репозитории")
+        
+        # Только измененные файлы: один вызов git diff
+        self._changes = None
+        self._change_items = None
+        if self.since is not None or self.diff_range is not None:
+            self._prepare_changes()
+        
+        # Список файлов из индекса git
+        self._index_paths = None
+        if self.source == 'git-index' and self.revision is None and self._changes is None:
+            self._message("📄 Получение списка файлов из индекса git...", detail=True)
+            with self._stage('git_list'):
+                self._index_paths = list_git_index_files(repo_path, self.filters.get('use_gitignore', True))
+            if self._index_paths is None:
+                self._message("⚠️  Не удалось получить список файлов из git, используется обход директорий")
+        
+        # Правила .gitignore подгружаются по ходу обхода (при работе с индексом их применяет git)
+        self.gitignore = []
+        if (self.filters.get('use_gitignore', True) and self._index_paths is None and self._tree_items is None
+                and self._changes is None):
+            with self._stage('gitignore_parse'):
+                self.gitignore = GitignoreMatcher.for_walk(repo_path)
+            if self.gitignore:
+                self._message(f"✓ Загружено {len(self.gitignore)} правил исключений git", detail=True)
+
+    def _prepare_changes(self):
+        """Список изменений и записи для конвейера (правила .gitignore применяет git)"""
+        repo_path = self.repo_path
+        self._message("🔀 Получение списка изменений из git...", detail=True)
+        with self._stage('git_list'):
+            changes = list_git_changes(repo_path, self.since, self.diff_range,
+                                       exclude_standard=self.filters.get('use_gitignore', True))
+            if changes is None:
+                raise ValueError(f"Не удалось получить изменения '{self.diff_range or self.since}' из git")
+            sizes = git_blob_sizes(repo_path, [change.oid for change in changes if change.oid is not None])
+        
+        items = []
+        root = str(repo_path)
+        for change in changes:
+            if change.status == 'D':
+                entry = GitBlobEntry(change.path, None, 0)
+            elif self.diff_range is not None:
+                entry = GitBlobEntry(change.path, change.oid, sizes.get(change.oid, 0))
+            else:
+                entry = PathEntry(os.path.join(root, change.path))
+            items.append((change.path, entry))
+        self._changes = {change.path: change for change in changes}
+        self._change_items = items
+        
+        counts = {}
+        for change in changes:
+            counts[change.status] = counts.get(change.status, 0) + 1
+        summary = ', '.join(f"{CHANGE_LABELS.get(status, status)}: {count}" for status, count in sorted(counts.items()))
+        self._message(f"✓ Измененных файлов: {len(changes)}" + (f" ({summary})" if summary else ''), detail=True)
+
+    def _skip_reason(self, entry, rel_path, pipeline, parents_checked):
+        """Причина пропуска записи обхода (см. entry_skip_reason) или None"""
+        profile = self.profile
+        if profile is not None:
+            wall = time.perf_counter()
+            cpu = time.thread_time()
+        reason = pipeline.reason(entry, rel_path, parents_checked)
+        if reason == 'gitignore':
+            self.stats.skipped_by_gitignore += 1
+        if profile is not None:
+            profile.add_stage('filter', time.perf_counter() - wall, time.thread_time() - cpu)
+            if reason is not None:
+                profile.skip(reason, entry.is_dir(), pipeline.last_rule)
+        return reason
+
+    def _records(self, output_ids, reuse=None, with_hash=False, sniffer=None):
+        """Конвейер: обход -> фильтры -> чтение блоков (возможно, параллельное)"""
+        skipped = deque()
+        progress = self._progress
+        pipeline = FilterPipeline(self.filters, self.gitignore, output_ids)
+        # При обходе родительские директории уже проверены (пропущенные не обходятся)
+        walked = self._change_items is None and self._tree_items is None and self._index_paths is None
+        
+        def skip_dir(entry, rel_path):
+            return self._skip_reason(entry, rel_path, pipeline, True) is not None
+        
+        def selected_files():
+            if self._change_items is not None:
+                progress.files_seen = len(self._change_items)
+                candidates = self._change_items
+            elif self._tree_items is not None:
+                progress.files_seen = len(self._tree_items)
+                candidates = self._tree_items
+            elif self._index_paths is not None:
+                candidates = iter_git_index_files(self.repo_path, self._index_paths, progress)
+            else:
+                gitignore = self.gitignore if isinstance(self.gitignore, GitignoreMatcher) else None
+                if self.walk_jobs > 1:
+                    candidates = walk_repo_parallel(self.repo_path, skip_dir, progress, gitignore, self.walk_jobs)
+                else:
+                    candidates = walk_repo(self.repo_path, skip_dir, progress, gitignore)
+            if self.profile is not None:
+                # Время фильтров, вызываемых из обхода для директорий, считается отдельно
+                candidates = self.profile.timed_iter('traversal', candidates, exclude='filter')
+            for rel_path, entry in candidates:
+                reason = self._skip_reason(entry, rel_path, pipeline, walked)
+                if reason is None and not entry.is_file():
+                    reason = 'not_file'
+                    if self.profile is not None:
+                        self.profile.skip(reason)
+                if reason is not None:
+                    skipped.append(FileRecord(rel_path, entry, reason))
+                    continue
+                yield rel_path, entry
+        
+        # Удаленные файлы рабочей копии не читаются: вместо них блок-отметка
+        if self._change_items is not None and self.diff_range is None:
+            def reuse(rel_path, entry):
+                return make_deleted_block(rel_path, entry) if isinstance(entry, GitBlobEntry) else None
+        
+        # Блоки читаются (возможно, параллельно), а отдаются строго по порядку
+        if self._tree_items is not None or self.diff_range is not None:
+            blocks = iter_revision_blocks(self.repo_path, selected_files(), with_hash=with_hash,
+                                          sniff_binary=self.filters['skip_binary'], minifier=self.minifier)
+        else:
+            blocks = iter_file_blocks(selected_files(), self.jobs, reuse, with_hash=with_hash, sniffer=sniffer,
+                                      io_gate=self.io_gate, profile=self.profile, minifier=self.minifier)
+        for block in blocks:
+            while skipped:
+                yield skipped.popleft()
+            reason = block.skip_reason
+            if reason is None and block.error is not None:
+                reason = 'error'
+            if reason is not None and self.profile is not None:
+                self.profile.skip(reason)
+            change = self._changes.get(block.rel_path) if self._changes is not None else None
+            if change is not None and block.header:
+                mark_change(block, change)
+            yield FileRecord(block.rel_path, block.entry, reason, block)
+        while skipped:
+            yield skipped.popleft()
+
+    def records(self):
+        """
+        Ленивый генератор FileRecord для всех файлов репозитория в порядке
+        дампа, включая пропущенные (с причиной). Дамп не пишется.
+        """
+        self._prepare()
+        sniffer = BinarySniffer() if self.filters['skip_binary'] else None
+        previous = None
+        for record in self._records(set(), with_hash=self.dedup, sniffer=sniffer):
+            if previous is not None:
+                previous.release()
+            previous = record
+            yield record
+        if previous is not None:
+            previous.release()
+
+    def _dump_info(self):
+        """Сведения для заголовка дампа (см. TextFormat.header)"""
+        return {
+            'repo': self.repo_path.name,
+            'filters': dict(self.filters) if self.show_filters else None,
+            'revision': self.revision,
+            'since': self.since,
+            'range': self.diff_range,
+        }
+
+    def dump(self, sink):
+        """
+        Пишет дамп в sink (путь, FileSink, StreamSink, MemorySink или
+        SocketSink) и возвращает DumpStats.
+        """
+        if isinstance(sink, (str, os.PathLike)):
+            sink = FileSink(sink)
+        output_file = sink.path if isinstance(sink, FileSink) else None
+        incremental = self.incremental
+        toc = self.toc
+        compress = self.compress
+        output_format = OUTPUT_FORMATS[self.output_format]()
+        if output_file is None and (incremental or toc or self.max_shard_size):
+            raise ValueError("Части, оглавление и инкрементальный режим требуют вывода в файл (FileSink)")
+        
+        self._prepare()
+        stats = self.stats
+        profile = self.profile
+        
+        if self.revision is not None and incremental:
+            # Манифест опирается на mtime, которого у объектов git нет
+            self._message("⚠️  Инкрементальный режим не поддерживается для ревизий и отключен")
+            incremental = False
+        
+        if self._changes is not None and incremental:
+            # Манифест описывает все дерево, а не набор изменений
+            self._message("⚠️  Инкрементальный режим не поддерживается для --since/--range и отключен")
+            incremental = False
+        
+        if self.max_shard_size and incremental:
+            # Манифест описывает смещения в одном файле
+            self._message("⚠️  Инкрементальный режим не поддерживается при разбиении на части и отключен")
+            incremental = False
+        
+        if compress and toc:
+            # Оглавление хранит смещения в несжатом дампе
+            self._message("⚠️  Оглавление не поддерживается со сжатием и отключено")
+            toc = False
+        
+        if self.output_format == 'jsonl' and toc:
+            # Содержимое в jsonl экранировано - смещения не указывают на исходные байты
+            self._message("⚠️  Оглавление не поддерживается для формата jsonl и отключено")
+            toc = False
+        
+        if compress and incremental:
+            # Блоки манифеста ссылаются на несжатые смещения
+            self._message("⚠️  Инкрементальный режим не поддерживается со сжатием и отключен")
+            incremental = False
+        
+        # Повторные лицензии: какой файл первый, решает порядок записи,
+        # а блоки из прошлого дампа копируются как есть
+        license_seen = None
+        if self.minifier is not None and 'license' in self.minifier.transforms:
+            if incremental:
+                self._message("⚠️  Сокращение повторных лицензий не поддерживается в инкрементальном режиме и отключено")
+            else:
+                license_seen = {}
+        
+        output_ids = set()
+        
+        # Инкрементальный режим: новый дамп пишется во временный файл,
+        # а неизмененные блоки копируются из предыдущего
+        manifest_settings = {'format': self.output_format}
+        if self.dedup:
+            manifest_settings['dedup'] = True
+        if self.minifier is not None:
+            manifest_settings['strip'] = sorted(self.minifier.transforms)
+        previous = None
+        previous_dump = None
+        manifest = None
+        target_file = output_file
+        if incremental:
+            manifest_file = manifest_path_for(output_file)
+            self._message("♻️  Загрузка манифеста предыдущего дампа...", detail=True)
+            previous = DumpManifest.load(manifest_file, manifest_settings, output_file)
+            if previous is not None:
+                previous_dump = open(output_file, 'rb')
+            manifest = DumpManifest(manifest_settings)
+            manifest.started_ns = int(time.time() * 1_000_000_000)
+            target_file = output_file.with_name(output_file.name + '.tmp')
+            for path in (output_file, manifest_file):
+                try:
+                    st = path.stat()
+                    output_ids.add((st.st_dev, st.st_ino))
+                except OSError:
+                    pass
+        
+        # Бинарные файлы без известного расширения определяются по содержимому;
+        # вердикты прошлого инкрементального прогона берутся из манифеста
+        sniffer = None
+        if self.filters['skip_binary']:
+            sniffer = BinarySniffer(previous.binary_keys if previous is not None else ())
+        
+        dedup = self.dedup
+        
+        def reuse_block(rel_path, entry):
+            try:
+                st = entry.stat()
+            except OSError:
+                # Файл исчез после обхода: ошибку сообщит read_file_block
+                return None
+            found = previous.lookup(rel_path, st.st_size, st.st_mtime_ns)
+            if found is None:
+                return None
+            digest, offset, length, body_span = found
+            if dedup and not body_span[1] and st.st_size:
+                # Блок-ссылка на дубликат: первый файл мог измениться
+                return None
+            return ReusedBlock(rel_path, entry, previous_dump, digest, offset, length, body_span)
+        
+        self._message("📁 Обход структуры репозитория...", detail=True)
+        
+        # Заголовок дампа (повторяется в начале каждой части)
+        info = self._dump_info()
+        header = output_format.header(info)
+        
+        def shard_header(number):
+            return output_format.header(info, number)
+        
+        dump_toc = None
+        if toc:
+            dump_toc = DumpToc()
+            # Старое оглавление не должно попасть в дамп
+            try:
+                st = toc_path_for(output_file).stat()
+                output_ids.add((st.st_dev, st.st_ino))
+            except OSError:
+                pass
+        # Дедупликация: хеш содержимого -> (путь, номер части, смещение, длина)
+        dedup_seen = {} if dedup else None
+        
+        # git status - самый медленный запрос к git: запускаем его до записи файлов
+        status = bool(self.git_status)
+        if self.git_status and self.revision is None and self.diff_range is None:
+            status = GitStatusQuery(self.repo_path)
+        
+        dump = None
+        records = None
+        completed = False
+        try:
+            # Создаем выходной файл (или первую часть)
+            if self.max_shard_size:
+                dump = ShardedDump(output_file, shard_header, self.max_shard_size, self.shard_unit, compress,
+                                   concurrent=self.jobs > 1, output_ids=output_ids)
+            elif output_file is not None:
+                dump = SingleFileDump.open(target_file, header, compress, output_ids)
+            else:
+                dump = sink.open(header, compress)
+            
+            # Обрабатываем файлы за один проход
+            reuse = reuse_block if previous is not None else None
+            # Машиночитаемые форматы хранят хеш содержимого каждого файла
+            with_hash = incremental or dedup or self.output_format != 'text'
+            records = self._records(output_ids, reuse, with_hash=with_hash, sniffer=sniffer)
+            for record in records:
+                if record.skip_reason is not None and record.skip_reason != 'error':
+                    stats.skipped += 1
+                    stats.skip_reasons[record.skip_reason] = stats.skip_reasons.get(record.skip_reason, 0) + 1
+                    if record.skip_reason == 'binary':
+                        stats.skipped_by_content += 1
+                    continue
+                
+                block = record.block
+                error = block.error
+                is_reused = isinstance(block, ReusedBlock)
+                body_span = block.body_span() if error is None else None
+                
+                # Повторное содержимое заменяется ссылкой на первый файл
+                original = None
+                if dedup_seen is not None and error is None and body_span[1]:
+                    original = dedup_seen.get(block.digest)
+                    if original is not None:
+                        duplicate = make_duplicate_block(block, original[0])
+                        saved = block.length() - duplicate.length()
+                        if saved > 0:
+                            stats.duplicates += 1
+                            stats.duplicate_bytes_saved += saved
+                            block.release()
+                            block = duplicate
+                            body_span = block.body_span()
+                        else:
+                            original = None
+                
+                if license_seen is not None and original is None and error is None and block.license is not None:
+                    self._elide_license(block, license_seen)
+                
+                block = output_format.frame(block)
+                if error is None:
+                    body_span = block.body_span()
+                
+                if self.max_total_size is not None:
+                    # Вместе с блоком (и заголовком новой части) должна поместиться короткая отметка об обрезке
+                    note = output_format.truncation_note(self.max_total_size, None)
+                    needed = dump.space_needed(block.length()) + dump.space_needed(len(note), block=False)
+                    if dump.size() + needed > self.max_total_size:
+                        # Лимит исчерпан: дальше файлы не читаем и не пишем
+                        block.release()
+                        records.close()
+                        stats.truncated = True
+                        self._write_truncation_note(dump, block.rel_path, output_format)
+                        break
+                
+                if profile is not None:
+                    with profile.stage('write'):
+                        dump_index, offset, length = dump.write_block(block)
+                else:
+                    dump_index, offset, length = dump.write_block(block)
+                if error is not None:
+                    stats.skipped += 1
+                    stats.skip_reasons['error'] = stats.skip_reasons.get('error', 0) + 1
+                    continue
+                
+                stats.processed += 1
+                if block.savings:
+                    for name, saved in block.savings.items():
+                        stats.stripped[name] = stats.stripped.get(name, 0) + saved
+                if isinstance(block.entry, GitBlobEntry) and block.entry.oid is None:
+                    stats.deleted += 1
+                if is_reused:
+                    stats.reused += 1
+                if manifest is not None:
+                    st = block.entry.stat()
+                    manifest.add(block.rel_path, st.st_size, st.st_mtime_ns, block.digest, offset, length, body_span)
+                if original is not None:
+                    if dump_toc is not None:
+                        # В оглавлении дубликат указывает на содержимое первого файла
+                        dump_toc.add(block.rel_path, *original[1:])
+                else:
+                    content = (dump_index, offset + body_span[0], body_span[1])
+                    if dump_toc is not None:
+                        dump_toc.add(block.rel_path, *content)
+                    if dedup_seen is not None and body_span[1]:
+                        dedup_seen.setdefault(block.digest, (block.rel_path,) + content)
+                
+                self._report_progress()
+            
+            # Добавляем информацию о Git (в последнюю часть)
+            with self._stage('git_info'):
+                # Для диапазона показываем его конечную ревизию
+                revision = split_diff_range(self.diff_range)[1] if self.diff_range is not None else self.revision
+                git_info = get_git_info(self.repo_path, revision, status)
+            self._write_section(dump, output_format.git_info, git_info.splitlines(True), ''.join)
+            
+            # Добавляем информацию о фильтрации
+            if self.gitignore:
+                self._write_section(dump, output_format.gitignore_rules, sorted(set(self.gitignore.patterns())))
+            completed = True
+        finally:
+            # Конвейер закрывается и при ошибке: процесс git cat-file и пул чтения не должны пережить дамп
+            if records is not None:
+                records.close()
+            try:
+                if dump is not None:
+                    with self._stage('finalize'):
+                        dump.close(completed)
+            finally:
+                if isinstance(status, GitStatusQuery):
+                    status.cancel()
+                if output_file is None:
+                    sink.close()
+                if previous_dump is not None:
+                    previous_dump.close()
+        
+        if isinstance(dump, ShardedDump):
+            stats.outputs = [shard.path for shard in dump.shards]
+            self._message(f"✓ Дамп разбит на частей: {len(dump.shards)}, индекс: {dump.index_path.name}",
+                          detail=True)
+        elif output_file is not None:
+            stats.outputs = [output_file]
+        
+        if dedup:
+            self._message(f"♻️  Дедупликация: повторных файлов {stats.duplicates}, "
+                          f"сэкономлено {stats.duplicate_bytes_saved / 1024:.1f} KB")
+        
+        if stats.stripped:
+            summary = ', '.join(f"{STRIP_LABELS[name]} {stats.stripped[name] / 1024:.1f} KB"
+                                for name in STRIP_TRANSFORMS if stats.stripped.get(name))
+            total = sum(stats.stripped.values())
+            self._message(f"✂️  Сокращение вывода: {summary or 'без изменений'} (всего {total / 1024:.1f} KB)")
+        
+        if self.gitignore:
+            self._message(f"✓ Правил .gitignore загружено по ходу обхода: {len(self.gitignore)}", detail=True)
+        
+        if stats.deleted:
+            self._message(f"✓ Отмечено удаленных файлов: {stats.deleted}", detail=True)
+        
+        if stats.skipped_by_content:
+            self._message(f"✓ Пропущено бинарных файлов по содержимому: {stats.skipped_by_content}",
+                          detail=True)
+        
+        if stats.skip_reasons:
+            reasons = sorted(stats.skip_reasons.items(), key=lambda item: (-item[1], item[0]))
+            summary = ', '.join(f"{SKIP_REASON_LABELS.get(reason, reason)}: {count}" for reason, count in reasons)
+            self._message(f"✓ Причины пропуска: {summary}", detail=True)
+        
+        if incremental:
+            if sniffer is not None:
+                manifest.binary_keys = sniffer.binary_keys()
+            os.replace(target_file, output_file)
+            with self._stage('finalize'):
+                manifest.save(manifest_path_for(output_file), output_file)
+            self._message(f"♻️  Инкрементальный режим: переиспользовано {stats.reused}, "
+                          f"прочитано {stats.processed - stats.reused} файлов")
+        
+        if dump_toc is not None:
+            with self._stage('finalize'):
+                dump_toc.save(toc_path_for(output_file), stats.outputs)
+            self._message(f"✓ Оглавление: {toc_path_for(output_file).name}", detail=True)
+        
+        if profile is not None:
+            profile.count('dirs_listed', self._progress.dirs_done)
+            if isinstance(dump, ShardedDump):
+                profile.count('bytes_written', sum(shard.size for shard in dump.shards))
+            else:
+                profile.count('bytes_written', dump.out.offset)
+            if compress and stats.outputs:
+                profile.count('bytes_written_compressed', sum(os.path.getsize(path) for path in stats.outputs))
+        
+        return stats
+
+    def _elide_license(self, block, seen):
+        """Повторный лицензионный заголовок заменяется строкой со ссылкой на первый файл с ним"""
+        key, start, end, prefix, suffix = block.license
+        first = seen.setdefault(key, block.rel_path)
+        if first == block.rel_path:
+            return
+        marker = _encode(f"{prefix}[ЛИЦЕНЗИЯ: как в {first.replace('/', os.sep)}]{suffix}\n")
+        saved = end - start - len(marker)
+        if saved > 0:
+            block.body = block.body[:start] + marker + block.body[end:]
+            self.stats.stripped['license'] = self.stats.stripped.get('license', 0) + saved
+
+    def _write_truncation_note(self, dump, rel_path, output_format):
+        """
+        Отметка в дампе о том, что он обрезан по лимиту общего размера.
+        Если полная отметка не помещается, пишется короткая (место под
+        нее оставлено при отборе файлов).
+        """
+        limit = self.max_total_size
+        for path in (rel_path, None):
+            note = output_format.truncation_note(limit, path)
+            if dump.size() + dump.space_needed(len(note), block=False) <= limit:
+                dump.write(note)
+                break
+        self._message(f"⚠️  Достигнут лимит размера дампа ({self.max_total_size} байт): "
+                      f"дамп обрезан перед файлом {rel_path}")
+
+    def _write_section(self, dump, render, items, join=list):
+        """
+        Итоговый раздел дампа render(join(items)). С лимитом размера
+        (max_total_size) пишется столько первых элементов items (строк
+        или правил), сколько помещается; не помещается и пустой - раздел
+        пропускается.
+        """
+        data = render(join(items))
+        limit = self.max_total_size
+        if limit is not None:
+            room = limit - dump.size()
+            
+            def fits(count):
+                return dump.space_needed(len(render(join(items[:count]))), block=False) <= room
+            
+            if dump.space_needed(len(data), block=False) > room:
+                if not fits(0):
+                    self._message("⚠️  Итоговый раздел дампа не помещается в лимит размера и пропущен")
+                    return
+                # Длина раздела растет с числом элементов: ищем наибольшее, что помещается
+                low, high = 0, len(items) - 1
+                while low < high:
+                    middle = (low + high + 1) // 2
+                    if fits(middle):
+                        low = middle
+                    else:
+                        high = middle - 1
+                data = render(join(items[:low]))
+                self._message(f"⚠️  Итоговый раздел дампа сокращен до лимита размера: {low} из {len(items)} строк")
+        dump.write(data)
+
+    def _report_progress(self):
+        processed = self.stats.processed
+        if not self.verbose and processed % 50 == 0:
+            self._message(f"  Обработано файлов: {processed}")
+        elif self.verbose and processed % 10 == 0:
+            # Общее число файлов оценивается по ходу обхода
+            total_files = max(self._progress.estimate_total(), processed)
+            percent = (processed / total_files) * 100 if total_files > 0 else 0
+            self._message(f"  Прогресс: {processed}/~{total_files} файлов (~{percent:.1f}%)")
+
+def create_repo_dump(repo_path, output_file, filters, quick_mode=False, jobs=1, walk_jobs=1, incremental=False,
+                     source='walk', revision=None, since=None, diff_range=None, compress=None, max_shard_size=None, shard_unit='bytes',
+                     toc=False, dedup=False, strip=None, output_format='text', max_total_size=None, git_status=True,
+                     stats_file=None):
+    """
+    Создать дамп репозитория (обертка над Dumper для командной строки).
+    stats_file - сохранить отчет DumpProfile по этапам в JSON.
+    Возвращает (обработано, пропущено, пропущено по .gitignore).
+    """
+    if quick_mode:
+        print(f"\n{'='*60}")
+        print(f"ОБРАБОТКА: {repo_path.name}")
+        print(f"{'='*60}")
+    else:
+        print(f"\n{'='*60}")
+        print("НАЧИНАЕМ ОБРАБОТКУ...")
+        print(f"{'='*60}")
+    
+    dumper = Dumper(repo_path, filters, jobs=jobs, walk_jobs=walk_jobs, source=source, revision=revision, since=since,
+                    diff_range=diff_range, compress=compress,
+                    max_shard_size=max_shard_size, shard_unit=shard_unit, toc=toc,
+                    incremental=incremental, dedup=dedup, strip=strip, output_format=output_format,
+                    max_total_size=max_total_size,
+                    show_filters=not quick_mode, git_status=git_status,
+                    profile=DumpProfile() if stats_file else None, log=print, verbose=not quick_mode)
+    stats = dumper.dump(FileSink(output_file))
+    if stats_file:
+        dumper.profile.save(stats_file, stats)
+        print(f"✓ Отчет по этапам: {stats_file}")
+    return stats.processed, stats.skipped, stats.skipped_by_gitignore
+
+def expand_batch_paths(items, base=None):
+    """
+    Список репозиториев для пакетного режима. Элемент - путь, шаблон
+    glob (./repos/*) или файл-список с путями/шаблонами по одному в
+    строке (# - комментарий; относительные пути - от файла-списка).
+    Возвращает уникальные абсолютные пути в порядке перечисления.
+    """
+    paths = []
+    for item in items:
+        candidate = Path(os.path.expanduser(item))
+        if base is not None and not candidate.is_absolute():
+            candidate = base / candidate
+        if candidate.is_file():
+            with open(candidate, 'r', encoding='utf-8') as f:
+                lines = [line.strip() for line in f]
+            paths.extend(expand_batch_paths([line for line in lines if line and not line.startswith('#')],
+                                            candidate.parent))
+        elif _has_glob(str(candidate)):
+            paths.extend(Path(p) for p in sorted(glob.glob(str(candidate))) if os.path.isdir(p))
+        else:
+            paths.append(candidate)
+    
+    result = []
+    seen = set()
+    for path in paths:
+        path = path.resolve()
+        if path not in seen:
+            seen.add(path)
+            result.append(path)
+    return result
+
+def batch_output_files(repo_paths, output_dir, suffix='', extension='.txt'):
+    """Имена дампов <репо>_dump.txt (или другое расширение формата); одноименные репозитории получают номер"""
+    used = {}
+    outputs = []
+    for repo_path in repo_paths:
+        name = repo_path.name
+        used[name] = used.get(name, 0) + 1
+        if used[name] > 1:
+            name = f"{name}_{used[name]}"
+        outputs.append(output_dir / f"{name}_dump{extension}{suffix}")
+    return outputs
+
+class BatchResult:
+    """Итог дампа одного репозитория в пакетном режиме"""
+
+    __slots__ = ('repo_path', 'output_file', 'processed', 'skipped', 'size', 'duration', 'error')
+
+    def __init__(self, repo_path, output_file, processed=0, skipped=0, size=0, duration=0.0, error=None):
+        self.repo_path = repo_path
+        self.output_file = output_file
+        self.processed = processed
+        self.skipped = skipped
+        self.size = size
+        self.duration = duration
+        self.error = error
+
+# Семафор чтения файлов, общий для процессов пакетного режима
+_batch_io_gate = None
+
+def _init_batch_worker(io_gate):
+    global _batch_io_gate
+    _batch_io_gate = io_gate
+
+def _batch_dump(repo_path, output_file, options):
+    """Дамп одного репозитория в процессе пула"""
+    started = time.perf_counter()
+    result = BatchResult(repo_path, output_file)
+    try:
+        if not repo_path.is_dir():
+            raise ValueError("директория не найдена")
+        stats = Dumper(repo_path, io_gate=_batch_io_gate, **options).dump(FileSink(output_file))
+        result.processed = stats.processed
+        result.skipped = stats.skipped
+        result.size = sum(os.path.getsize(path) for path in stats.outputs)
+    except Exception as e:
+        result.error = str(e) or e.__class__.__name__
+    result.duration = time.perf_counter() - started
+    return result
+
+def run_batch(repo_paths, output_files, options, workers=None, io_limit=None):
+    """
+    Дампы нескольких репозиториев в пуле процессов.
+    options - аргументы Dumper (кроме repo_path); workers - число
+    процессов (по умолчанию число ядер); io_limit - сколько файлов
+    все процессы вместе читают одновременно.
+    Возвращает BatchResult в порядке repo_paths.
+    """
+    workers = max(1, min(workers or os.cpu_count() or 1, len(repo_paths) or 1))
+    io_gate = multiprocessing.BoundedSemaphore(io_limit) if io_limit else None
+    results = [None] * len(repo_paths)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_batch_worker,
+                             initargs=(io_gate,)) as pool:
+        futures = {pool.submit(_batch_dump, repo_path, output_file, options): index
+                   for index, (repo_path, output_file) in enumerate(zip(repo_paths, output_files))}
+        done = 0
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                # Процесс пула мог упасть целиком
+                result = BatchResult(repo_paths[index], output_files[index], error=str(e) or e.__class__.__name__)
+            results[index] = result
+            done += 1
+            mark = '✓' if result.error is None else '❌'
+            print(f"  [{done}/{len(repo_paths)}] {mark} {result.repo_path.name} ({result.duration:.1f} с)")
+    return results
+
+def print_batch_summary(results):
+    """Таблица итогов пакетного режима"""
+    rows = []
+    for result in results:
+        status = 'OK' if result.error is None else f"ОШИБКА: {result.error}"
+        rows.append((result.repo_path.name, str(result.processed), f"{result.size / 1024:.1f} KB",
+                     f"{result.duration:.2f}", status))
+    headers = ('Репозиторий', 'Файлов', 'Размер', 'Время, с', 'Статус')
+    widths = [max(len(row[i]) for row in rows + [headers]) for i in range(4)]
+    
+    def line(row):
+        cells = [row[0].ljust(widths[0])] + [row[i].rjust(widths[i]) for i in range(1, 4)] + [row[4]]
+        return '  '.join(cells)
+    
+    print(line(headers))
+    print('-' * (sum(widths) + 8 + len(headers[4])))
+    for row in rows:
+        print(line(row))
+    
+    failed = sum(1 for result in results if result.error is not None)
+    total_files = sum(result.processed for result in results)
+    total_size = sum(result.size for result in results)
+    total_time = sum(result.duration for result in results)
+    print('-' * (sum(widths) + 8 + len(headers[4])))
+    print(f"Всего: {len(results)} репозиториев, {total_files} файлов, "
+          f"{total_size / (1024 * 1024):.2f} MB, {total_time:.1f} с работы процессов, ошибок: {failed}")
+
+# Типы объектов в pack-файлах git
+_PACK_OBJECT_TYPES = {1: 'commit', 2: 'tree', 3: 'blob', 4: 'tag'}
+_OFS_DELTA = 6
+_REF_DELTA = 7
+
+def find_git_dir(path):
+    """
+    Ищет каталог .git для path, поднимаясь к корню, как это делает git.
+    Возвращает (git_dir, common_dir) или None. Поддерживает файл .git
+    со ссылкой 'gitdir: ...' (worktree, подмодули); common_dir - общий
+    каталог ссылок и объектов для worktree.
+    """
+    path = Path(path).resolve()
+    for directory in [path] + list(path.parents):
+        dot_git = directory / '.git'
+        git_dir = None
+        if dot_git.is_dir():
+            git_dir = dot_git
+        elif dot_git.is_file():
+            try:
+                content = dot_git.read_text(encoding='utf-8').strip()
+            except OSError:
+                return None
+            if not content.startswith('gitdir:'):
+                return None
+            git_dir = (directory / content[len('gitdir:'):].strip()).resolve()
+        if git_dir is None:
+            continue
+        common_dir = git_dir
+        try:
+            common = (git_dir / 'commondir').read_text(encoding='utf-8').strip()
+            common_dir = (git_dir / common).resolve()
+        except OSError:
+            pass
+        return git_dir, common_dir
+    return None
+
+def _apply_git_delta(base, delta):
+    """Применяет delta из pack-файла к базовому объекту"""
+    pos = 0
+    # Размеры исходного и результирующего объектов (varint)
+    for _ in range(2):
+        while delta[pos] & 0x80:
+            pos += 1
+        pos += 1
+    out = bytearray()
+    size = len(delta)
+    while pos < size:
+        op = delta[pos]
+        pos += 1
+        if op & 0x80:
+            offset = length = 0
+            for i in range(4):
+                if op & (1 << i):
+                    offset |= delta[pos] << (8 * i)
+                    pos += 1
+            for i in range(3):
+                if op & (0x10 << i):
+                    length |= delta[pos] << (8 * i)
+                    pos += 1
+            out += base[offset:offset + (length or 0x10000)]
+        elif op:
+            out += delta[pos:pos + op]
+            pos += op
+        else:
+            raise ValueError("Неверная инструкция delta")
+    return bytes(out)
+
+class GitMetadata:
+    """
+    HEAD, ветка и последний коммит прямо из каталога .git, без запуска
+    git: ссылки (loose и packed-refs) и объекты (loose и pack-файлы,
+    включая delta). Если что-то прочитать не удалось, методы бросают
+    исключение, а get_git_info использует git как запасной вариант.
+    """
+
+    def __init__(self, git_dir, common_dir=None):
+        self.git_dir = Path(git_dir)
+        self.common_dir = Path(common_dir) if common_dir is not None else self.git_dir
+        self._objects_dir = self.common_dir / 'objects'
+        self._packs = None
+        self._packed_refs = None
+
+    @classmethod
+    def for_path(cls, path):
+        """GitMetadata для репозитория, содержащего path, или None"""
+        found = find_git_dir(path)
+        return cls(*found) if found is not None else None
+
+    def head(self):
+        """(имя ветки или None при detached HEAD, хеш коммита или None для пустой ветки)"""
+        content = (self.git_dir / 'HEAD').read_text(encoding='utf-8').strip()
+        if content.startswith('ref:'):
+            ref = content[4:].strip()
+            branch = ref[len('refs/heads/'):] if ref.startswith('refs/heads/') else ref
+            return branch, self.resolve_ref(ref)
+        return None, content
+
+    def resolve_ref(self, ref, depth=0):
+        """Хеш, на который указывает ссылка (loose или из packed-refs), или None"""
+        for base in (self.git_dir, self.common_dir):
+            try:
+                content = (base / ref).read_text(encoding='utf-8').strip()
+            except (OSError, UnicodeDecodeError):
+                continue
+            if content.startswith('ref:') and depth < 5:
+                return self.resolve_ref(content[4:].strip(), depth + 1)
+            return content
+        return self._read_packed_refs().get(ref)
+
+    def _read_packed_refs(self):
+        if self._packed_refs is None:
+            refs = {}
+            try:
+                with open(self.common_dir / 'packed-refs', 'r', encoding='utf-8') as f:
+                    for line in f:
+                        if line.startswith(('#', '^')):
+                            continue
+                        parts = line.split()
+                        if len(parts) == 2:
+                            refs[parts[1]] = parts[0]
+            except OSError:
+                pass
+            self._packed_refs = refs
+        return self._packed_refs
+
+    def read_object(self, oid):
+        """(тип, содержимое) объекта по хешу"""
+        path = self._objects_dir / oid[:2] / oid[2:]
+        try:
+            with open(path, 'rb') as f:
+                data = zlib.decompress(f.read())
+        except FileNotFoundError:
+            return self._read_packed_object(oid)
+        header, _, body = data.partition(b'\0')
+        return header.split(b' ', 1)[0].decode('ascii'), body
+
+    def _load_packs(self):
+        """Индексы pack-файлов: список (idx, pack, число объектов); файлы отображаются в память"""
+        if self._packs is None:
+            packs = []
+            pack_dir = self._objects_dir / 'pack'
+            try:
+                names = sorted(pack_dir.glob('pack-*.idx'))
+            except OSError:
+                names = []
+            for idx_path in names:
+                pack_path = idx_path.with_suffix('.pack')
+                try:
+                    with open(idx_path, 'rb') as f:
+                        idx = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                    with open(pack_path, 'rb') as f:
+                        pack = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                except (OSError, ValueError):
+                    continue
+                if idx[:8] != b'\xfftOc\x00\x00\x00\x02':
+                    # Поддерживается только индекс версии 2
+                    idx.close()
+                    pack.close()
+                    continue
+                count = struct.unpack_from('>I', idx, 8 + 255 * 4)[0]
+                packs.append((idx, pack, count))
+            self._packs = packs
+        return self._packs
+
+    def object_count(self):
+        """Приблизительное число объектов (по pack-файлам, как в git)"""
+        return sum(count for _, _, count in self._load_packs())
+
+    def _find_in_pack(self, idx, count, oid_bytes):
+        """Смещение объекта в pack-файле или None (бинарный поиск по индексу v2)"""
+        hash_size = len(oid_bytes)
+        first = oid_bytes[0]
+        lo = struct.unpack_from('>I', idx, 8 + (first - 1) * 4)[0] if first else 0
+        hi = struct.unpack_from('>I', idx, 8 + first * 4)[0]
+        names = 8 + 256 * 4
+        while lo < hi:
+            mid = (lo + hi) // 2
+            name = idx[names + mid * hash_size:names + (mid + 1) * hash_size]
+            if name < oid_bytes:
+                lo = mid + 1
+            elif name > oid_bytes:
+                hi = mid
+            else:
+                offsets = names + count * hash_size + count * 4
+                offset = struct.unpack_from('>I', idx, offsets + mid * 4)[0]
+                if offset & 0x80000000:
+                    large = offsets + count * 4 + (offset & 0x7fffffff) * 8
+                    offset = struct.unpack_from('>Q', idx, large)[0]
+                return offset
+        return None
+
+    def _read_packed_object(self, oid):
+        oid_bytes = bytes.fromhex(oid)
+        for idx, pack, count in self._load_packs():
+            offset = self._find_in_pack(idx, count, oid_bytes)
+            if offset is not None:
+                return self._read_pack_entry(pack, offset, len(oid_bytes))
+        raise KeyError(f"Объект {oid} не найден")
+
+    @staticmethod
+    def _inflate(pack, pos):
+        """Распаковывает zlib-поток из pack-файла кусками, не копируя остаток файла"""
+        decompressor = zlib.decompressobj()
+        chunks = []
+        while not decompressor.eof:
+            piece = pack[pos:pos + 65536]
+            if not piece:
+                raise ValueError("Обрезанный pack-файл")
+            pos += len(piece)
+            chunks.append(decompressor.decompress(piece))
+        return b''.join(chunks)
+
+    def _read_pack_entry(self, pack, offset, hash_size, depth=0):
+        if depth > 50:
+            raise ValueError("Слишком длинная цепочка delta")
+        byte = pack[offset]
+        pos = offset + 1
+        kind = (byte >> 4) & 7
+        while byte & 0x80:
+            byte = pack[pos]
+            pos += 1
+        if kind == _OFS_DELTA:
+            byte = pack[pos]
+            pos += 1
+            distance = byte & 0x7f
+            while byte & 0x80:
+                byte = pack[pos]
+                pos += 1
+                distance = ((distance + 1) << 7) | (byte & 0x7f)
+            base_type, base = self._read_pack_entry(pack, offset - distance, hash_size, depth + 1)
+            return base_type, _apply_git_delta(base, self._inflate(pack, pos))
+        if kind == _REF_DELTA:
+            base_type, base = self.read_object(pack[pos:pos + hash_size].hex())
+            return base_type, _apply_git_delta(base, self._inflate(pack, pos + hash_size))
+        if kind not in _PACK_OBJECT_TYPES:
+            raise ValueError(f"Неизвестный тип объекта в pack-файле: {kind}")
+        return _PACK_OBJECT_TYPES[kind], self._inflate(pack, pos)
+
+    def commit_subject(self, oid):
+        """Заголовок коммита, как в git log --oneline (первый абзац одной строкой)"""
+        kind, data = self.read_object(oid)
+        if kind != 'commit':
+            raise ValueError(f"{oid} - не коммит")
+        message = data.partition(b'\n\n')[2].decode('utf-8', errors='replace')
+        lines = []
+        for line in message.lstrip('\n').split('\n'):
+            if not line.strip():
+                break
+            lines.append(line.strip())
+        return ' '.join(lines)
+
+    def abbrev_length(self):
+        """Длина сокращенного хеша, как core.abbrev=auto в git"""
+        count = self.object_count()
+        length = (count.bit_length() + 1) // 2 if count else 0
+        return max(7, length)
+
+    def close(self):
+        for idx, pack, _ in self._packs or ():
+            idx.close()
+            pack.close()
+        self._packs = []
+
+class GitStatusQuery:
+    """
+    git status --short, запущенный в фоне: статус рабочей копии считается
+    одновременно с записью дампа, а результат забирается в конце.
+    """
+
+    def __init__(self, repo_path):
+        try:
+            self._process = subprocess.Popen(['git', 'status', '--short'], cwd=repo_path,
+                                             stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        except OSError:
+            self._process = None
+
+    def result(self):
+        """Вывод git status (пустая строка, если git недоступен)"""
+        if self._process is None:
+            return ''
+        output, _ = self._process.communicate()
+        return output
+
+    def cancel(self):
+        if self._process is not None and self._process.poll() is None:
+            self._process.kill()
+            self._process.communicate()
+
+def _git_status_output(repo_path):
+    result = subprocess.run(['git', 'status', '--short'], cwd=repo_path, capture_output=True, text=True)
+    return result.stdout
+
+def get_git_info(repo_path, revision=None, status=True):
+    """
+    Получить информацию о Git репозитории.
+    Ветка и последний коммит читаются прямо из .git (GitMetadata);
+    git запускается, только если прочитать их не удалось.
+    status - True (выполнить git status), False (не проверять рабочую
+    копию) или GitStatusQuery, запущенный заранее.
+    """
+    info = []
+    
+    if revision is not None:
+        # Для ревизии показываем ее коммит; ветка и статус рабочей копии не нужны
+        result = subprocess.run(['git', 'log', '--oneline', '-1', revision, '--'],
+                                cwd=repo_path, capture_output=True, text=True)
+        info.append(f"Ревизия: {revision}")
+        info.append(f"Коммит ревизии: {result.stdout.strip() or 'не определен'}")
+        return '\n'.join(info)
+    
+    try:
+        metadata = GitMetadata.for_path(repo_path)
+        current_branch = last_commit = None
+        if metadata is not None:
+            try:
+                current_branch, head = metadata.head()
+                if head:
+                    last_commit = f"{head[:metadata.abbrev_length()]} {metadata.commit_subject(head)}"
+                else:
+                    last_commit = ''
+            except (OSError, ValueError, KeyError, IndexError, zlib.error, struct.error):
+                # Нестандартное хранилище (alternates, sha256, ...) - спросим git
+                current_branch = last_commit = None
+            finally:
+                metadata.close()
+        else:
+            # Не git-репозиторий: ветки и коммитов нет
+            current_branch, last_commit = '', ''
+        
+        # Текущая ветка
+        if current_branch is None and last_commit is None:
+            result = subprocess.run(['git', 'branch', '--show-current'],
+                                    cwd=repo_path, capture_output=True, text=True)
+            current_branch = result.stdout.strip()
+        info.append(f"Текущая ветка: {current_branch if current_branch else 'не определена'}")
+        
+        # Последний коммит
+        if last_commit is None:
+            result = subprocess.run(['git', 'log', '--oneline', '-1'],
+                                    cwd=repo_path, capture_output=True, text=True)
+            last_commit = result.stdout.strip()
+        if last_commit:
+            info.append(f"Последний коммит: {last_commit}")
+        else:
+            info.append("История коммитов недоступна")
+        
+        # Статус репозитория
+        if status is False:
+            info.append("\nСтатус рабочей копии не проверялся")
+        else:
+            output = status.result() if isinstance(status, GitStatusQuery) else _git_status_output(repo_path)
+            if output.strip():
+                info.append("\nНесохраненные изменения:")
+                info.append(output.strip())
+            else:
+                info.append("\nНет несохраненных изменений")
+        
+    except Exception as e:
+        info.append(f"\nНе удалось получить информацию о Git: {e}")
+    
+    return '\n'.join(info)
+
+# Режим наблюдения: пауза без событий перед пересборкой и интервал опроса
+WATCH_DEBOUNCE = 0.5
+WATCH_POLL_INTERVAL = 1.0
+
+def is_output_path(path, output_file):
+    """Относится ли путь к файлам дампа (сам дамп, .tmp, манифест, оглавление, части)"""
+    if os.path.dirname(path) != str(output_file.parent):
+        return False
+    name = os.path.basename(path)
+    base, _ = _split_compression_suffix(output_file.name)
+    stem = Path(base).stem
+    return name.startswith(output_file.name) or name.startswith(f"{stem}.part") or name == f"{stem}.index.json"
+
+class WatchFilter:
+    """
+    Те же правила, что и у дампа (.gitignore, node_modules, скрытые и т.д.),
+    для путей из событий файловой системы. Выходные файлы тоже игнорируются,
+    иначе каждая пересборка запускала бы следующую.
+    """
+
+    def __init__(self, repo_path, filters, output_file=None):
+        self.repo_path = Path(repo_path)
+        self.filters = filters
+        self.output_file = output_file
+        self.gitignore = []
+        self.reload()
+
+    def reload(self):
+        """Перечитать правила .gitignore (после изменения одного из них)"""
+        if self.filters.get('use_gitignore', True):
+            self.gitignore = GitignoreMatcher.from_repo(self.repo_path)
+        # Решения по директориям зависят от правил, поэтому конвейер создается заново
+        self._pipeline = FilterPipeline(self.filters, self.gitignore)
+
+    def ignored(self, rel_path, entry=None):
+        if entry is None:
+            entry = PathEntry(os.path.join(str(self.repo_path), rel_path))
+        if self.output_file is not None and is_output_path(entry.path, self.output_file):
+            return True
+        return self._pipeline.reason(entry, rel_path, parents_checked=False) is not None
+
+class PollingWatcher:
+    """
+    Наблюдение опросом: обход репозитория с теми же фильтрами (игнорируемые
+    директории не обходятся) и сравнение размеров и mtime файлов.
+    """
+
+    def __init__(self, repo_path, watch_filter, interval=WATCH_POLL_INTERVAL):
+        self.repo_path = repo_path
+        self.watch_filter = watch_filter
+        self.interval = interval
+        self._snapshot = self._scan()
+
+    def _scan(self):
+        ignored = self.watch_filter.ignored
+        snapshot = {}
+        for rel_path, entry in walk_repo(self.repo_path, lambda entry, rel_path: ignored(rel_path, entry)):
+            if ignored(rel_path, entry):
+                continue
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            snapshot[rel_path] = (st.st_size, st.st_mtime_ns)
+        return snapshot
+
+    def wait(self, timeout=None):
+        """Множество измененных путей; пустое, если за timeout секунд изменений не было"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            delay = self.interval if deadline is None else min(self.interval, max(0.0, deadline - time.monotonic()))
+            time.sleep(delay)
+            snapshot = self._scan()
+            previous = self._snapshot
+            self._snapshot = snapshot
+            changed = {path for path, state in snapshot.items() if previous.get(path) != state}
+            changed.update(path for path in previous if path not in snapshot)
+            if changed or (deadline is not None and time.monotonic() >= deadline):
+                return changed
+
+    def close(self):
+        pass
+
+class InotifyWatcher:
+    """
+    Наблюдение через inotify (Linux, libc через ctypes). Подписка ставится
+    только на директории, которые не отсекаются фильтрами, поэтому изменения
+    в node_modules, venv и игнорируемых папках ничего не стоят.
+    При переполнении очереди событий wait возвращает {''} - изменилось все.
+    """
+
+    IN_MODIFY = 0x2
+    IN_ATTRIB = 0x4
+    IN_CLOSE_WRITE = 0x8
+    IN_MOVED_FROM = 0x40
+    IN_MOVED_TO = 0x80
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_Q_OVERFLOW = 0x4000
+    IN_IGNORED = 0x8000
+    IN_ISDIR = 0x40000000
+    IN_CLOEXEC = 0o2000000
+    MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    _EVENT = struct.Struct('iIII')
+
+    def __init__(self, repo_path, watch_filter):
+        self._libc = _load_libc()
+        if self._libc is None or not hasattr(self._libc, 'inotify_init1'):
+            raise OSError("inotify недоступен")
+        self.repo_path = str(repo_path)
+        self.watch_filter = watch_filter
+        self._fd = self._libc.inotify_init1(self.IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+        self._dirs = {}
+        self._add_tree('')
+
+    def _add_tree(self, rel_dir):
+        """Подписка на директорию и все ее неигнорируемые поддиректории; возвращает найденные файлы"""
+        files = []
+        ignored = self.watch_filter.ignored
+        stack = [rel_dir]
+        while stack:
+            rel = stack.pop()
+            path = os.path.join(self.repo_path, rel) if rel else self.repo_path
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), self.MASK)
+            if wd < 0:
+                continue
+            self._dirs[wd] = rel
+            try:
+                with os.scandir(path) as it:
+                    entries = list(it)
+            except OSError:
+                continue
+            for entry in entries:
+                child = f"{rel}/{entry.name}" if rel else entry.name
+                if ignored(child, entry):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(child)
+                else:
+                    files.append(child)
+        return files
+
+    def _read_events(self):
+        changed = set()
+        data = os.read(self._fd, 64 * 1024)
+        pos = 0
+        while pos < len(data):
+            wd, mask, _, length = self._EVENT.unpack_from(data, pos)
+            pos += self._EVENT.size
+            name = os.fsdecode(data[pos:pos + length].rstrip(b'\0'))
+            pos += length
+            if mask & self.IN_Q_OVERFLOW:
+                changed.add('')
+                continue
+            if mask & self.IN_IGNORED:
+                self._dirs.pop(wd, None)
+                continue
+            rel_dir = self._dirs.get(wd)
+            if rel_dir is None or not name:
+                continue
+            rel_path = f"{rel_dir}/{name}" if rel_dir else name
+            if self.watch_filter.ignored(rel_path):
+                continue
+            if mask & self.IN_ISDIR:
+                if mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                    # Файлы могли появиться до подписки на новую директорию
+                    changed.update(self._add_tree(rel_path))
+                changed.add(rel_path)
+                continue
+            changed.add(rel_path)
+        return changed
+
+    def wait(self, timeout=None):
+        """Множество измененных путей; пустое, если за timeout секунд событий не было"""
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return set()
+        return self._read_events()
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+def _load_libc():
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        return ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+    except OSError:
+        return None
+
+def open_watcher(repo_path, watch_filter, poll=False):
+    """InotifyWatcher на Linux, иначе (или при poll=True) PollingWatcher"""
+    if not poll:
+        try:
+            return InotifyWatcher(repo_path, watch_filter)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(repo_path, watch_filter)
+
+def watch_repo(dumper, output_file, poll=False, debounce=WATCH_DEBOUNCE):
+    """
+    Режим наблюдения: ждет изменений в репозитории и пересобирает дамп
+    через dumper (Dumper, обычно с incremental=True - неизмененные блоки
+    копируются из прошлого дампа). Пачка событий, идущих чаще debounce
+    секунд, дает одну пересборку. Работает до Ctrl+C.
+    """
+    watch_filter = WatchFilter(dumper.repo_path, dumper.filters, output_file)
+    watcher = open_watcher(dumper.repo_path, watch_filter, poll)
+    kind = 'inotify' if isinstance(watcher, InotifyWatcher) else 'опрос'
+    print(f"\n👀 Наблюдение за изменениями ({kind}), Ctrl+C - выход")
+    try:
+        while True:
+            changed = watcher.wait()
+            while True:
+                more = watcher.wait(debounce)
+                if not more:
+                    break
+                changed |= more
+            if not changed:
+                continue
+            if any(path.rpartition('/')[2] == '.gitignore' for path in changed) or '' in changed:
+                # Правила изменились - подписки и фильтры строим заново
+                watch_filter.reload()
+                watcher.close()
+                watcher = open_watcher(dumper.repo_path, watch_filter, poll)
+            
+            started = time.perf_counter()
+            try:
+                stats = dumper.dump(FileSink(output_file))
+            except Exception as e:
+                print(f"❌ [{time.strftime('%H:%M:%S')}] Ошибка пересборки: {e}")
+                continue
+            elapsed = time.perf_counter() - started
+            count = 'все' if '' in changed else len(changed)
+            reused = f", переиспользовано {stats.reused}" if stats.reused else ''
+            print(f"🔄 [{time.strftime('%H:%M:%S')}] Изменений: {count}, дамп обновлен за {elapsed:.2f} с "
+                  f"(файлов: {stats.processed}{reused})")
+    except KeyboardInterrupt:
+        print("\n👋 Наблюдение остановлено")
+    finally:
+        watcher.close()
+
+def diff_revisions(args):
+    """Ревизии из --since/--range для проверки до начала работы"""
+    if args.diff_range:
+        return split_diff_range(args.diff_range) or ()
+    return (args.since,) if args.since else ()
+
+def main_batch(args):
+    """Пакетный режим: дампы многих репозиториев в пуле процессов"""
+    print(f"\n{'='*60}")
+    print("ПАКЕТНЫЙ РЕЖИМ")
+    print(f"{'='*60}")
+    
+    repo_paths = expand_batch_paths(args.batch)
+    if not repo_paths:
+        print("❌ Ошибка: Не найдено ни одного репозитория")
+        sys.exit(1)
+    
+    output_dir = Path(args.output_dir).resolve() if args.output_dir else Path.cwd()
+    output_dir.mkdir(parents=True, exist_ok=True)
+    suffix = COMPRESSION_SUFFIXES[args.compress] if args.compress else ''
+    output_files = batch_output_files(repo_paths, output_dir, suffix, FORMAT_EXTENSIONS[args.output_format])
+    
+    options = {
+        'jobs': max(1, args.jobs),
+        'walk_jobs': max(1, args.walk_jobs),
+        'source': args.source,
+        'revision': args.rev,
+        'since': args.since,
+        'diff_range': args.diff_range,
+        'compress': args.compress,
+        'max_shard_size': args.max_shard_size,
+        'shard_unit': args.shard_unit,
+        'toc': args.toc,
+        'incremental': args.incremental,
+        'dedup': args.dedup,
+        'strip': args.strip,
+        'output_format': args.output_format,
+        'max_total_size': args.max_total_size,
+        'git_status': args.git_status,
+    }
+    print(f"Репозиториев: {len(repo_paths)}, выходная директория: {output_dir}")
+    started = time.perf_counter()
+    results = run_batch(repo_paths, output_files, options, args.workers, args.io_limit)
+    elapsed = time.perf_counter() - started
+    
+    print(f"\n{'='*60}")
+    print_batch_summary(results)
+    print(f"Общее время: {elapsed:.1f} с")
+    if any(result.error is not None for result in results):
+        sys.exit(1)
+
+def main():
+    """Основная функция"""
+    args = parse_arguments()
+    
+    if args.batch:
+        if args.compress == 'zstd':
+            try:
+                import zstandard  # noqa: F401
+            except ImportError:
+                print("❌ Ошибка: Для сжатия zstd установите модуль zstandard: pip install zstandard")
+                sys.exit(1)
+        try:
+            main_batch(args)
+        except KeyboardInterrupt:
+            print("\n\n❌ Операция прервана пользователем")
+            sys.exit(1)
+        return
+    
+    try:
+        # Определяем режим работы
+        quick_mode = args.quick
+        
+        if quick_mode:
+            # БЫСТРЫЙ РЕЖИМ (-q)
+            repo_path = get_repo_path_quick(args.path)
+        else:
+            # ИНТЕРАКТИВНЫЙ РЕЖИМ
+            if args.path:
+                print("⚠️  Предупреждение: Путь игнорируется в интерактивном режиме")
+                print("   Используйте ключ -q для быстрого режима с путем")
+            
+            repo_path = get_repo_path_interactive()
+        
+        # Проверяем репозиторий
+        if not validate_repository(repo_path, quick_mode):
+            print("❌ Прерывание работы...")
+            sys.exit(1)
+        
+        # Проверяем ревизию до начала работы
+        if args.rev and resolve_revision(repo_path, args.rev) is None:
+            print(f"❌ Ошибка: Ревизия '{args.rev}' не найдена в репозитории")
+            sys.exit(1)
+        for revision in diff_revisions(args):
+            if resolve_revision(repo_path, revision) is None:
+                print(f"❌ Ошибка: Ревизия '{revision}' не найдена в репозитории")
+                sys.exit(1)
+        
+        # Выбираем выходной файл
+        output_file = select_output_file(repo_path, quick_mode, FORMAT_EXTENSIONS[args.output_format])
+        if args.compress == 'zstd':
+            try:
+                import zstandard  # noqa: F401
+            except ImportError:
+                print("❌ Ошибка: Для сжатия zstd установите модуль zstandard: pip install zstandard")
+                sys.exit(1)
+        if args.compress:
+            output_file = output_file.with_name(output_file.name + COMPRESSION_SUFFIXES[args.compress])
+            print(f"✓ Сжатие {args.compress}: {output_file.name}")
         
         # Получаем фильтры
         filters = get_file_filter(quick_mode)
@@ -623,10 +5274,42 @@ def main():
                 return
         
         # Создаем дамп
-        processed, skipped, skipped_by_gitignore = create_repo_dump(repo_path, output_file, filters, quick_mode)
+        processed, skipped, skipped_by_gitignore = create_repo_dump(
+            repo_path, output_file, filters, quick_mode,
+            jobs=max(1, args.jobs),
+            walk_jobs=max(1, args.walk_jobs),
+            incremental=args.incremental or args.watch,
+            source=args.source,
+            revision=args.rev,
+            since=args.since,
+            diff_range=args.diff_range,
+            compress=args.compress,
+            max_shard_size=args.max_shard_size,
+            shard_unit=args.shard_unit,
+            toc=args.toc,
+            dedup=args.dedup,
+            strip=args.strip,
+            output_format=args.output_format,
+            max_total_size=args.max_total_size,
+            git_status=args.git_status,
+            stats_file=args.stats,
+        )
+        
+        dump_file = output_file
+        
+        # При разбиении на части выходным файлом считается индекс
+        shard_files = []
+        if args.max_shard_size:
+            output_file = shard_index_path_for(output_file)
+            with open(output_file, encoding='utf-8') as f:
+                shard_files = [output_file.with_name(shard['file']) for shard in json.load(f)['shards']]
         
         # Выводим результат
-        if output_file.exists():
+        if shard_files:
+            file_size = sum(path.stat().st_size for path in shard_files)
+            file_size_mb = file_size / (1024 * 1024)
+            file_size_kb = file_size / 1024
+        elif output_file.exists():
             file_size = output_file.stat().st_size
             file_size_mb = file_size / (1024 * 1024)
             file_size_kb = file_size / 1024
@@ -647,6 +5330,8 @@ def main():
         if filters.get('use_gitignore', True):
             print(f"Пропущено по .gitignore: {skipped_by_gitignore}")
         print(f"Выходной файл: {output_file.name}")
+        if shard_files:
+            print(f"Частей: {len(shard_files)} ({shard_files[0].name} ... {shard_files[-1].name})")
         
         if file_size_kb < 1024:
             print(f"Размер файла: {file_size_kb:.1f} KB")
@@ -667,6 +5352,16 @@ def main():
                 except:
                     print(f"Файл сохранен: {output_file}")
         
+        if args.watch:
+            # Пересборки идут через тот же Dumper в инкрементальном режиме
+            dumper = Dumper(repo_path, filters, jobs=max(1, args.jobs), walk_jobs=max(1, args.walk_jobs),
+                            source=args.source, since=args.since,
+                            compress=args.compress, max_shard_size=args.max_shard_size,
+                            shard_unit=args.shard_unit, toc=args.toc, incremental=True, dedup=args.dedup,
+                            strip=args.strip, output_format=args.output_format, max_total_size=args.max_total_size,
+                            show_filters=not quick_mode, git_status=args.git_status)
+            watch_repo(dumper, dump_file, poll=args.poll)
+        
     except KeyboardInterrupt:
         print("\n\n❌ Операция прервана пользователем")
         sys.exit(1)